@@ -1,13 +1,23 @@
-from typing import Dict, Iterable, Optional
+from typing import Dict, Iterable, Optional, Sized, Union
 from datetime import datetime
 from urllib.parse import quote_plus
-from pathlib import Path
 from flask import Flask
 import flask_jsglue
 
-from mediascan import load_files_yaml, load_artists_yaml
-
 from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.player_sessions import PlayerSessions
+from app.types.result_cache import ResultCache
+from app.utils.bandwidth_utils import check_paced_streams, create_bandwidth_limiter
+from app.utils.catalog_utils import get_catalog_source_mtimes, load_catalog, start_catalog_watcher
+from app.utils.compression_utils import init_compression
+from app.utils.metrics_utils import init_metrics
+from app.utils.render_utils import FragmentCacheExtension, url_for_page
+from app.utils.static_utils import init_static_assets
+from app.utils.thumbnail_utils import (
+    create_thumbnail_executor,
+    create_thumbnail_source_hash_cache,
+    is_thumbnails_enabled,
+)
 
 
 def format_search_query_url(args: Dict[str, str], config: MediaServerConfig):
@@ -21,9 +31,18 @@ def format_search_query_url(args: Dict[str, str], config: MediaServerConfig):
     return ret
 
 
-def format_results_string(l: Iterable, max_results: int):
-    L = len(list(l))
-    return f"{L:,}{'+' if L >= max_results else ''} {'result' if L == 1 else 'results'}"
+def format_results_string(l: Union[int, Iterable], max_results: int):
+    """
+    Formats the number of results, l being the results (or their count e.g. the total of a paginated result set),
+    with a + if there are max_results or more (which may be truncated, max_results <= 0 for an exact count)
+    """
+    if isinstance(l, int):
+        L = l
+    elif isinstance(l, Sized):
+        L = len(l)
+    else:
+        L = sum(1 for _ in l)
+    return f"{L:,}{'+' if 0 < max_results <= L else ''} {'result' if L == 1 else 'results'}"
 
 
 def register_filters(app: Flask, config: MediaServerConfig):
@@ -31,6 +50,7 @@ def register_filters(app: Flask, config: MediaServerConfig):
     app.jinja_env.filters["result_or_results_album_covers"] = lambda l: format_results_string(
         l, config.max_results_album_covers
     )
+    app.jinja_env.filters["result_or_results_total"] = lambda l: format_results_string(l, 0)
     app.jinja_env.filters["quote_plus"] = lambda u: quote_plus(u)
     app.jinja_env.filters["make_list"] = lambda s: list(s)
     app.jinja_env.filters["format_search_query_url"] = lambda args: format_search_query_url(args, config)
@@ -51,6 +71,14 @@ def set_globals(
 
     app.jinja_env.globals["LIMIT_BANDWIDTH"] = config.limit_bandwidth
 
+    app.jinja_env.globals["url_for_page"] = url_for_page
+
+    app.jinja_env.globals["PLAYER_QUEUE_LENGTH"] = max(1, min(config.player_queue_length, config.api_track_max_count))
+
+    app.jinja_env.globals["THUMBNAILS_ENABLED"] = is_thumbnails_enabled(config)
+
+    app.jinja_env.globals["THUMBNAIL_SIZES"] = sorted(config.thumbnails.sizes)
+
 
 def register_blueprint(app: Flask, config: MediaServerConfig, url_prefix: Optional[str] = None):
     from app.main import bp
@@ -63,7 +91,11 @@ def register_blueprint(app: Flask, config: MediaServerConfig, url_prefix: Option
         app.jinja_env.globals["URL_PREFIX"] = url_prefix
 
 
-def create_app(config: MediaServerConfig):
+def create_app(config: MediaServerConfig, start_watcher: bool = True):
+    """
+    Creates the app and loads the catalog. start_watcher=False leaves starting the catalog watcher (if configured)
+    to the caller e.g. in each worker process, when the app is created before forking worker processes.
+    """
     root_path = config.flask_config.root_path
     url_prefix = config.flask_config.url_prefix
     static_url_path = config.flask_config.static_url_path
@@ -73,10 +105,28 @@ def create_app(config: MediaServerConfig):
     app.logger.debug("flask_config.url_prefix: %s", url_prefix)
     app.logger.debug("flask_config.static_url_path: %s", static_url_path)
     app.config["MEDIASERVER_CONFIG"] = config
-    app.config["MEDIASCAN_FILES"] = load_files_yaml(str(Path(config.mediascan_yaml_path).joinpath("files.yaml")))
-    app.config["MEDIASCAN_ARTISTS"] = load_artists_yaml(str(Path(config.mediascan_yaml_path).joinpath("artists.yaml")))
+    # the catalog source mtimes before loading, for a catalog watcher started later on
+    app.config["CATALOG_SOURCE_MTIMES"] = get_catalog_source_mtimes(config)
+    app.config["MEDIASCAN_CATALOG"] = load_catalog(app, config)
+    # incremented on each catalog reload, the render cache's entries are keyed on it
+    app.config["CATALOG_VERSION"] = 1
+    app.config["RENDER_CACHE"] = ResultCache(config.render_cache_max_entries, ttl_seconds=0)
+    app.config["FILE_STAT_CACHE"] = ResultCache(config.file_stat_cache_max_entries, config.file_stat_cache_ttl_seconds)
+    app.config["BANDWIDTH_LIMITER"] = create_bandwidth_limiter(config)
+    check_paced_streams(app, config)
+    app.config["PLAYER_SESSIONS"] = PlayerSessions(config.player_no_repeat_tracks, config.player_sessions_max_entries)
+    if is_thumbnails_enabled(config):
+        app.config["THUMBNAIL_EXECUTOR"] = create_thumbnail_executor(config)
+        app.config["THUMBNAIL_SOURCE_HASH_CACHE"] = create_thumbnail_source_hash_cache()
     app.debug = config.flask_config.debug
+    app.jinja_env.add_extension(FragmentCacheExtension)
     register_filters(app, config)
     set_globals(app, config)
     register_blueprint(app, config, url_prefix)
+    init_static_assets(app, config)
+    # registered first so that its after_request hook runs last, and the request durations include compression
+    init_metrics(app, config)
+    init_compression(app, config)
+    if start_watcher and config.catalog_reload_interval_seconds > 0:
+        start_catalog_watcher(app, config)
     return app
@@ -1,72 +1,93 @@
-import os
-import random
-from typing import List
+import hmac
+import secrets
+from typing import Any, Dict, List
 from pathlib import Path
 
 from flask import (
     abort,
     current_app,
+    jsonify,
     render_template,
     request,
-    send_from_directory,
     Response,
+    url_for,
 )
-
-from mediascan import MediaFile
+from flask.typing import ResponseReturnValue
 
 from app.main import bp
-from app.types.arg_types import args_dict_to_str
-from app.utils.request_args_utils import get_request_args
+from app.types.album_info import AlbumInfo
+from app.types.arg_types import ArgsDictStr
+from app.types.catalog.track import Track
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.page import Page
+from app.types.search_index import SearchResult
+from app.utils.request_args_utils import get_page_args, get_request_args
 from app.utils.media_files_utils import (
-    filter_files,
     get_cover_path,
     get_word_cloud_data_genres,
-    get_albums,
+    get_albums_page,
     get_artist_counts,
     get_artist_country_code_counts,
     get_artist_region_code_counts,
     get_artist_city_counts,
     get_genre_counts,
-    get_tracks,
+    get_filtered_genre_counts,
+    get_random_tracks,
+    get_tracks_page,
+    search as search_catalog,
     get_word_cloud_data_artists,
     get_country_code_name_map,
     get_region_code_name_map,
 )
 
-from app.utils.app_utils import get_config, get_mediascan_files, get_mediascan_artists
+from app.utils.api_utils import (
+    ALBUM_FIELD_GETTERS,
+    api_page_response,
+    get_count_field_getters,
+    get_track_field_getters,
+)
+from app.utils.app_utils import get_catalog, get_config
+from app.utils.bandwidth_utils import get_client_ip
+from app.utils.catalog_utils import request_catalog_reload
+from app.utils.metrics_utils import render_metrics
+from app.utils.render_utils import render, render_cached
+from app.utils.send_file_utils import get_served_path, resolve_file, send_media_file
+from app.utils.thumbnail_utils import get_thumbnail, is_thumbnails_enabled, prefetch_thumbnails
 
 
 @bp.route("/")
-def root() -> str:
-    return render_template("albums_index.html", index_type="albums")
+def root() -> Response:
+    return render_cached(current_app, "albums_index.html", index_type="albums")
 
 
 @bp.route("/tracks")
-def tracks() -> str:
-    global files
+def tracks() -> ResponseReturnValue:
     config = get_config(current_app)
     args = get_request_args(request)
-    current_app.logger.debug("tracks args=%s", args_dict_to_str(args))
-    tracks: List[MediaFile] = get_tracks(
-        current_app, get_mediascan_files(current_app), get_mediascan_artists(current_app), args
+    current_app.logger.debug("tracks args=%s", ArgsDictStr(args))
+    page: Page[Track] = get_tracks_page(
+        current_app, get_catalog(current_app), args, get_page_args(request, config.tracks_page_size)
     )
     cover_path: Path = Path()
-    if len(tracks):
-        cover_path = get_cover_path(config, tracks[0])
-    return render_template(
+    if len(page.items):
+        cover_path = get_cover_path(config, page.items[0])
+    return render(
+        current_app,
+        config,
         "tracks.html",
-        files=tracks,
+        page=page,
         cover_path=str(cover_path),
     )
 
 
 @bp.route("/tracks/index")
-def tracks_index() -> str:
-    return render_template("tracks_index.html")
+def tracks_index() -> Response:
+    return render_cached(current_app, "tracks_index.html")
 
 
 from app.types.arg_types import (
     ArgsDict,
+    ArgTypes,
 )
 
 
@@ -80,72 +101,48 @@ def player() -> str:
 
 
 @bp.route("/player/index")
-def player_index() -> str:
-    return render_template("player_index.html")
+def player_index() -> Response:
+    return render_cached(current_app, "player_index.html")
 
 
 @bp.route("/name-that-tune/index")
-def name_that_tune_index() -> str:
-    return render_template("player_hints_index.html")
+def name_that_tune_index() -> Response:
+    return render_cached(current_app, "player_hints_index.html")
 
 
 @bp.route("/getfile/<path:path>")
 def getfile(path: str) -> Response:
     config = get_config(current_app)
+    served_path = get_served_path(current_app, config, path)
+    if served_path is None:
+        abort(404)
+    file_stat = resolve_file(current_app, served_path)
+    if file_stat is None:
+        abort(404)
+    max_age = 0
+    if file_stat.mimetype.startswith("image/"):
+        # covers are revalidated (304) after max_age, audio files on every request
+        max_age = config.cover_max_age_seconds
+    return send_media_file(current_app, served_path, file_stat, max_age)
+
 
-    # path_prefix = /var/www/html/Covers/
-    # path = /var/www/html/Covers/MusicOther/Johnny Cash/With His Hot and Blue Guitar [1957]/cover.jpg
-    # path_without_prefix = MusicOther/Johnny Cash/With His Hot and Blue Guitar [1957]/cover.jpg
-
-    if not path.startswith("/"):
-        path = "/" + path
-    path_prefix = config.playback_methods.local.media_path
-    # if (
-    #    path.startswith(config.album_covers_path)
-    #    or config.album_covers_path != config.playback_methods.local.media_path
-    # ):
-    if path.startswith(config.album_covers_path):
-        path_prefix = config.album_covers_path
-
-    if not Path(path).exists():
-        # if it's a jpg, try looking for webp instead of jpg
-        # in case someone (me) converted the original jpgs to webp
-        root, ext = os.path.splitext(path)
-        if ext != ".jpg":
-            current_app.logger.error('File not found (and not a jpg): "%s"', path)
-            abort(404)
-        oldpath = path
-        path = root + ".webp"
-        current_app.logger.warning(
-            "Couldn't find file, trying different file extension:\noldpath=%s\nnewpath=%s",
-            oldpath,
-            path,
-        )
-    if not Path(path).exists():
-        current_app.logger.error('File not found: "%s"', path)
+@bp.route("/thumbnail/<int:size>/<path:path>")
+def thumbnail(size: int, path: str) -> Response:
+    """Serves the cover image at path as a thumbnail of the given size (or full size if thumbnails are disabled)"""
+    config = get_config(current_app)
+    if size not in config.thumbnails.sizes:
         abort(404)
-    else:
-        current_app.logger.debug("File exists: %s", path)
-
-    if not path_prefix.endswith("/"):
-        path_prefix = path_prefix + "/"
-    if path.startswith(path_prefix):
-        path_without_prefix = path[len(path_prefix) :]
-        current_app.logger.debug(
-            '/getfile/ path="%s" path_prefix="%s" path_without_prefix="%s"',
-            path,
-            path_prefix,
-            path_without_prefix,
-        )
-        current_app.logger.debug('send_from_directory("%s", "%s")', path_prefix, path_without_prefix)
-        return send_from_directory(path_prefix, path_without_prefix)
-    else:
-        current_app.logger.warning(
-            "path (%s) doesn't match expected media path prefix (%s), refusing to serve it",
-            path,
-            path_prefix,
-        )
+    served_path = get_served_path(current_app, config, path)
+    if served_path is None:
+        abort(404)
+    file_stat = resolve_file(current_app, served_path)
+    if file_stat is None or not file_stat.mimetype.startswith("image/"):
         abort(404)
+    if is_thumbnails_enabled(config):
+        thumbnail_stat = get_thumbnail(current_app, config, file_stat, size)
+        if thumbnail_stat is not None:
+            return send_media_file(current_app, thumbnail_stat.path, thumbnail_stat, config.cover_max_age_seconds)
+    return send_media_file(current_app, served_path, file_stat, config.cover_max_age_seconds)
 
 
 @bp.route("/genres")
@@ -156,13 +153,13 @@ def genres() -> str:
         sort = value
     return render_template(
         "genres.html",
-        genre_counts=get_genre_counts(get_mediascan_files(current_app), sort=sort),
+        genre_counts=get_genre_counts(get_catalog(current_app), sort=sort),
     )
 
 
 @bp.route("/genres/index")
-def genres_index() -> str:
-    return render_template("genres_index.html", index_type="genres")
+def genres_index() -> Response:
+    return render_cached(current_app, "genres_index.html", index_type="genres")
 
 
 @bp.route("/artists")
@@ -171,8 +168,7 @@ def artists() -> str:
         "artists.html",
         artist_counts=get_artist_counts(
             current_app,
-            get_mediascan_files(current_app),
-            get_mediascan_artists(current_app),
+            get_catalog(current_app),
             get_request_args(request),
         ),
     )
@@ -184,7 +180,7 @@ def artist_country_codes() -> str:
         "artist_geo_codes.html",
         code_type="Country",
         artist_code_counts=get_artist_country_code_counts(
-            current_app, get_mediascan_artists(current_app), get_request_args(request)
+            current_app, get_catalog(current_app), get_request_args(request)
         ),
         code_name_map=get_country_code_name_map(current_app),
     )
@@ -196,7 +192,7 @@ def artist_region_codes() -> str:
         "artist_geo_codes.html",
         code_type="Region",
         artist_code_counts=get_artist_region_code_counts(
-            current_app, get_mediascan_artists(current_app), get_request_args(request)
+            current_app, get_catalog(current_app), get_request_args(request)
         ),
         code_name_map=get_region_code_name_map(current_app),
     )
@@ -207,44 +203,43 @@ def artist_cities() -> str:
     return render_template(
         "artist_geo_codes.html",
         code_type="City",
-        artist_code_counts=get_artist_city_counts(
-            current_app, get_mediascan_artists(current_app), get_request_args(request)
-        ),
+        artist_code_counts=get_artist_city_counts(current_app, get_catalog(current_app), get_request_args(request)),
         code_name_map=None,
     )
 
 
 @bp.route("/artists/index")
-def artists_index() -> str:
-    return render_template("artists_index.html", index_type="artists")
+def artists_index() -> Response:
+    return render_cached(current_app, "artists_index.html", index_type="artists")
 
 
 @bp.route("/albums")
-def albums() -> str:
-    return render_template(
+def albums() -> ResponseReturnValue:
+    config = get_config(current_app)
+    page = get_albums_page(
+        current_app,
+        get_catalog(current_app),
+        get_request_args(request),
+        get_page_args(request, config.max_results_album_covers),
+    )
+    return render(
+        current_app,
+        config,
         "albums.html",
-        albums=[
-            album.to_tuple()
-            for album in get_albums(
-                current_app,
-                get_mediascan_files(current_app),
-                get_mediascan_artists(current_app),
-                get_request_args(request),
-            )
-        ],
+        page=page.map_items(AlbumInfo.to_tuple),
     )
 
 
 @bp.route("/albums/index")
-def albums_index() -> str:
-    return render_template("albums_index.html", index_type="albums")
+def albums_index() -> Response:
+    return render_cached(current_app, "albums_index.html", index_type="albums")
 
 
 @bp.route("/genres-cloud")
 def genres_cloud() -> str:
     return render_template(
         "word-cloud.html",
-        word_cloud_data=get_word_cloud_data_genres(get_mediascan_files(current_app)),
+        word_cloud_data=get_word_cloud_data_genres(get_catalog(current_app)),
         word_cloud_type="genre",
     )
 
@@ -253,32 +248,233 @@ def genres_cloud() -> str:
 def artists_cloud() -> str:
     return render_template(
         "word-cloud.html",
-        word_cloud_data=get_word_cloud_data_artists(
-            current_app, get_mediascan_files(current_app), get_mediascan_artists(current_app), get_request_args(request)
-        ),
+        word_cloud_data=get_word_cloud_data_artists(current_app, get_catalog(current_app), get_request_args(request)),
         word_cloud_type="artist",
     )
 
 
-@bp.route("/api/track")
-def api_track():
-    global files
+def get_search_result_url(result: SearchResult) -> str:
+    """Returns the URL of the page of a search result (the albums of a genre or artist, the tracks of an album)"""
+    if result.arg_type == ArgTypes.List.Str.Genre:
+        return url_for("main.albums", genre=result.value)
+    if result.arg_type == ArgTypes.List.Str.Artist:
+        return url_for("main.albums", artist=result.value)
+    if result.arg_type == ArgTypes.List.Str.AlbumArtist:
+        return url_for("main.albums", albumartist=result.value)
+    if result.arg_type == ArgTypes.List.Str.Album:
+        return url_for("main.tracks", albumartist=result.artist, album=result.album)
+    return url_for("main.tracks", artist=result.artist, album=result.album, title=result.value)
+
+
+@bp.route("/search")
+def search() -> str:
     config = get_config(current_app)
-    args = get_request_args(request)
-    current_app.logger.debug("api/track args=%s", args_dict_to_str(args))
-    files_list: List[MediaFile] = filter_files(
-        current_app, get_mediascan_files(current_app), get_mediascan_artists(current_app), args
+    query = request.args.get("q", "")
+    results = search_catalog(current_app, get_catalog(current_app), query, config.search_max_results)
+    return render_template(
+        "search.html",
+        query=query,
+        results=[(result, get_search_result_url(result)) for result in results],
     )
-    if not len(files_list):
-        abort(404)
-    file = random.choice(files_list)
-    cover_path = get_cover_path(config, file)
+
+
+@bp.route("/api/search")
+def api_search() -> Response:
+    """
+    Returns {"results": [...]} with up to limit (at most search_max_results) search results of q, best first,
+    for autocompletion as the query is typed
+    """
+    config = get_config(current_app)
+    limit = config.api_search_default_limit
+    if "limit" in request.args:
+        try:
+            limit = min(max(1, int(request.args["limit"])), config.search_max_results)
+        except ValueError:
+            abort(400)
+    results = search_catalog(current_app, get_catalog(current_app), request.args.get("q", ""), limit)
+    return jsonify(
+        {
+            "results": [
+                {
+                    "type": str(result.arg_type),
+                    "value": result.value,
+                    "artist": result.artist,
+                    "album": result.album,
+                    "score": result.score,
+                    "url": get_search_result_url(result),
+                }
+                for result in results
+            ]
+        }
+    )
+
+
+# cookie identifying a player session, for /api/track to avoid replaying the tracks it recently picked
+PLAYER_SESSION_COOKIE = "mediaserver_player_session"
+
+
+def get_track_info(config: MediaServerConfig, file: Track) -> Dict[str, Any]:
     return {
         "path": file.path,
-        "cover_path": str(cover_path),
+        "cover_path": str(get_cover_path(config, file)),
         "artist": file.artist,
         "album": file.album,
         "title": file.title,
         "genre": file.genre,
         "year": file.year,
     }
+
+
+def preload_tracks(config: MediaServerConfig, files: List[Track]) -> List[str]:
+    """
+    Warms the file stat cache for the audio files and covers of tracks about to be played (and generates
+    the missing thumbnails of the covers), returns the Link preload header values for the covers
+    and for the audio file of the first track
+    """
+    links: List[str] = []
+    for i, file in enumerate(files):
+        cover_path = str(get_cover_path(config, file))
+        served_path = get_served_path(current_app, config, cover_path)
+        cover_stat = resolve_file(current_app, served_path) if served_path is not None else None
+        if cover_stat is not None:
+            links.append(f"<{url_for('main.getfile', path=cover_path)}>; rel=preload; as=image")
+            if is_thumbnails_enabled(config):
+                prefetch_thumbnails(current_app, config, cover_stat)
+        if i == 0 and config.playback_methods.local.enabled:
+            served_path = get_served_path(current_app, config, file.path)
+            if served_path is not None and resolve_file(current_app, served_path) is not None:
+                links.append(f"<{url_for('main.getfile', path=file.path)}>; rel=preload; as=audio")
+    return links
+
+
+@bp.route("/api/track")
+def api_track() -> Response:
+    """
+    Returns a random track matching the request args, or with the count arg, {"tracks": [...]} with up to
+    api_track_max_count random tracks (e.g. for the player to queue the next tracks in one request),
+    with preload hints (Link headers) for their files
+    """
+    config = get_config(current_app)
+    args = get_request_args(request)
+    current_app.logger.debug("api/track args=%s", ArgsDictStr(args))
+    count = 1
+    if "count" in request.args:
+        try:
+            count = min(max(1, int(request.args["count"])), config.api_track_max_count)
+        except ValueError:
+            abort(400)
+    session_id = request.cookies.get(PLAYER_SESSION_COOKIE)
+    new_session = not session_id or len(session_id) > 64
+    if new_session:
+        session_id = secrets.token_urlsafe(16)
+    files_list = get_random_tracks(current_app, get_catalog(current_app), args, count, session_id)
+    if not len(files_list):
+        abort(404)
+    if "count" in request.args:
+        rv = jsonify({"tracks": [get_track_info(config, file) for file in files_list]})
+    else:
+        rv = jsonify(get_track_info(config, files_list[0]))
+    links = preload_tracks(config, files_list)
+    if links:
+        rv.headers["Link"] = ", ".join(links)
+    if new_session:
+        rv.set_cookie(PLAYER_SESSION_COOKIE, session_id, httponly=True, samesite="Lax")  # type: ignore
+    return rv
+
+
+@bp.route("/api/tracks")
+def api_tracks() -> Response:
+    """Returns the requested page of /tracks as JSON (see api_page_response), each track as an array of fields"""
+    config = get_config(current_app)
+    page = get_tracks_page(
+        current_app,
+        get_catalog(current_app),
+        get_request_args(request),
+        get_page_args(request, config.tracks_page_size),
+    )
+    return api_page_response(current_app, request, page, get_track_field_getters(config))
+
+
+@bp.route("/api/albums")
+def api_albums() -> Response:
+    """Returns the requested page of /albums as JSON, each album as an array of fields (AlbumInfo.to_tuple)"""
+    config = get_config(current_app)
+    page = get_albums_page(
+        current_app,
+        get_catalog(current_app),
+        get_request_args(request),
+        get_page_args(request, config.max_results_album_covers),
+    )
+    return api_page_response(current_app, request, page, ALBUM_FIELD_GETTERS)
+
+
+@bp.route("/api/artists")
+def api_artists() -> Response:
+    """Returns the artist counts of /artists as JSON, in pages of limit (all of them by default)"""
+    artist_counts = get_artist_counts(current_app, get_catalog(current_app), get_request_args(request))
+    page = Page.from_sequence(list(artist_counts.items()), get_page_args(request, 0))
+    return api_page_response(current_app, request, page, get_count_field_getters("artist"))
+
+
+@bp.route("/api/genres")
+def api_genres() -> Response:
+    """Returns the genre counts of /genres (of the files matching the request args) as JSON"""
+    genre_counts = get_filtered_genre_counts(get_catalog(current_app), get_request_args(request))
+    page = Page.from_sequence(list(genre_counts.items()), get_page_args(request, 0))
+    return api_page_response(current_app, request, page, get_count_field_getters("genre"))
+
+
+@bp.route("/api/geo/<geo_type>")
+def api_geo(geo_type: str) -> Response:
+    """Returns the artist counts of /artist-countries, /artist-regions or /artist-cities (geo_type) as JSON"""
+    args = get_request_args(request)
+    catalog = get_catalog(current_app)
+    if geo_type == "countries":
+        counts = get_artist_country_code_counts(current_app, catalog, args)
+        field_getters = get_count_field_getters("code", get_country_code_name_map(current_app))
+    elif geo_type == "regions":
+        counts = get_artist_region_code_counts(current_app, catalog, args)
+        field_getters = get_count_field_getters("code", get_region_code_name_map(current_app))
+    elif geo_type == "cities":
+        counts = get_artist_city_counts(current_app, catalog, args)
+        field_getters = get_count_field_getters("city")
+    else:
+        abort(404)
+    page = Page.from_sequence(list(counts.items()), get_page_args(request, 0))
+    return api_page_response(current_app, request, page, field_getters)
+
+
+def check_admin_token():
+    """Aborts unless the request has the configured admin token (the admin routes 404 if no token is configured)"""
+    config = get_config(current_app)
+    if not config.admin_token:
+        abort(404)
+    token = ""
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        token = authorization[len("Bearer ") :]
+    if not hmac.compare_digest(token.encode(), config.admin_token.encode()):
+        abort(403)
+
+
+@bp.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """Reloads files.yaml and artists.yaml in the background, the current catalog is served until it's done"""
+    check_admin_token()
+    if not request_catalog_reload(current_app._get_current_object(), get_config(current_app)):  # type: ignore
+        return {"status": "already reloading"}, 409
+    return {"status": "reloading"}, 202
+
+
+@bp.route("/metrics")
+def metrics() -> Response:
+    """
+    Returns the metrics of the server (of all its worker processes), in the Prometheus text format,
+    to requests from the metrics_scrape_addresses or with the admin token
+    """
+    config = get_config(current_app)
+    if not config.metrics_enabled:
+        abort(404)
+    if get_client_ip(config, request) not in config.metrics_scrape_addresses:
+        check_admin_token()
+    return Response(render_metrics(current_app), content_type="text/plain; version=0.0.4; charset=utf-8")
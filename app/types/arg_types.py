@@ -1,4 +1,4 @@
-from typing import Dict, List, Union
+from typing import Dict, Hashable, Iterable, List, Tuple, Union
 from enum import StrEnum
 
 
@@ -9,10 +9,14 @@ class ArgType(StrEnum):
 class ArgTypeScalarInt(ArgType):
     MinYear = "minYear"
     MaxYear = "maxYear"
+    # seed of the random order (sort=random), the same seed gives the same order
+    Seed = "seed"
 
 
 class ArgTypeScalarEnum(ArgType):
     Sort = "sort"
+    # how the ArgTypeListStr args match values (see ArgValueScalarEnumMatch), exact by default
+    Match = "match"
 
 
 class ArgTypeScalar:
@@ -47,7 +51,9 @@ class ArgTypeUtil:
         return arg_type in (
             ArgTypes.Scalar.Int.MinYear,
             ArgTypes.Scalar.Int.MaxYear,
+            ArgTypes.Scalar.Int.Seed,
             ArgTypes.Scalar.Enum.Sort,
+            ArgTypes.Scalar.Enum.Match,
         )
 
     @classmethod
@@ -55,6 +61,7 @@ class ArgTypeUtil:
         return arg_type in (
             ArgTypes.Scalar.Int.MinYear,
             ArgTypes.Scalar.Int.MaxYear,
+            ArgTypes.Scalar.Int.Seed,
         )
 
 
@@ -71,8 +78,25 @@ class ArgValueScalarEnumSort(StrEnum):
     Random = "random"
 
 
+class ArgValueScalarEnumMatch(StrEnum):
+    """
+    Match modes of the ArgTypeListStr args, all of them case insensitive. Besides exact, they also ignore
+    diacritics and punctuation (see normalize_search_text) e.g. artist=beyonce&match=prefix matches "Beyoncé".
+    """
+
+    # the value is the arg
+    Exact = "exact"
+    # the value starts with the arg
+    Prefix = "prefix"
+    # the value contains the arg
+    Contains = "contains"
+    # the value is within a small edit distance of the arg (0 to 2, longer args allow more edits)
+    Fuzzy = "fuzzy"
+
+
 class ArgValuesScalarEnum:
     Sort = ArgValueScalarEnumSort
+    Match = ArgValueScalarEnumMatch
 
 
 class ArgValuesScalar:
@@ -83,7 +107,7 @@ class ArgValues:
     Scalar = ArgValuesScalar
 
 
-ArgValue = Union[ArgValueScalarInt, ArgValueListStr, ArgValueScalarEnumSort]
+ArgValue = Union[ArgValueScalarInt, ArgValueListStr, ArgValueScalarEnumSort, ArgValueScalarEnumMatch]
 ArgsDict = Dict[ArgType, ArgValue]
 
 
@@ -93,3 +117,31 @@ def args_dict_to_str(args: ArgsDict) -> str:
         msg += f"{k}={v},"
     msg += "]"
     return msg
+
+
+class ArgsDictStr:
+    """args_dict_to_str(args) for logging, formatted only if the log record is emitted"""
+
+    def __init__(self, args: ArgsDict):
+        self.args = args
+
+    def __str__(self) -> str:
+        return args_dict_to_str(self.args)
+
+
+def args_dict_to_key(args: ArgsDict, exclude: Iterable[ArgType] = ()) -> Tuple[Hashable, ...]:
+    """
+    Returns a canonical, hashable form of args for use as a cache key,
+    i.e. sorted by arg type with list values lowercased, deduplicated and sorted
+    (list args are matched case insensitively, in any order).
+    """
+    ret: List[Tuple[str, Hashable]] = []
+    for k in sorted(args.keys()):
+        if k in exclude:
+            continue
+        v = args[k]
+        if isinstance(v, list):
+            ret.append((str(k), tuple(sorted(set(s.lower() for s in v)))))
+        else:
+            ret.append((str(k), str(v)))
+    return tuple(ret)
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter, tokens being bytes.
+    Reservations may overdraw the bucket, the caller then waits for the returned delay,
+    so that concurrent callers are paced in order rather than polling for tokens.
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, n: int) -> float:
+        """Takes n tokens, returns the seconds to wait before using them (0 if they were available)"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= n
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running as another user
+        pass
+    return True
+
+
+class BandwidthLimiter:
+    """
+    Per-client and global output rate limits (token buckets) and concurrent stream limits.
+    Per-client buckets are kept for up to max_clients clients (least recently used are dropped).
+    A limit of 0 means no limit.
+
+    Stream slots are taken by an owner, the process serving the stream, so that when the limiter is shared by
+    worker processes (see SharedStateManager) the slots of a worker which exited without releasing them are freed.
+    """
+
+    def __init__(
+        self,
+        client_bytes_per_second: int = 0,
+        global_bytes_per_second: int = 0,
+        burst_bytes: int = 0,
+        max_client_streams: int = 0,
+        max_streams: int = 0,
+        max_clients: int = 4096,
+    ):
+        self.client_bytes_per_second = client_bytes_per_second
+        self.burst_bytes = burst_bytes
+        self.max_client_streams = max_client_streams
+        self.max_streams = max_streams
+        self.max_clients = max_clients
+        self.global_bucket: Optional[TokenBucket] = None
+        if global_bytes_per_second > 0:
+            self.global_bucket = TokenBucket(global_bytes_per_second, burst_bytes or global_bytes_per_second)
+        self._client_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._streams = 0
+        self._client_streams: Dict[str, int] = {}
+        # stream slots (count by client) by owner
+        self._owner_streams: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def is_rate_limited(self) -> bool:
+        return self.client_bytes_per_second > 0 or self.global_bucket is not None
+
+    @property
+    def is_stream_limited(self) -> bool:
+        return self.max_client_streams > 0 or self.max_streams > 0
+
+    def _get_client_bucket(self, client: str) -> Optional[TokenBucket]:
+        if self.client_bytes_per_second <= 0:
+            return None
+        with self._lock:
+            bucket = self._client_buckets.get(client)
+            if bucket is None:
+                bucket = TokenBucket(self.client_bytes_per_second, self.burst_bytes or self.client_bytes_per_second)
+                self._client_buckets[client] = bucket
+                while len(self._client_buckets) > self.max_clients:
+                    self._client_buckets.popitem(last=False)
+            else:
+                self._client_buckets.move_to_end(client)
+            return bucket
+
+    def reserve(self, client: str, n: int) -> float:
+        """Takes n bytes from the client's and the global budget, returns the seconds to wait before sending them"""
+        delay = 0.0
+        client_bucket = self._get_client_bucket(client)
+        if client_bucket is not None:
+            delay = client_bucket.reserve(n)
+        if self.global_bucket is not None:
+            delay = max(delay, self.global_bucket.reserve(n))
+        return delay
+
+    def _has_stream_slot(self, client: str) -> bool:
+        if self.max_streams > 0 and self._streams >= self.max_streams:
+            return False
+        if self.max_client_streams > 0 and self._client_streams.get(client, 0) >= self.max_client_streams:
+            return False
+        return True
+
+    def _release_owner_stream(self, client: str, owner: int):
+        self._streams -= 1
+        count = self._client_streams.pop(client, 0) - 1
+        if count > 0:
+            self._client_streams[client] = count
+        owner_streams = self._owner_streams.get(owner)
+        if owner_streams is not None:
+            count = owner_streams.pop(client, 0) - 1
+            if count > 0:
+                owner_streams[client] = count
+            elif not owner_streams:
+                del self._owner_streams[owner]
+
+    def _release_exited_owners(self):
+        """Releases the stream slots of the owners which are no longer running"""
+        for owner in [owner for owner in self._owner_streams if not _is_running(owner)]:
+            for client, count in list(self._owner_streams[owner].items()):
+                for _ in range(count):
+                    self._release_owner_stream(client, owner)
+
+    def acquire_stream(self, client: str, owner: int) -> bool:
+        """
+        Takes a stream slot for the client, owned by the owner process (see release_stream),
+        returns False if there's none free (without waiting for one)
+        """
+        with self._lock:
+            if not self._has_stream_slot(client):
+                self._release_exited_owners()
+                if not self._has_stream_slot(client):
+                    return False
+            self._streams += 1
+            self._client_streams[client] = self._client_streams.get(client, 0) + 1
+            owner_streams = self._owner_streams.setdefault(owner, {})
+            owner_streams[client] = owner_streams.get(client, 0) + 1
+            return True
+
+    def release_stream(self, client: str, owner: int):
+        with self._lock:
+            self._release_owner_stream(client, owner)
@@ -0,0 +1,120 @@
+import os
+from abc import ABC, abstractmethod
+from typing import cast, Dict, List, NamedTuple, Optional, Tuple
+
+from app.types.album_info import AlbumInfo
+from app.types.arg_types import ArgsDict, ArgType, ArgTypeListStr, ArgTypes, ArgValueListStr
+from app.types.catalog.track import Track
+from app.types.result_cache import ResultCache
+from app.types.search_index import SearchResult
+
+# Tuple of [CountryCode, RegionCode, City]
+ArtistGeoCodes = Tuple[str, str, str]
+
+
+class FilterResult(NamedTuple):
+    """
+    The files matching a filter, and the number of candidate files the backend went through to find them
+    (e.g. the index entries it read), for the filter metrics
+    """
+
+    tracks: List[Track]
+    candidates: int
+
+
+def get_file_artist_path(file_path: str) -> str:
+    """
+    Returns the artist directory path of the given track (media file) path
+    i.e. the path with the album directory and filename stripped off.
+    Matching on the artist directory path is the most foolproof method of associating
+    files with artists, since we can assume a given file was scanned from a given artist directory
+    if the leading part of the file path (i.e. the artist dir path) is identical.
+    TODO: Add validation to ensure artist_name[0] matches ID3 tag albumartist value(s).
+
+    e.g. "/data/Music/Municipal Waste/Hazardous Mutation [2005]/01 - Intro - Deathripper.mp3"
+    returns "/data/Music/Municipal Waste"
+    """
+    # below was SLOW:
+    #   return str(Path(file_path).parent.parent)
+    # so now have this:
+    tokens = file_path.split(os.sep)
+    # leading slash results in first token being '', this ensures leading slash will be restored by the join
+    return "/".join(tokens[:-2])
+
+
+def has_filter_args(args: ArgsDict) -> bool:
+    """Returns True if args has any args which filter the files (i.e. any args besides sort)"""
+    for arg_type, arg_value in args.items():
+        if isinstance(arg_type, ArgTypeListStr) and len(cast(ArgValueListStr, arg_value)):
+            return True
+        if arg_type in (ArgTypes.Scalar.Int.MinYear, ArgTypes.Scalar.Int.MaxYear) and arg_value:
+            return True
+    return False
+
+
+class BaseCatalog(ABC):
+    """
+    Abstract base class for catalog backends, which answer the ArgsDict filter and aggregate queries
+    of media_files_utils. Files are returned as Track records.
+    """
+
+    def __init__(self, result_cache: Optional[ResultCache] = None):
+        """
+        result_cache caches results computed from this catalog, it is owned by the catalog
+        so that a reloaded catalog never sees results cached from the previous one.
+        """
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        # permutations of results for sort=random (by filter and seed), which are cached separately
+        # since each of them is as large as the results, set by load_catalog
+        self.shuffle_cache = ResultCache(64)
+        # AlbumInfo of each album (by album ID), for backends with an album table (see filter_album_ids),
+        # set by load_catalog since the cover paths depend on the configuration
+        self.album_infos: List[AlbumInfo] = []
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def filter(self, args: ArgsDict) -> FilterResult:
+        """Returns the files matching args, in catalog order"""
+        pass
+
+    @abstractmethod
+    def filter_by_year(self, args: ArgsDict) -> FilterResult:
+        """Returns the files matching args, sorted by year (descending) then catalog order"""
+        pass
+
+    def filter_album_ids(self, args: ArgsDict) -> Optional[List[int]]:
+        """
+        Returns the IDs (album_infos indexes) of the albums with files matching args, in order of first
+        appearance (in catalog order), or None if the backend has no album table,
+        in which case the albums are collected from the filtered files
+        """
+        return None
+
+    @abstractmethod
+    def count_values(self, arg_type: ArgType, args: ArgsDict) -> Dict[str, int]:
+        """
+        Returns the number of files matching args per value of the given ArgTypeListStr,
+        in order of first appearance (in catalog order)
+        """
+        pass
+
+    @abstractmethod
+    def count_artist_geo_codes(self, args: ArgsDict) -> Dict[ArtistGeoCodes, int]:
+        """
+        Returns the number of artists per (country code, region code, city), in order of first appearance
+        (in artist order). Counts all of the artists if args has no filter args, otherwise only the artists
+        with files matching args.
+        """
+        pass
+
+    @abstractmethod
+    def search(self, query: str, limit: int) -> List[SearchResult]:
+        """
+        Returns up to limit genres, artists, album artists, albums and titles matching query (ignoring case and
+        diacritics), best match first: exact matches, then prefix matches, then matches of every word of query
+        as a word prefix
+        """
+        pass
@@ -0,0 +1,492 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import cast, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from mediascan import Artist, Artists, MediaFile, MediaFiles
+
+from app.types.catalog.base_catalog import ArtistGeoCodes, BaseCatalog, FilterResult, has_filter_args
+from app.types.catalog.track import Track
+from app.types.result_cache import ResultCache
+from app.types.search_index import SEARCH_ARG_TYPES, SearchIndex, SearchResult
+from app.types.value_index import ValueIndex
+from app.types.arg_types import (
+    ArgsDict,
+    ArgType,
+    ArgTypes,
+    ArgValueListStr,
+    ArgValues,
+    ArgValueScalarEnumMatch,
+    ArgValueScalarInt,
+)
+
+# Version of the Catalog's pickled (snapshot) layout, bump whenever the Catalog's attributes change
+# so that snapshots written by an older version are rebuilt from the YAML files instead of loaded
+CATALOG_SNAPSHOT_VERSION = 7
+
+# The filterable ArgTypeListStr columns, in the order they are extracted from each file
+CATALOG_LIST_ARG_TYPES: List[ArgType] = [
+    ArgTypes.List.Str.Genre,
+    ArgTypes.List.Str.Artist,
+    ArgTypes.List.Str.AlbumArtist,
+    ArgTypes.List.Str.Album,
+    ArgTypes.List.Str.Title,
+    ArgTypes.List.Str.Year,
+    ArgTypes.List.Str.CountryCode,
+    ArgTypes.List.Str.RegionCode,
+    ArgTypes.List.Str.City,
+]
+
+# The ArgTypeListStr columns which have the same value for every file of an album
+# (the album, year and directory are part of the album's identity, and the artist geo codes follow from the directory)
+ALBUM_LIST_ARG_TYPES: List[ArgType] = [
+    ArgTypes.List.Str.Album,
+    ArgTypes.List.Str.Year,
+    ArgTypes.List.Str.CountryCode,
+    ArgTypes.List.Str.RegionCode,
+    ArgTypes.List.Str.City,
+]
+
+# The ArgTypeListStr columns which can vary between the files of an album
+TRACK_LIST_ARG_TYPES: List[ArgType] = [
+    arg_type for arg_type in CATALOG_LIST_ARG_TYPES if arg_type not in ALBUM_LIST_ARG_TYPES
+]
+
+
+class Catalog(BaseCatalog):
+    """
+    Columnar in-memory catalog of the mediascan files (loaded from the mediascan YAML files), built once at startup.
+
+    Each ArgTypeListStr value of each file is stored as an ID into a shared (interned) string table,
+    and each ArgTypeListStr has a lowercase inverted index of value -> ascending file positions,
+    so that an ArgsDict is resolved with set intersections rather than by visiting every file.
+    File positions are also kept sorted by year (descending), so that minYear/maxYear
+    are resolved with a bisect range scan and year sorted results need no sorting.
+
+    The mediascan objects aren't kept: each file is stored as a compact Track record referencing the
+    interned strings (and a shared directory string), and each artist as its interned ArtistGeoCodes.
+
+    Albums (files with the same album artist, album, year and directory) are numbered in order of first
+    appearance, with album level inverted indexes, so that /albums is resolved over albums rather than files.
+
+    The unfiltered value counts (facet counts) of each ArgTypeListStr and of the artist geo codes
+    are counted once at load.
+
+    The distinct genres, artists and album artists (by number of files), the albums and the titles are indexed
+    for search (see SearchIndex) at load.
+
+    The values of each ArgTypeListStr are also indexed by normalized value (see ValueIndex), so that with the
+    match arg each arg value is expanded once to the inverted index keys it matches, rather than matched
+    against every file.
+    """
+
+    def __init__(
+        self,
+        files: MediaFiles,
+        artists: Artists,
+        file_artists: Sequence[Optional[Artist]],
+        result_cache: Optional[ResultCache] = None,
+    ):
+        """file_artists is the Artist (if found) of each file in files.files, by position"""
+        super().__init__(result_cache)
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._lower_strings: List[str] = []
+        self.tracks: List[Track] = []
+        self.years = array("i")
+        self.columns: Dict[ArgType, array] = {arg_type: array("I") for arg_type in CATALOG_LIST_ARG_TYPES}
+        self._indexes: Dict[ArgType, Dict[str, array]] = {arg_type: {} for arg_type in CATALOG_LIST_ARG_TYPES}
+        directories: Dict[str, str] = {}
+        for position, f in enumerate(files.files):
+            self._add_file(position, f, file_artists[position], directories)
+        self.artist_geo_codes: List[ArtistGeoCodes] = [
+            (
+                self._intern_str(artist.artist_data.country_code),
+                self._intern_str(artist.artist_data.region_code),
+                self._intern_str(artist.artist_data.city),
+            )
+            for artist in artists.artists
+        ]
+        # the artist (index into artist_geo_codes) of each file, by position, -1 if not found
+        artist_ids = {id(artist): artist_id for artist_id, artist in enumerate(artists.artists)}
+        self.file_artist_ids = array("i", [-1 if artist is None else artist_ids[id(artist)] for artist in file_artists])
+        years = self.years
+        # sorted by year (descending) then position, i.e. the same order as a stable
+        # sorted(files, key=year, reverse=True), with negated years as ascending bisect keys
+        self._year_desc_positions = array("I", sorted(range(len(years)), key=lambda position: -years[position]))
+        self._year_desc_keys = array("i", [-years[position] for position in self._year_desc_positions])
+        self._build_albums()
+        self._build_search_index()
+        self._value_indexes: Dict[ArgType, ValueIndex] = {
+            arg_type: ValueIndex(self._indexes[arg_type]) for arg_type in CATALOG_LIST_ARG_TYPES
+        }
+        self._value_counts: Dict[ArgType, Dict[str, int]] = {
+            arg_type: self._count_column(arg_type, range(len(self))) for arg_type in CATALOG_LIST_ARG_TYPES
+        }
+        self._artist_geo_code_counts = self._count_artist_geo_codes(range(len(self.artist_geo_codes)))
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # cached results aren't part of a snapshot (and the cache holds a lock, which can't be pickled),
+        # nor are the album infos, since their cover paths depend on the configuration
+        del state["result_cache"]
+        del state["shuffle_cache"]
+        del state["album_infos"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.result_cache = ResultCache()
+        self.shuffle_cache = ResultCache(64)
+        self.album_infos = []
+
+    def _intern(self, s: str) -> int:
+        string_id = self._string_ids.get(s)
+        if string_id is None:
+            string_id = len(self.strings)
+            self._string_ids[s] = string_id
+            self.strings.append(s)
+            lower = s.lower()
+            # share the string if it's already lowercase
+            self._lower_strings.append(s if lower == s else lower)
+        return string_id
+
+    def _intern_str(self, s: str) -> str:
+        return self.strings[self._intern(s)]
+
+    def _add_file(self, position: int, f: MediaFile, artist: Optional[Artist], directories: Dict[str, str]):
+        country_code = ""
+        region_code = ""
+        city = ""
+        if artist is not None:
+            country_code = artist.artist_data.country_code
+            region_code = artist.artist_data.region_code
+            city = artist.artist_data.city
+        values = (
+            f.genre,
+            f.artist,
+            f.albumartist,
+            f.album,
+            f.title,
+            str(f.year),
+            country_code,
+            region_code,
+            city,
+        )
+        self.years.append(f.year)
+        for arg_type, value in zip(CATALOG_LIST_ARG_TYPES, values):
+            string_id = self._intern(value)
+            self.columns[arg_type].append(string_id)
+            index = self._indexes[arg_type]
+            key = self._lower_strings[string_id]
+            positions = index.get(key)
+            if positions is None:
+                positions = index[key] = array("I")
+            positions.append(position)
+        self.tracks.append(
+            Track.from_path(
+                f.path,
+                self.get_value(ArgTypes.List.Str.Title, position),
+                self.get_value(ArgTypes.List.Str.Artist, position),
+                self.get_value(ArgTypes.List.Str.Album, position),
+                self.get_value(ArgTypes.List.Str.AlbumArtist, position),
+                self.get_value(ArgTypes.List.Str.Genre, position),
+                f.year,
+                intern=lambda s: directories.setdefault(s, s),
+            )
+        )
+
+    def _build_albums(self):
+        # the album of each file (by position), and the position of the first file of each album (by album ID)
+        self.album_ids = array("I")
+        self.album_first_positions = array("I")
+        album_id_map: Dict[Tuple[str, str, int, str], int] = {}
+        for position, track in enumerate(self.tracks):
+            # albumartist first, in order to better group files in the same album together,
+            # but fallback to artist if albumartist is not set (same as media_files_utils._get_albums)
+            key = (track.albumartist or track.artist, track.album, track.year, track.directory)
+            album_id = album_id_map.get(key)
+            if album_id is None:
+                album_id = album_id_map[key] = len(self.album_first_positions)
+                self.album_first_positions.append(position)
+            self.album_ids.append(album_id)
+
+        # ALBUM_LIST_ARG_TYPES: lowercase value -> ascending album IDs
+        self._album_indexes: Dict[ArgType, Dict[str, array]] = {arg_type: {} for arg_type in ALBUM_LIST_ARG_TYPES}
+        for arg_type in ALBUM_LIST_ARG_TYPES:
+            column = self.columns[arg_type]
+            index = self._album_indexes[arg_type]
+            for album_id, position in enumerate(self.album_first_positions):
+                key = self._lower_strings[column[position]]
+                album_ids = index.get(key)
+                if album_ids is None:
+                    album_ids = index[key] = array("I")
+                album_ids.append(album_id)
+
+        # TRACK_LIST_ARG_TYPES: lowercase value -> (album IDs, position of the album's first file with the value),
+        # in order of that first file
+        self._album_track_indexes: Dict[ArgType, Dict[str, Tuple[array, array]]] = {
+            arg_type: {} for arg_type in TRACK_LIST_ARG_TYPES
+        }
+        for arg_type in TRACK_LIST_ARG_TYPES:
+            index = self._album_track_indexes[arg_type]
+            for key, positions in self._indexes[arg_type].items():
+                album_ids = array("I")
+                first_positions = array("I")
+                seen: Set[int] = set()
+                for position in positions:
+                    album_id = self.album_ids[position]
+                    if album_id not in seen:
+                        seen.add(album_id)
+                        album_ids.append(album_id)
+                        first_positions.append(position)
+                index[key] = (album_ids, first_positions)
+
+    def _build_search_index(self):
+        # the SEARCH_ARG_TYPES index and the (first) file position of each search document, by rank
+        self._search_doc_arg_types = array("B")
+        self._search_doc_positions = array("I")
+        artist_keys = self._indexes[ArgTypes.List.Str.Artist]
+        for i, arg_type in enumerate(SEARCH_ARG_TYPES):
+            positions: Iterable[int]
+            if arg_type == ArgTypes.List.Str.Album:
+                positions = self.album_first_positions
+            elif arg_type == ArgTypes.List.Str.Title:
+                positions = range(len(self))
+            else:
+                # distinct values, most files first (album artists which are also artists are found as artists)
+                values = [
+                    (key, value_positions)
+                    for key, value_positions in self._indexes[arg_type].items()
+                    if key and (arg_type != ArgTypes.List.Str.AlbumArtist or key not in artist_keys)
+                ]
+                values.sort(key=lambda value: -len(value[1]))
+                positions = [value_positions[0] for _, value_positions in values]
+            for position in positions:
+                self._search_doc_arg_types.append(i)
+                self._search_doc_positions.append(position)
+        self.search_index = SearchIndex(
+            self.get_value(SEARCH_ARG_TYPES[i], position)
+            for i, position in zip(self._search_doc_arg_types, self._search_doc_positions)
+        )
+
+    def search(self, query: str, limit: int) -> List[SearchResult]:
+        ret: List[SearchResult] = []
+        for doc, score in self.search_index.search(query, limit):
+            arg_type = SEARCH_ARG_TYPES[self._search_doc_arg_types[doc]]
+            track = self.tracks[self._search_doc_positions[doc]]
+            if arg_type == ArgTypes.List.Str.Genre:
+                ret.append(SearchResult(arg_type, track.genre, "", "", score))
+            elif arg_type == ArgTypes.List.Str.Artist:
+                ret.append(SearchResult(arg_type, track.artist, track.artist, "", score))
+            elif arg_type == ArgTypes.List.Str.AlbumArtist:
+                ret.append(SearchResult(arg_type, track.albumartist, track.albumartist, "", score))
+            elif arg_type == ArgTypes.List.Str.Album:
+                ret.append(SearchResult(arg_type, track.album, track.albumartist or track.artist, track.album, score))
+            else:
+                ret.append(SearchResult(arg_type, track.title, track.artist, track.album, score))
+        return ret
+
+    def get_album_tracks(self) -> List[Track]:
+        """Returns the first file of each album (by album ID)"""
+        return [self.tracks[position] for position in self.album_first_positions]
+
+    def get_value(self, arg_type: ArgType, position: int) -> str:
+        return self.strings[self.columns[arg_type][position]]
+
+    def _expand_arg_values(self, arg_type: ArgType, args: ArgsDict) -> List[str]:
+        """Returns the (lowercase) index keys of arg_type matching any of its arg values with the match arg"""
+        arg_value_list = cast(ArgValueListStr, args[arg_type])
+        match = cast(ArgValueScalarEnumMatch, args.get(ArgTypes.Scalar.Enum.Match, ArgValues.Scalar.Enum.Match.Exact))
+        if match == ArgValues.Scalar.Enum.Match.Exact:
+            return [arg_value.lower() for arg_value in arg_value_list]
+        value_index = self._value_indexes[arg_type]
+        keys: Dict[str, None] = {}
+        for arg_value in arg_value_list:
+            keys.update(dict.fromkeys(value_index.expand(arg_value, match)))
+        return list(keys)
+
+    def _match_list_args(self, args: ArgsDict) -> Tuple[Optional[Set[int]], int]:
+        """
+        Returns the set of file positions matching all of the ArgTypeListStr args (case insensitive),
+        or None if there are no ArgTypeListStr args to filter on, and the number of positions read from the indexes.
+        """
+        matches_per_arg_type: List[Set[int]] = []
+        read = 0
+        for arg_type in CATALOG_LIST_ARG_TYPES:
+            if arg_type not in args:
+                continue
+            if not len(cast(ArgValueListStr, args[arg_type])):
+                continue
+            index = self._indexes[arg_type]
+            matches: Set[int] = set()
+            for key in self._expand_arg_values(arg_type, args):
+                positions = index.get(key, ())
+                read += len(positions)
+                matches.update(positions)
+            if not len(matches):
+                return set(), read
+            matches_per_arg_type.append(matches)
+        if not len(matches_per_arg_type):
+            return None, read
+        # intersect smallest first
+        matches_per_arg_type.sort(key=len)
+        ret = matches_per_arg_type[0]
+        for matches in matches_per_arg_type[1:]:
+            ret = ret & matches
+            if not len(ret):
+                break
+        return ret, read
+
+    def _year_range(self, args: ArgsDict) -> slice:
+        """Returns the slice of _year_desc_positions within the minYear/maxYear args"""
+        min_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MinYear, 0))
+        max_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MaxYear, 0))
+        start = bisect_left(self._year_desc_keys, -max_year) if max_year else 0
+        stop = bisect_right(self._year_desc_keys, -min_year) if min_year else len(self._year_desc_keys)
+        return slice(start, max(start, stop))
+
+    def _filter_candidates(self, args: ArgsDict) -> Tuple[Optional[Set[int]], int]:
+        """
+        Returns the set of file positions matching args,
+        or None if there are no ArgTypeListStr args i.e. all files in the _year_range match,
+        and the number of candidate positions read to find them (see FilterResult)
+        """
+        candidates, read = self._match_list_args(args)
+        if candidates is None:
+            year_range = self._year_range(args)
+            return None, year_range.stop - year_range.start
+        if not len(candidates):
+            return candidates, read
+        year_range = self._year_range(args)
+        year_range_len = year_range.stop - year_range.start
+        if year_range_len == len(self):
+            return candidates, read
+        if year_range_len < len(candidates):
+            return candidates.intersection(self._year_desc_positions[year_range]), read + year_range_len
+        min_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MinYear, 0))
+        max_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MaxYear, 0))
+        years = self.years
+        return {
+            position
+            for position in candidates
+            if (not min_year or years[position] >= min_year) and (not max_year or years[position] <= max_year)
+        }, read
+
+    def _filter_positions(self, args: ArgsDict) -> Tuple[List[int], int]:
+        """Returns the ascending positions of the files matching args, and the number of candidate positions read"""
+        candidates, read = self._filter_candidates(args)
+        if candidates is not None:
+            return sorted(candidates), read
+        year_range = self._year_range(args)
+        if year_range.stop - year_range.start == len(self):
+            return list(range(len(self))), read
+        return sorted(self._year_desc_positions[year_range]), read
+
+    def filter_positions(self, args: ArgsDict) -> List[int]:
+        """Returns the ascending positions of the files matching args, see filter_files"""
+        return self._filter_positions(args)[0]
+
+    def _filter_positions_by_year(self, args: ArgsDict) -> Tuple[List[int], int]:
+        """
+        Returns the positions of the files matching args, sorted by year (descending),
+        and the number of candidate positions read
+        """
+        candidates, read = self._filter_candidates(args)
+        if candidates is None:
+            return list(self._year_desc_positions[self._year_range(args)]), read
+        years = self.years
+        return sorted(candidates, key=lambda position: (-years[position], position)), read
+
+    def filter(self, args: ArgsDict) -> FilterResult:
+        tracks = self.tracks
+        positions, read = self._filter_positions(args)
+        return FilterResult([tracks[position] for position in positions], read)
+
+    def filter_by_year(self, args: ArgsDict) -> FilterResult:
+        tracks = self.tracks
+        positions, read = self._filter_positions_by_year(args)
+        return FilterResult([tracks[position] for position in positions], read)
+
+    def filter_album_ids(self, args: ArgsDict) -> Optional[List[int]]:
+        track_arg_types = [
+            arg_type
+            for arg_type in TRACK_LIST_ARG_TYPES
+            if arg_type in args and len(cast(ArgValueListStr, args[arg_type]))
+        ]
+        if len(track_arg_types) > 1:
+            # the album indexes can't tell if the same file of an album matches each of them, so filter the files
+            album_ids = self.album_ids
+            return list(dict.fromkeys(album_ids[position] for position in self.filter_positions(args)))
+
+        candidates: Optional[Set[int]] = None
+        for arg_type in ALBUM_LIST_ARG_TYPES:
+            if arg_type not in args:
+                continue
+            if not len(cast(ArgValueListStr, args[arg_type])):
+                continue
+            index = self._album_indexes[arg_type]
+            matches: Set[int] = set()
+            for key in self._expand_arg_values(arg_type, args):
+                matches.update(index.get(key, ()))
+            candidates = matches if candidates is None else candidates & matches
+            if not len(candidates):
+                return []
+
+        ordered: Iterable[int]
+        if len(track_arg_types):
+            # albums in order of their first file matching any of the values
+            track_index = self._album_track_indexes[track_arg_types[0]]
+            first_positions: Dict[int, int] = {}
+            for key in self._expand_arg_values(track_arg_types[0], args):
+                album_ids, positions = track_index.get(key, ((), ()))
+                for album_id, position in zip(album_ids, positions):
+                    if position < first_positions.get(album_id, position + 1):
+                        first_positions[album_id] = position
+            ordered = sorted(first_positions, key=first_positions.__getitem__)
+        elif candidates is not None:
+            ordered = sorted(candidates)
+        else:
+            ordered = range(len(self.album_first_positions))
+
+        min_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MinYear, 0))
+        max_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MaxYear, 0))
+        years = self.years
+        album_first_positions = self.album_first_positions
+        return [
+            album_id
+            for album_id in ordered
+            if (candidates is None or album_id in candidates)
+            and (not min_year or years[album_first_positions[album_id]] >= min_year)
+            and (not max_year or years[album_first_positions[album_id]] <= max_year)
+        ]
+
+    def _count_column(self, arg_type: ArgType, positions: Iterable[int]) -> Dict[str, int]:
+        column = self.columns[arg_type]
+        counts: Dict[int, int] = {}
+        for position in positions:
+            string_id = column[position]
+            counts[string_id] = counts.get(string_id, 0) + 1
+        return {self.strings[string_id]: count for string_id, count in counts.items()}
+
+    def _count_artist_geo_codes(self, artist_ids: Iterable[int]) -> Dict[ArtistGeoCodes, int]:
+        counts: Dict[ArtistGeoCodes, int] = {}
+        for artist_id in artist_ids:
+            geo_codes = self.artist_geo_codes[artist_id]
+            counts[geo_codes] = counts.get(geo_codes, 0) + 1
+        return counts
+
+    def count_values(self, arg_type: ArgType, args: ArgsDict) -> Dict[str, int]:
+        if not has_filter_args(args):
+            return dict(self._value_counts[arg_type])
+        return self._count_column(arg_type, self.filter_positions(args))
+
+    def count_artist_geo_codes(self, args: ArgsDict) -> Dict[ArtistGeoCodes, int]:
+        if not has_filter_args(args):
+            return dict(self._artist_geo_code_counts)
+        file_artist_ids = self.file_artist_ids
+        artist_ids = {file_artist_ids[position] for position in self.filter_positions(args)}
+        artist_ids.discard(-1)
+        return self._count_artist_geo_codes(sorted(artist_ids))
@@ -0,0 +1,515 @@
+import re
+import sqlite3
+import threading
+from typing import Any, cast, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from app.types.arg_types import (
+    ArgsDict,
+    ArgType,
+    ArgTypeListStr,
+    ArgTypes,
+    ArgValueListStr,
+    ArgValues,
+    ArgValueScalarEnumMatch,
+    ArgValueScalarInt,
+)
+from app.types.catalog.base_catalog import (
+    ArtistGeoCodes,
+    BaseCatalog,
+    FilterResult,
+    get_file_artist_path,
+    has_filter_args,
+)
+from app.types.catalog.track import Track
+from app.types.result_cache import ResultCache
+from app.types.value_index import get_max_edit_distance, is_within_edit_distance
+from app.types.search_index import (
+    normalize_search_text,
+    SCORE_EXACT,
+    SCORE_PREFIX,
+    SCORE_WORDS,
+    SEARCH_ARG_TYPES,
+    SearchResult,
+)
+
+# Columns of the mediascan database "files" table read by the catalog, in Track.from_path argument order
+FILES_COLUMNS = ["path", "title", "artist", "album", "albumartist", "genre", "year"]
+# Columns of the mediascan database "artists" table read by the catalog
+ARTISTS_COLUMNS = ["path", "country_code", "region_code", "city"]
+
+# SQL expression of each ArgTypeListStr (Year is handled separately, to match it as text)
+LIST_ARG_TYPE_COLUMNS: Dict[ArgType, str] = {
+    ArgTypes.List.Str.Genre: "f.genre",
+    ArgTypes.List.Str.Artist: "f.artist",
+    ArgTypes.List.Str.AlbumArtist: "f.albumartist",
+    ArgTypes.List.Str.Album: "f.album",
+    ArgTypes.List.Str.Title: "f.title",
+    ArgTypes.List.Str.CountryCode: "COALESCE(a.country_code, '')",
+    ArgTypes.List.Str.RegionCode: "COALESCE(a.region_code, '')",
+    ArgTypes.List.Str.City: "COALESCE(a.city, '')",
+}
+
+# SQL expressions of each SEARCH_ARG_TYPES search: (value, artist, album, GROUP BY clause, rank),
+# rank ordering the results of the same match quality (most files first, or first file first)
+SEARCH_COLUMNS: Dict[ArgType, Tuple[str, str, str, str, str]] = {
+    ArgTypes.List.Str.Genre: ("f.genre", "''", "''", "GROUP BY f.genre COLLATE NOCASE", "-COUNT(*)"),
+    ArgTypes.List.Str.Artist: ("f.artist", "f.artist", "''", "GROUP BY f.artist COLLATE NOCASE", "-COUNT(*)"),
+    ArgTypes.List.Str.AlbumArtist: (
+        "f.albumartist",
+        "f.albumartist",
+        "''",
+        "GROUP BY f.albumartist COLLATE NOCASE",
+        "-COUNT(*)",
+    ),
+    ArgTypes.List.Str.Album: (
+        "f.album",
+        "COALESCE(NULLIF(f.albumartist, ''), f.artist)",
+        "f.album",
+        "GROUP BY COALESCE(NULLIF(f.albumartist, ''), f.artist), f.album, f.year, artist_path(f.path)",
+        "MIN(f.rowid)",
+    ),
+    ArgTypes.List.Str.Title: ("f.title", "f.artist", "f.album", "", "f.rowid"),
+}
+
+# These arguments require a join with the artists table
+ARGS_REQUIRING_ARTIST = [ArgTypes.List.Str.CountryCode, ArgTypes.List.Str.RegionCode, ArgTypes.List.Str.City]
+
+# Indexes created (if the database is writable) for the ArgsDict queries,
+# NOCASE since list args are matched case insensitively
+INDEXES = {
+    "mediaserver_files_genre": "files(genre COLLATE NOCASE)",
+    "mediaserver_files_artist": "files(artist COLLATE NOCASE)",
+    "mediaserver_files_albumartist": "files(albumartist COLLATE NOCASE)",
+    "mediaserver_files_album": "files(album COLLATE NOCASE)",
+    "mediaserver_files_title": "files(title COLLATE NOCASE)",
+    "mediaserver_files_year": "files(year)",
+}
+
+# The args resolved by each of the INDEXES (with match=exact)
+INDEX_ARG_TYPES: Dict[str, List[ArgType]] = {
+    "mediaserver_files_genre": [ArgTypes.List.Str.Genre],
+    "mediaserver_files_artist": [ArgTypes.List.Str.Artist],
+    "mediaserver_files_albumartist": [ArgTypes.List.Str.AlbumArtist],
+    "mediaserver_files_album": [ArgTypes.List.Str.Album],
+    "mediaserver_files_title": [ArgTypes.List.Str.Title],
+    "mediaserver_files_year": [ArgTypes.List.Str.Year, ArgTypes.Scalar.Int.MinYear, ArgTypes.Scalar.Int.MaxYear],
+}
+
+# The query plan step of the files table (e.g. "SEARCH f USING INDEX mediaserver_files_genre (genre=?)",
+# or "SEARCH TABLE files AS f ..." before SQLite 3.36)
+FILES_QUERY_PLAN_RE = re.compile(r"(SCAN|SEARCH) (?:TABLE files AS )?f\b(?: USING (?:COVERING )?INDEX (\w+))?")
+
+
+# Version of the search tables (see create_search_tables), bump whenever their layout or contents change
+# (e.g. normalize_search_text) so that they're rebuilt
+SEARCH_TABLES_VERSION = 1
+
+# The search tables: the SEARCH_ARG_TYPES values (documents), numbered in result order (by SEARCH_ARG_TYPES
+# then rank) with their normalized text, the words of the texts, and the fingerprint of the files they were built from
+SEARCH_TABLES_DDL = """
+DROP TABLE IF EXISTS mediaserver_search_info;
+DROP TABLE IF EXISTS mediaserver_search_words;
+DROP TABLE IF EXISTS mediaserver_search;
+CREATE TABLE mediaserver_search (
+    doc INTEGER PRIMARY KEY, arg_type TEXT, value TEXT, artist TEXT, album TEXT, text TEXT
+);
+CREATE TABLE mediaserver_search_words (word TEXT, doc INTEGER, PRIMARY KEY (word, doc)) WITHOUT ROWID;
+CREATE TABLE mediaserver_search_info (fingerprint TEXT);
+"""
+
+# Postings counted per query word to pick the rarest one to search by (more means every word is common)
+SEARCH_WORD_COUNT_LIMIT = 20000
+
+# greater than any character, so that [prefix, prefix + _MAX_CHAR) is the range of the strings starting with prefix
+_MAX_CHAR = "\U0010ffff"
+
+
+def like_escape(s: str) -> str:
+    """Returns s with the LIKE wildcards escaped (for ESCAPE '\\')"""
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def is_fuzzy_match(value: str, arg_value: str) -> bool:
+    """Returns True if value (normalized) matches arg_value (normalized) with match=fuzzy"""
+    return is_within_edit_distance(value, arg_value, get_max_edit_distance(arg_value))
+
+
+class SqliteCatalog(BaseCatalog):
+    """
+    Catalog backed by the mediascan SQLite database (generated by mediascan's scantodb),
+    for libraries too large to hold in memory. ArgsDict filters run as indexed SQL queries
+    and aggregates as GROUP BY queries, with one read-only connection per thread.
+
+    The database is expected to have a "files" table with FILES_COLUMNS and (optionally) an
+    "artists" table with ARTISTS_COLUMNS, i.e. the same fields as files.yaml and artists.yaml.
+
+    Note list args are matched with SQLite's NOCASE collation, which only folds ASCII characters,
+    and countryCode/regionCode/city filters scan the files table (joined on the artist directory path).
+    List args with a match mode other than exact scan the files table too, and so do searches unless the
+    search tables could be built (see create_search_tables),
+    matching with the same case and diacritics folding as the in-memory catalog.
+    """
+
+    def __init__(self, db_path: str, result_cache: Optional[ResultCache] = None):
+        super().__init__(result_cache)
+        self.db_path = db_path
+        self._local = threading.local()
+        connection = self._get_connection()
+        self.has_artists_table = self._check_columns(connection, "artists", ARTISTS_COLUMNS, required=False)
+        self._check_columns(connection, "files", FILES_COLUMNS, required=True)
+        self._len = connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        # unfiltered facet counts, counted on first use (the database can be too large to count them all upfront)
+        self._value_counts: Dict[ArgType, Dict[str, int]] = {}
+        self._artist_geo_code_counts: Optional[Dict[ArtistGeoCodes, int]] = None
+        # set by create_indexes, when the search tables are up to date
+        self.has_search_tables = False
+
+    def _get_connection(self) -> sqlite3.Connection:
+        connection: Optional[sqlite3.Connection] = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True)
+            connection.create_function("artist_path", 1, get_file_artist_path, deterministic=True)
+            connection.create_function("search_text", 1, normalize_search_text, deterministic=True)
+            connection.create_function("is_fuzzy_match", 2, is_fuzzy_match, deterministic=True)
+            self._local.connection = connection
+        return connection
+
+    @classmethod
+    def _check_columns(cls, connection: sqlite3.Connection, table: str, columns: List[str], required: bool) -> bool:
+        table_columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+        if not len(table_columns) and not required:
+            return False
+        missing = [column for column in columns if column not in table_columns]
+        if len(missing):
+            raise ValueError(f"mediascan database table '{table}' is missing column(s): {', '.join(missing)}")
+        return True
+
+    def create_indexes(self) -> None:
+        """Creates the indexes used by the queries and the search tables (requires write access to the database)"""
+        with sqlite3.connect(self.db_path) as connection:
+            for name, definition in INDEXES.items():
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+            self.create_search_tables(connection)
+        self.has_search_tables = True
+
+    @classmethod
+    def _search_condition(cls, arg_type: ArgType) -> str:
+        """Returns the condition of the files (or groups of files) whose SEARCH_COLUMNS value is searched"""
+        condition = f"{SEARCH_COLUMNS[arg_type][0]} != ''"
+        if arg_type == ArgTypes.List.Str.AlbumArtist:
+            # album artists which are also artists are found as artists
+            condition += " AND f.albumartist COLLATE NOCASE NOT IN (SELECT artist FROM files)"
+        return condition
+
+    @classmethod
+    def _get_search_fingerprint(cls, connection: sqlite3.Connection) -> str:
+        """
+        Returns the SEARCH_TABLES_VERSION, count and last rowid of the files rows the search tables are built from,
+        which are cheap to get (from an index and the end of the table) on every startup,
+        but don't change when files rows are only updated in place
+        """
+        count, last_rowid = connection.execute("SELECT count(*), max(rowid) FROM files").fetchone()
+        return f"{SEARCH_TABLES_VERSION}:{count}:{last_rowid}"
+
+    @classmethod
+    def create_search_tables(cls, connection: sqlite3.Connection) -> None:
+        """
+        Builds the search tables of the files, unless they're already built from the same files, so that searches
+        are answered from the indexes of the normalized texts and of their words rather than by normalizing
+        every value of the files table
+        """
+        fingerprint = cls._get_search_fingerprint(connection)
+        try:
+            row = connection.execute("SELECT fingerprint FROM mediaserver_search_info").fetchone()
+        except sqlite3.OperationalError:
+            # no search tables yet
+            row = None
+        if row is not None and row[0] == fingerprint:
+            return
+        connection.create_function("artist_path", 1, get_file_artist_path, deterministic=True)
+        connection.create_function("search_text", 1, normalize_search_text, deterministic=True)
+        connection.executescript(SEARCH_TABLES_DDL)
+        for arg_type in SEARCH_ARG_TYPES:
+            value, artist, album, group_by, rank = SEARCH_COLUMNS[arg_type]
+            connection.execute(
+                f"INSERT INTO mediaserver_search (arg_type, value, artist, album, text)"
+                f" SELECT ?, value, artist, album, text"
+                f" FROM (SELECT {value} AS value, {artist} AS artist, {album} AS album,"
+                f" search_text({value}) AS text, {rank} AS rank FROM files f WHERE {cls._search_condition(arg_type)}"
+                f" {group_by}) WHERE text != '' ORDER BY rank",
+                [str(arg_type)],
+            )
+        docs = connection.execute("SELECT doc, text FROM mediaserver_search").fetchall()
+        connection.executemany(
+            "INSERT INTO mediaserver_search_words (word, doc) VALUES (?, ?)",
+            ((word, doc) for doc, text in docs for word in set(text.split())),
+        )
+        connection.execute("CREATE INDEX mediaserver_search_text ON mediaserver_search(text)")
+        connection.execute("INSERT INTO mediaserver_search_info (fingerprint) VALUES (?)", [fingerprint])
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _from_where(
+        self, args: ArgsDict, join_artists: bool = False, conditions: Iterable[str] = ()
+    ) -> Tuple[str, List[Any]]:
+        """
+        Returns the FROM and WHERE clauses (and their parameters) of the query for args and the given
+        (parameterless) conditions, the artists table is joined (as "a") if join_artists or if required by args
+        """
+        conditions = list(conditions)
+        params: List[Any] = []
+        match = cast(ArgValueScalarEnumMatch, args.get(ArgTypes.Scalar.Enum.Match, ArgValues.Scalar.Enum.Match.Exact))
+        for arg_type, column in LIST_ARG_TYPE_COLUMNS.items():
+            if arg_type not in args:
+                continue
+            arg_value_list = cast(ArgValueListStr, args[arg_type])
+            if not len(arg_value_list):
+                continue
+            if match != ArgValues.Scalar.Enum.Match.Exact:
+                self._append_match_condition(conditions, params, column, arg_value_list, match)
+                continue
+            conditions.append(f"{column} COLLATE NOCASE IN ({', '.join('?' * len(arg_value_list))})")
+            params.extend(arg_value_list)
+        arg_type = ArgTypes.List.Str.Year
+        if arg_type in args and len(cast(ArgValueListStr, args[arg_type])):
+            arg_value_list = cast(ArgValueListStr, args[arg_type])
+            if match != ArgValues.Scalar.Enum.Match.Exact:
+                self._append_match_condition(conditions, params, "CAST(f.year AS TEXT)", arg_value_list, match)
+            else:
+                # only canonical integers can match str(year), so those are compared as integers (using the index)
+                years = [
+                    int(value)
+                    for value in arg_value_list
+                    if value.isascii() and value.isdigit() and str(int(value)) == value
+                ]
+                conditions.append(f"f.year IN ({', '.join('?' * len(years))})")
+                params.extend(years)
+        min_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MinYear, 0))
+        if min_year:
+            conditions.append("f.year >= ?")
+            params.append(min_year)
+        max_year = cast(ArgValueScalarInt, args.get(ArgTypes.Scalar.Int.MaxYear, 0))
+        if max_year:
+            conditions.append("f.year <= ?")
+            params.append(max_year)
+
+        from_clause = "FROM files f"
+        if join_artists or any(arg_type in args for arg_type in ARGS_REQUIRING_ARTIST):
+            if self.has_artists_table:
+                # first artist wins, in case of duplicate artist paths
+                from_clause += (
+                    " LEFT JOIN (SELECT rowid AS id, rtrim(path, '/') AS path, country_code, region_code, city FROM artists"
+                    " WHERE rowid IN (SELECT MIN(rowid) FROM artists GROUP BY rtrim(path, '/'))) a"
+                    " ON a.path = artist_path(f.path)"
+                )
+            else:
+                from_clause += (
+                    " LEFT JOIN (SELECT NULL AS id, NULL AS country_code, NULL AS region_code, NULL AS city) a ON 0"
+                )
+        where_clause = ""
+        if len(conditions):
+            where_clause = "WHERE " + " AND ".join(conditions)
+        return f"{from_clause} {where_clause}", params
+
+    @classmethod
+    def _append_match_condition(
+        cls,
+        conditions: List[str],
+        params: List[Any],
+        column: str,
+        arg_value_list: ArgValueListStr,
+        match: ArgValueScalarEnumMatch,
+    ):
+        """Appends the condition (and its parameters) of column matching any of arg_value_list with the match mode"""
+        value_conditions: List[str] = []
+        for arg_value in arg_value_list:
+            value = normalize_search_text(arg_value)
+            if not value:
+                # nothing to match beyond case (e.g. empty values), as with match=exact
+                value_conditions.append(f"{column} COLLATE NOCASE = ?")
+                params.append(arg_value)
+            elif match == ArgValues.Scalar.Enum.Match.Fuzzy:
+                value_conditions.append(f"is_fuzzy_match(search_text({column}), ?)")
+                params.append(value)
+            else:
+                value_conditions.append(f"search_text({column}) LIKE ? ESCAPE '\\'")
+                wildcard = "%" if match == ArgValues.Scalar.Enum.Match.Contains else ""
+                params.append(f"{wildcard}{like_escape(value)}%")
+        conditions.append(f"({' OR '.join(value_conditions)})")
+
+    def _count_candidates(self, sql: str, params: List[Any], args: ArgsDict, kept: int) -> int:
+        """
+        Returns the number of files rows the query (for args) went through to find its kept rows, from its query
+        plan: every row if it scans the files table, otherwise the rows of the index range it searches
+        """
+        connection = self._get_connection()
+        for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            plan_match = FILES_QUERY_PLAN_RE.match(row[-1])
+            if plan_match is None:
+                continue
+            index = plan_match.group(2)
+            if plan_match.group(1) == "SCAN" or index not in INDEX_ARG_TYPES:
+                return len(self)
+            # list args with a match mode other than exact aren't resolved by the indexes
+            is_exact = args.get(ArgTypes.Scalar.Enum.Match, ArgValues.Scalar.Enum.Match.Exact) == (
+                ArgValues.Scalar.Enum.Match.Exact
+            )
+            index_args = {
+                arg_type: args[arg_type]
+                for arg_type in INDEX_ARG_TYPES[index]
+                if arg_type in args and (is_exact or not isinstance(arg_type, ArgTypeListStr))
+            }
+            if all(arg_type in index_args for arg_type in args if has_filter_args({arg_type: args[arg_type]})):
+                # the index range is the result
+                return kept
+            from_where, index_params = self._from_where(index_args)
+            return connection.execute(f"SELECT COUNT(*) {from_where}", index_params).fetchone()[0]
+        return len(self)
+
+    def _select_tracks(self, args: ArgsDict, order_by: str) -> FilterResult:
+        from_where, params = self._from_where(args)
+        columns = ", ".join(f"f.{column}" for column in FILES_COLUMNS)
+        sql = f"SELECT {columns} {from_where} ORDER BY {order_by}"
+        rows = self._get_connection().execute(sql, params)
+        # results are cached, so repeated values are shared within each result
+        strings: Dict[str, str] = {}
+        intern = strings.setdefault
+        tracks = [
+            Track.from_path(
+                path,
+                title,
+                intern(artist, artist),
+                intern(album, album),
+                intern(albumartist, albumartist),
+                intern(genre, genre),
+                year,
+                intern=lambda s: intern(s, s),
+            )
+            for path, title, artist, album, albumartist, genre, year in rows
+        ]
+        return FilterResult(tracks, self._count_candidates(sql, params, args, len(tracks)))
+
+    def filter(self, args: ArgsDict) -> FilterResult:
+        return self._select_tracks(args, "f.rowid")
+
+    def filter_by_year(self, args: ArgsDict) -> FilterResult:
+        return self._select_tracks(args, "f.year DESC, f.rowid")
+
+    def count_values(self, arg_type: ArgType, args: ArgsDict) -> Dict[str, int]:
+        if not has_filter_args(args) and arg_type in self._value_counts:
+            return dict(self._value_counts[arg_type])
+        column = "CAST(f.year AS TEXT)" if arg_type == ArgTypes.List.Str.Year else LIST_ARG_TYPE_COLUMNS[arg_type]
+        from_where, params = self._from_where(args, join_artists=arg_type in ARGS_REQUIRING_ARTIST)
+        rows = self._get_connection().execute(
+            f"SELECT {column}, COUNT(*) {from_where} GROUP BY {column} ORDER BY MIN(f.rowid)", params
+        )
+        counts = {value: count for value, count in rows}
+        if not has_filter_args(args):
+            self._value_counts[arg_type] = counts
+            return dict(counts)
+        return counts
+
+    def count_artist_geo_codes(self, args: ArgsDict) -> Dict[ArtistGeoCodes, int]:
+        if not self.has_artists_table:
+            return {}
+        if not has_filter_args(args):
+            if self._artist_geo_code_counts is None:
+                rows = self._get_connection().execute(
+                    "SELECT country_code, region_code, city, COUNT(*) FROM artists"
+                    " GROUP BY country_code, region_code, city ORDER BY MIN(rowid)"
+                )
+                self._artist_geo_code_counts = self._geo_code_counts(rows)
+            return dict(self._artist_geo_code_counts)
+        from_where, params = self._from_where(args, join_artists=True, conditions=["a.id IS NOT NULL"])
+        rows = self._get_connection().execute(
+            f"SELECT a.country_code, a.region_code, a.city, COUNT(DISTINCT a.id) {from_where}"
+            " GROUP BY a.country_code, a.region_code, a.city ORDER BY MIN(a.id)",
+            params,
+        )
+        return self._geo_code_counts(rows)
+
+    def _search_tables(self, words: List[str], limit: int) -> List[SearchResult]:
+        """Returns the search results from the search tables (see create_search_tables)"""
+        text = " ".join(words)
+        connection = self._get_connection()
+        matches: Dict[int, int] = {}
+        # the documents are numbered in result order, so the best matches are the first ones of each index range
+        rows = connection.execute(
+            "SELECT doc FROM mediaserver_search WHERE text = ? ORDER BY doc LIMIT ?", [text, limit]
+        )
+        matches.update((doc, SCORE_EXACT) for (doc,) in rows)
+        if len(matches) < limit:
+            rows = connection.execute(
+                "SELECT doc FROM mediaserver_search WHERE text > ? AND text < ? ORDER BY doc LIMIT ?",
+                [text, text + _MAX_CHAR, limit - len(matches)],
+            )
+            matches.update((doc, SCORE_PREFIX) for (doc,) in rows)
+        if len(matches) < limit:
+            # the documents with a word starting with the rarest query word (by its postings, counted up to
+            # SEARCH_WORD_COUNT_LIMIT), checked for the other query words on their texts
+            unique_words = list(dict.fromkeys(words))
+            word = min(
+                unique_words,
+                key=lambda candidate: connection.execute(
+                    "SELECT COUNT(*) FROM"
+                    " (SELECT 1 FROM mediaserver_search_words WHERE word >= ? AND word < ? LIMIT ?)",
+                    [candidate, candidate + _MAX_CHAR, SEARCH_WORD_COUNT_LIMIT],
+                ).fetchone()[0],
+            )
+            other_words = [other_word for other_word in unique_words if other_word != word]
+            word_conditions = "".join(" AND ' ' || s.text LIKE ? ESCAPE '\\'" for _ in other_words)
+            rows = connection.execute(
+                f"SELECT DISTINCT w.doc FROM mediaserver_search_words w JOIN mediaserver_search s ON s.doc = w.doc"
+                f" WHERE w.word >= ? AND w.word < ?{word_conditions} ORDER BY w.doc LIMIT ?",
+                [word, word + _MAX_CHAR] + [f"% {like_escape(other_word)}%" for other_word in other_words] + [limit],
+            )
+            for (doc,) in rows:
+                if len(matches) >= limit:
+                    break
+                matches.setdefault(doc, SCORE_WORDS)
+        arg_types = {str(arg_type): arg_type for arg_type in SEARCH_ARG_TYPES}
+        rows = connection.execute(
+            f"SELECT doc, arg_type, value, artist, album FROM mediaserver_search"
+            f" WHERE doc IN ({', '.join('?' * len(matches))})",
+            list(matches),
+        )
+        results = {doc: (arg_types[arg_type], value, artist, album) for doc, arg_type, value, artist, album in rows}
+        ordered = sorted(matches.items(), key=lambda match: (-match[1], match[0]))
+        return [SearchResult(*results[doc], score) for doc, score in ordered]
+
+    def search(self, query: str, limit: int) -> List[SearchResult]:
+        words = normalize_search_text(query).split()
+        if not words or limit <= 0:
+            return []
+        if self.has_search_tables:
+            return self._search_tables(words, limit)
+        text = " ".join(words)
+
+        word_conditions = " AND ".join(["' ' || text LIKE ? ESCAPE '\\'"] * len(words))
+        ret: List[SearchResult] = []
+        for arg_type in SEARCH_ARG_TYPES:
+            value, artist, album, group_by, rank = SEARCH_COLUMNS[arg_type]
+            rows = self._get_connection().execute(
+                f"SELECT value, artist, album,"
+                f" CASE WHEN text = ? THEN {SCORE_EXACT} WHEN text LIKE ? ESCAPE '\\' THEN {SCORE_PREFIX}"
+                f" ELSE {SCORE_WORDS} END AS score"
+                f" FROM (SELECT {value} AS value, {artist} AS artist, {album} AS album,"
+                f" search_text({value}) AS text, {rank} AS rank FROM files f"
+                f" WHERE {self._search_condition(arg_type)} {group_by})"
+                f" WHERE {word_conditions} ORDER BY score DESC, rank LIMIT ?",
+                [text, like_escape(text) + "%"] + [f"% {like_escape(word)}%" for word in words] + [limit],
+            )
+            ret.extend(SearchResult(arg_type, *row) for row in rows)
+        # stable, so results of the same score stay in SEARCH_ARG_TYPES order then rank
+        ret.sort(key=lambda result: -result.score)
+        return ret[:limit]
+
+    @classmethod
+    def _geo_code_counts(cls, rows: Iterable[Tuple[Any, ...]]) -> Dict[ArtistGeoCodes, int]:
+        counts: Dict[ArtistGeoCodes, int] = {}
+        for country_code, region_code, city, count in rows:
+            geo_codes = (country_code or "", region_code or "", city or "")
+            counts[geo_codes] = counts.get(geo_codes, 0) + count
+        return counts
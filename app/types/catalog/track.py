@@ -0,0 +1,75 @@
+from typing import Any, Callable, Tuple
+
+
+class Track:
+    """
+    Compact server-side record of a track (media file), with the MediaFile attributes used by the routes
+    and templates. Slotted (no per-instance __dict__), and the path is stored as a (directory, filename)
+    pair so that the directory string can be shared by all of the tracks in it.
+    Catalog backends pass interned strings, so repeated values (genre, artist, etc.) are stored once.
+    """
+
+    __slots__ = ("directory", "filename", "title", "artist", "album", "albumartist", "genre", "year")
+
+    def __init__(
+        self,
+        directory: str,
+        filename: str,
+        title: str,
+        artist: str,
+        album: str,
+        albumartist: str,
+        genre: str,
+        year: int,
+    ):
+        """directory is the path of the track's directory, including the trailing separator"""
+        self.directory = directory
+        self.filename = filename
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.albumartist = albumartist
+        self.genre = genre
+        self.year = year
+
+    @classmethod
+    def from_path(
+        cls,
+        path: str,
+        title: str,
+        artist: str,
+        album: str,
+        albumartist: str,
+        genre: str,
+        year: int,
+        intern: Callable[[str], str] = lambda s: s,
+    ) -> "Track":
+        """Returns a Track for the given path, with intern applied to its directory"""
+        directory, separator, filename = path.rpartition("/")
+        return cls(intern(directory + separator), filename, title, artist, album, albumartist, genre, year)
+
+    @property
+    def path(self) -> str:
+        return self.directory + self.filename
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # pickled positionally (e.g. in the catalog snapshot), the pickle memo keeps shared strings shared
+        return (
+            Track,
+            (
+                self.directory,
+                self.filename,
+                self.title,
+                self.artist,
+                self.album,
+                self.albumartist,
+                self.genre,
+                self.year,
+            ),
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Track(path={self.path!r}, title={self.title!r}, artist={self.artist!r}, album={self.album!r},"
+            f" albumartist={self.albumartist!r}, genre={self.genre!r}, year={self.year!r})"
+        )
@@ -0,0 +1,27 @@
+from dataclasses import dataclass, field
+from dataclass_wizard import YAMLWizard
+
+
+@dataclass
+class BandwidthConfig(YAMLWizard):
+    # /getfile output rate limits in bytes per second, per client IP and for all clients together (0 for no limit),
+    # clients over a limit get paced (slower) output rather than errors
+    client_bytes_per_second: int = field(default=0)
+    global_bytes_per_second: int = field(default=0)
+    # bytes that can be sent at full speed before the rate limits apply, defaults to one second's worth
+    burst_bytes: int = field(default=0)
+    # behind nginx, have nginx pace each response to client_bytes_per_second (X-Accel-Limit-Rate header)
+    # instead of pacing it in a worker thread, which is then held for the whole (slowed down) response,
+    # the global rate limit and burst are then left to the nginx configuration
+    use_x_accel_limit_rate: bool = field(default=False)
+    # max concurrently streamed audio files, per client IP and for all clients together (0 for no limit),
+    # streams over a limit get a 503 right away, with a Retry-After of stream_retry_after_seconds.
+    # Paced streams each hold a worker thread, and the streams can all land on the same worker, so keep
+    # max_streams well below flask_config.threads (e.g. half), leaving threads for the pages and API requests
+    max_client_streams: int = field(default=0)
+    max_streams: int = field(default=0)
+    stream_retry_after_seconds: int = field(default=5)
+    # use the X-Forwarded-For address set by the reverse proxy in front of the server as the client IP
+    trust_x_forwarded_for: bool = field(default=False)
+    # size of the chunks rate limited output is sent in
+    chunk_size: int = field(default=65536)
@@ -0,0 +1,31 @@
+from typing import List
+
+from dataclasses import dataclass, field
+from dataclass_wizard import YAMLWizard
+
+
+@dataclass
+class CompressionConfig(YAMLWizard):
+    # compress responses (gzip, or brotli if installed and accepted by the client) and static files
+    enabled: bool = field(default=True)
+    # responses smaller than this are sent uncompressed
+    min_size: int = field(default=1024)
+    # compression levels of responses (static files are compressed once, at the highest levels)
+    gzip_level: int = field(default=6)
+    brotli_quality: int = field(default=5)
+    # content types which are compressed (audio and images are already compressed)
+    mimetypes: List[str] = field(
+        default_factory=lambda: [
+            "text/html",
+            "text/css",
+            "text/plain",
+            "text/javascript",
+            "application/javascript",
+            "application/json",
+            "image/svg+xml",
+            "image/vnd.microsoft.icon",
+            "image/x-icon",
+        ]
+    )
+    # Cache-Control max-age of static files requested by their versioned (content hashed) URL
+    static_max_age_seconds: int = field(default=31536000)
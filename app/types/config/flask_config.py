@@ -14,3 +14,7 @@ class FlaskConfig(YAMLWizard):
     debug: bool = field(default=True)
     use_debugger: bool = field(default=True)
     use_reloader: bool = field(default=True)
+    # production server (python run.py serve): gunicorn worker processes (0 for one per CPU),
+    # and threads per worker (each stream being sent takes up a thread)
+    workers: int = field(default=0)
+    threads: int = field(default=8)
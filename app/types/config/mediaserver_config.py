@@ -1,18 +1,68 @@
+from typing import List, Optional
+
 from dataclasses import dataclass, field
 from dataclass_wizard import YAMLWizard
 
+from app.types.config.bandwidth_config import BandwidthConfig
+from app.types.config.compression_config import CompressionConfig
 from app.types.config.playback_methods_config import PlaybackMethodsConfig
 from app.types.config.flask_config import FlaskConfig
+from app.types.config.thumbnails_config import ThumbnailsConfig
 
 
 @dataclass
 class MediaServerConfig(YAMLWizard):
     version: int = field(default=1)
     mediascan_yaml_path: str = field(default="../mediascan/out/")
+    # catalog backend: "yaml" (files.yaml/artists.yaml, in memory) or "sqlite" (mediascan.db, on disk)
+    catalog_backend: str = field(default="yaml")
+    mediascan_db_path: str = field(default="../mediascan/out/mediascan.db")
     album_covers_path: str = field(default="/data/")
     age_verification: bool = field(default=True)
+    # hides the "all albums" page, and enables the bandwidth limits (if any are configured in bandwidth)
     limit_bandwidth: bool = field(default=True)
     max_results: int = field(default=50000)
+    # page size of /albums (album covers) and /tracks (0 for a single page)
     max_results_album_covers: int = field(default=500)
+    tracks_page_size: int = field(default=1000)
+    # stream the rendered /tracks and /albums pages as they're rendered, rather than rendering them in full first
+    stream_templates: bool = field(default=False)
+    result_cache_max_entries: int = field(default=1024)
+    result_cache_ttl_seconds: int = field(default=3600)
+    # max cached random orders (sort=random permutations, by filter and seed)
+    shuffle_cache_max_entries: int = field(default=64)
+    # max cached rendered index pages and template fragments ({% cache %}), cleared when the catalog is reloaded
+    render_cache_max_entries: int = field(default=256)
+    # /api/track avoids replaying the last player_no_repeat_tracks tracks it picked for a player session
+    # (for up to player_sessions_max_entries sessions), and returns up to api_track_max_count tracks (count arg)
+    player_no_repeat_tracks: int = field(default=50)
+    player_sessions_max_entries: int = field(default=4096)
+    api_track_max_count: int = field(default=10)
+    # max results of /search, and of /api/search (limit arg, default api_search_default_limit)
+    search_max_results: int = field(default=100)
+    api_search_default_limit: int = field(default=10)
+    # tracks the player queues (and preloads the next one of) with each /api/track request
+    player_queue_length: int = field(default=3)
+    # load the catalog from a binary snapshot (written next to files.yaml) instead of parsing the YAML files
+    catalog_snapshot_enabled: bool = field(default=True)
+    # /getfile caches the stat of served files (including missing files) for up to file_stat_cache_ttl_seconds
+    file_stat_cache_max_entries: int = field(default=4096)
+    file_stat_cache_ttl_seconds: int = field(default=60)
+    # Cache-Control max-age of cover images served by /getfile (audio files are always revalidated)
+    cover_max_age_seconds: int = field(default=86400)
+    # poll interval for reloading the catalog when files.yaml/artists.yaml change (0 to disable)
+    catalog_reload_interval_seconds: int = field(default=0)
+    # serve request and span durations, counters and cache stats at /metrics (Prometheus text format),
+    # to requests with the admin_token (e.g. Prometheus' authorization credentials) or from metrics_scrape_addresses
+    # (client IPs, see bandwidth.trust_x_forwarded_for)
+    metrics_enabled: bool = field(default=False)
+    metrics_scrape_addresses: List[str] = field(default_factory=list)
+    # fraction of requests (0 to 1) whose span durations and counters are logged e.g. 0.01 for 1 in 100
+    trace_sample_rate: float = field(default=0.0)
+    # token required by the /admin/ routes e.g. POST /admin/reload (the /admin/ routes are disabled if not set)
+    admin_token: Optional[str] = field(default=None)
     flask_config: FlaskConfig = field(default_factory=FlaskConfig)
     playback_methods: PlaybackMethodsConfig = field(default_factory=PlaybackMethodsConfig)
+    thumbnails: ThumbnailsConfig = field(default_factory=ThumbnailsConfig)
+    bandwidth: BandwidthConfig = field(default_factory=BandwidthConfig)
+    compression: CompressionConfig = field(default_factory=CompressionConfig)
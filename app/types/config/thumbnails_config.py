@@ -0,0 +1,19 @@
+from typing import List, Optional
+
+from dataclasses import dataclass, field
+from dataclass_wizard import YAMLWizard
+
+
+@dataclass
+class ThumbnailsConfig(YAMLWizard):
+    # serve cover thumbnails on the albums page (requires Pillow, full size covers are served without it)
+    enabled: bool = field(default=True)
+    # thumbnail sizes (max width/height in pixels), the only sizes served by /thumbnail/
+    sizes: List[int] = field(default_factory=lambda: [150, 300, 600])
+    # "webp" or "jpeg"
+    format: str = field(default="webp")
+    quality: int = field(default=80)
+    # thumbnail cache directory, defaults to .thumbnails/ under album_covers_path
+    cache_path: Optional[str] = field(default=None)
+    # number of threads generating thumbnails on demand
+    workers: int = field(default=2)
@@ -0,0 +1,34 @@
+import mimetypes
+import os
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+
+class FileStat(NamedTuple):
+    """The stat of a file served by /getfile, with the response headers derived from it"""
+
+    path: str
+    size: int
+    mtime: float
+    # strong ETag, changes whenever the file is replaced or modified
+    etag: str
+    mimetype: str
+
+    @classmethod
+    def from_stat_result(cls, path: str, stat: os.stat_result) -> "FileStat":
+        mimetype, _ = mimetypes.guess_type(path)
+        return cls(
+            path,
+            stat.st_size,
+            stat.st_mtime,
+            f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}",
+            mimetype or "application/octet-stream",
+        )
+
+    @property
+    def last_modified(self) -> datetime:
+        return datetime.fromtimestamp(self.mtime, timezone.utc)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """Returns True if stat is of the same version of the file"""
+        return self.etag == f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
@@ -0,0 +1,241 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.types.result_cache import ResultCache
+
+# label values of a metric (its label names are fixed when the metric is registered)
+LabelValues = Tuple[str, ...]
+
+# upper bounds (in seconds) of the histogram buckets of durations, from 1ms to 10s
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    if not len(label_names):
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in label_values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(label_names, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, value: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def drain(self) -> Dict[LabelValues, float]:
+        """Returns the values counted since the last drain, and resets them"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelValues, float]):
+        """Adds values (drained from another Counter of the same metric)"""
+        with self._lock:
+            for label_values, value in values.items():
+                self._values[label_values] = self._values.get(label_values, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value:g}")
+        return lines
+
+
+class Gauge:
+    """
+    Current values (e.g. sizes), set by owner (e.g. worker process) and rendered as their sum over the owners.
+    The values of an owner which hasn't set them for owner_ttl_seconds (e.g. an exited worker) are dropped.
+    """
+
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (), owner_ttl_seconds: float = 60):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.owner_ttl_seconds = owner_ttl_seconds
+        # (time set, values by label values) by owner
+        self._owner_values: Dict[int, Tuple[float, Dict[LabelValues, float]]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *label_values: str, owner: int = 0):
+        with self._lock:
+            _, values = self._owner_values.get(owner, (0.0, {}))
+            values[label_values] = value
+            self._owner_values[owner] = (time.monotonic(), values)
+
+    def get_values(self, owner: int = 0) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._owner_values.get(owner, (0.0, {}))[1])
+
+    def merge(self, values: Dict[LabelValues, float], owner: int):
+        """Replaces the values of owner (read from another Gauge of the same metric)"""
+        with self._lock:
+            self._owner_values[owner] = (time.monotonic(), dict(values))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        totals: Dict[LabelValues, float] = {}
+        with self._lock:
+            now = time.monotonic()
+            for owner, (set_time, values) in list(self._owner_values.items()):
+                if now - set_time > self.owner_ttl_seconds:
+                    del self._owner_values[owner]
+                    continue
+                for label_values, value in values.items():
+                    totals[label_values] = totals.get(label_values, 0) + value
+        for label_values, value in sorted(totals.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Counts of observed values (e.g. durations) by bucket, with their total, as Prometheus histograms"""
+
+    def __init__(
+        self, name: str, help: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # (count per bucket, not cumulative, with a last +Inf bucket, and the sum of the values) by label values
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[label_values] = entry
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1][0] += value
+
+    def get_count(self, *label_values: str) -> int:
+        entry = self._values.get(label_values)
+        return sum(entry[0]) if entry is not None else 0
+
+    def drain(self) -> Dict[LabelValues, Tuple[List[int], List[float]]]:
+        """Returns the values observed since the last drain, and resets them"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelValues, Tuple[List[int], List[float]]]):
+        """Adds values (drained from another Histogram of the same metric)"""
+        with self._lock:
+            for label_values, (counts, total) in values.items():
+                entry = self._values.get(label_values)
+                if entry is None:
+                    entry = ([0] * (len(self.buckets) + 1), [0.0])
+                    self._values[label_values] = entry
+                for i, count in enumerate(counts):
+                    entry[0][i] += count
+                entry[1][0] += total[0]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bucket_label_names = self.label_names + ("le",)
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(bucket_label_names, label_values + (le,))} {cumulative}"
+                    )
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {total[0]:g}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    The server's counters, gauges and histograms, rendered in the Prometheus text format by /metrics.
+    Updates take a lock per metric (they are a few dict operations), so they can be made on hot paths.
+
+    Worker processes each count in their own Metrics, and periodically add them (see drain) to the Metrics
+    shared by the workers (see SharedStateManager and merge), which /metrics renders.
+    """
+
+    def __init__(self):
+        self.requests = Counter("mediaserver_requests_total", "Requests by endpoint and status", ("endpoint", "status"))
+        self.request_seconds = Histogram(
+            "mediaserver_request_seconds", "Request durations (until the response is returned)", ("endpoint",)
+        )
+        self.span_seconds = Histogram(
+            "mediaserver_span_seconds",
+            "Durations of the parts of requests (parse_args, filter, sort, render)",
+            ("span",),
+        )
+        self.filter_candidates = Counter(
+            "mediaserver_filter_candidates_total",
+            "Candidate catalog files read by the filters (on result cache misses)",
+        )
+        self.filter_kept = Counter("mediaserver_filter_kept_total", "Catalog files matching the filters")
+        self.cache_hits = Counter("mediaserver_cache_hits_total", "Cache hits", ("cache",))
+        self.cache_misses = Counter("mediaserver_cache_misses_total", "Cache misses", ("cache",))
+        self.cache_entries = Gauge("mediaserver_cache_entries", "Cached entries", ("cache",))
+        self._counters = (self.requests, self.filter_candidates, self.filter_kept, self.cache_hits, self.cache_misses)
+        self._histograms = (self.request_seconds, self.span_seconds)
+        # (cache, hits, misses) by cache name, as of the last collect_cache
+        self._cache_stats: Dict[str, Tuple[ResultCache, int, int]] = {}
+        self._cache_lock = threading.Lock()
+
+    def collect_cache(self, name: str, cache: ResultCache):
+        """
+        Counts the hits and misses of cache since the last collect_cache of the name
+        (all of them if it's another cache, e.g. the result cache of a reloaded catalog), and its entries
+        """
+        with self._cache_lock:
+            hits, misses = cache.hits, cache.misses
+            last = self._cache_stats.get(name)
+            if last is not None and last[0] is cache:
+                self.cache_hits.inc(name, value=hits - last[1])
+                self.cache_misses.inc(name, value=misses - last[2])
+            else:
+                self.cache_hits.inc(name, value=hits)
+                self.cache_misses.inc(name, value=misses)
+            self._cache_stats[name] = (cache, hits, misses)
+            self.cache_entries.set(len(cache), name)
+
+    def drain(self) -> Dict[str, Any]:
+        """Returns the counted and observed values since the last drain (resetting them), and the gauge values"""
+        values: Dict[str, Any] = {metric.name: metric.drain() for metric in self._counters + self._histograms}
+        values[self.cache_entries.name] = self.cache_entries.get_values()
+        return values
+
+    def merge(self, values: Dict[str, Any], owner: int):
+        """Adds values drained from the Metrics of owner (a worker process)"""
+        for metric in self._counters + self._histograms:
+            metric.merge(values.get(metric.name, {}))
+        self.cache_entries.merge(values.get(self.cache_entries.name, {}), owner)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (
+            self.requests,
+            self.request_seconds,
+            self.span_seconds,
+            self.filter_candidates,
+            self.filter_kept,
+            self.cache_hits,
+            self.cache_misses,
+            self.cache_entries,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
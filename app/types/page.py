@@ -0,0 +1,65 @@
+import base64
+import binascii
+from typing import Callable, Generic, List, NamedTuple, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+
+class PageArgs(NamedTuple):
+    """
+    The requested page of a result set. seed is the seed of the random order (sort=random),
+    which is kept from page to page (in the cursor) so that the pages don't overlap.
+    """
+
+    offset: int = 0
+    limit: int = 0
+    seed: Optional[int] = None
+
+    def to_cursor(self, offset: int) -> str:
+        """Returns the opaque cursor of the page at offset (with the same seed)"""
+        value = f"{offset}.{'' if self.seed is None else self.seed}"
+        return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+    @classmethod
+    def from_cursor(cls, cursor: str, limit: int) -> "PageArgs":
+        """Returns the page args of a cursor returned by to_cursor, raises ValueError for an invalid cursor"""
+        try:
+            value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        except (binascii.Error, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor '{cursor}'") from e
+        offset, _, seed = value.partition(".")
+        # the seed is signed, as the seed arg is (e.g. seed=-5)
+        if not offset.isdigit() or (seed and not (seed[1:] if seed.startswith("-") else seed).isdigit()):
+            raise ValueError(f"Invalid cursor '{cursor}'")
+        return cls(int(offset), limit, int(seed) if seed else None)
+
+
+class Page(NamedTuple, Generic[T]):
+    """A page of a result set, with the cursors of the previous and next pages (None on the first/last page)"""
+
+    items: List[T]
+    offset: int
+    total: int
+    prev_cursor: Optional[str]
+    next_cursor: Optional[str]
+
+    def map_items(self, f: Callable[[T], U]) -> "Page[U]":
+        """Returns the page with f applied to each of its items"""
+        return Page([f(item) for item in self.items], self.offset, self.total, self.prev_cursor, self.next_cursor)
+
+    @classmethod
+    def from_sequence(cls, items: Sequence[T], page_args: PageArgs) -> "Page[T]":
+        """Returns the page of items (which are in a stable order) for page_args, limit <= 0 means all items"""
+        total = len(items)
+        offset = min(page_args.offset, total)
+        if page_args.limit <= 0:
+            return cls(list(items[offset:]), offset, total, None, None)
+        end = offset + page_args.limit
+        prev_cursor = None
+        if offset > 0:
+            prev_cursor = page_args.to_cursor(max(0, offset - page_args.limit))
+        next_cursor = None
+        if end < total:
+            next_cursor = page_args.to_cursor(end)
+        return cls(list(items[offset:end]), offset, total, prev_cursor, next_cursor)
@@ -0,0 +1,26 @@
+from array import array
+from typing import List, Sequence, TypeVar, Union, overload
+
+T = TypeVar("T")
+
+
+class PermutedSequence(Sequence[T]):
+    """Read-only view of items in the order of permutation (an array of indexes of items), e.g. a seeded shuffle"""
+
+    def __init__(self, items: Sequence[T], permutation: array):
+        self.items = items
+        self.permutation = permutation
+
+    def __len__(self) -> int:
+        return len(self.permutation)
+
+    @overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[T]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[T, List[T]]:
+        if isinstance(index, slice):
+            return [self.items[i] for i in self.permutation[index]]
+        return self.items[self.permutation[index]]
@@ -0,0 +1,68 @@
+import random
+import threading
+from collections import deque, OrderedDict
+from typing import Deque, Hashable, List, Set, Tuple
+
+# (recently picked candidate indexes, in order, and the same as a set)
+RecentPicks = Tuple[Deque[int], Set[int]]
+
+
+class PlayerSessions:
+    """
+    Per-session queues of recently picked tracks, so that random picks (e.g. by /api/track) don't replay them.
+    Each session has one queue per filter (the tracks are picked by their index in the filtered tracks).
+    Up to max_sessions sessions and max_filters filters per session are kept, least recently used are dropped.
+    """
+
+    def __init__(self, max_recent: int = 50, max_sessions: int = 4096, max_filters: int = 8):
+        self.max_recent = max_recent
+        self.max_sessions = max_sessions
+        self.max_filters = max_filters
+        self._sessions: "OrderedDict[str, OrderedDict[Hashable, RecentPicks]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _get_recent_picks(self, session_id: str, filter_key: Hashable, max_len: int) -> RecentPicks:
+        filters = self._sessions.get(session_id)
+        if filters is None:
+            filters = OrderedDict()
+            self._sessions[session_id] = filters
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        recent_picks = filters.get(filter_key)
+        if recent_picks is None or recent_picks[0].maxlen != max_len:
+            # new filter, or the number of candidates changed (e.g. the catalog was reloaded)
+            recent_picks = (deque(maxlen=max_len), set())
+            filters[filter_key] = recent_picks
+            while len(filters) > self.max_filters:
+                filters.popitem(last=False)
+        else:
+            filters.move_to_end(filter_key)
+        return recent_picks
+
+    def sample(self, session_id: str, filter_key: Hashable, n: int, count: int = 1) -> List[int]:
+        """
+        Returns count random indexes in range(n) (the candidates), avoiding the session's recent picks
+        for filter_key. At most half of the candidates are excluded as recent, so that a pick takes
+        two tries on average, in O(1) regardless of the number of candidates.
+        """
+        if n <= 0:
+            return []
+        ret: List[int] = []
+        with self._lock:
+            recent, recent_set = self._get_recent_picks(session_id, filter_key, min(self.max_recent, n // 2))
+            for _ in range(count):
+                index = random.randrange(n)
+                while index in recent_set:
+                    index = random.randrange(n)
+                ret.append(index)
+                if recent.maxlen:
+                    if len(recent) == recent.maxlen:
+                        recent_set.discard(recent[0])
+                    recent.append(index)
+                    recent_set.add(index)
+        return ret
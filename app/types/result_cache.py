@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ResultCache:
+    """
+    Bounded, thread-safe LRU cache with a time to live (TTL) for computed results.
+    Cached values are shared between callers, so they must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        """max_entries <= 0 disables caching, ttl_seconds <= 0 means entries never expire"""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], T]) -> T:
+        if self.max_entries <= 0:
+            return compute()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if self.ttl_seconds <= 0 or now < expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value  # type: ignore
+                del self._entries[key]
+            self.misses += 1
+        # computed outside of the lock so that slow computations don't block other keys,
+        # at worst a value is computed more than once by concurrent requests
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,136 @@
+import heapq
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+
+from app.types.arg_types import ArgType, ArgTypes
+
+# Match quality scores of search results (higher is better)
+SCORE_EXACT = 3  # the whole value matches the query
+SCORE_PREFIX = 2  # the value starts with the query
+SCORE_WORDS = 1  # every word of the query starts a word of the value
+
+# The ArgTypeListStr values which are searched, in order of preference for results of the same match quality
+SEARCH_ARG_TYPES: List[ArgType] = [
+    ArgTypes.List.Str.Genre,
+    ArgTypes.List.Str.Artist,
+    ArgTypes.List.Str.AlbumArtist,
+    ArgTypes.List.Str.Album,
+    ArgTypes.List.Str.Title,
+]
+
+
+class SearchResult(NamedTuple):
+    """
+    A value matching a search query: arg_type is the ArgTypeListStr of the value, artist and album are
+    the artist and album the value belongs to (the album's album artist for an album, empty where not applicable)
+    """
+
+    arg_type: ArgType
+    value: str
+    artist: str
+    album: str
+    score: int
+
+
+_WORD_RE = re.compile(r"\w+")
+# greater than any character, so that [prefix, prefix + _MAX_CHAR) is the range of the strings starting with prefix
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize_search_text(s: str) -> str:
+    """
+    Returns s folded for search, i.e. case folded, without diacritics (accents) and with its words
+    (runs of letters and digits) separated by single spaces, e.g. "Beyoncé - Déjà Vu" returns "beyonce deja vu"
+    """
+    if s.isascii():
+        return " ".join(_WORD_RE.findall(s.lower()))
+    decomposed = unicodedata.normalize("NFKD", s)
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return " ".join(_WORD_RE.findall(folded))
+
+
+class SearchIndex:
+    """
+    In-memory prefix index of the normalized (see normalize_search_text) texts of documents, numbered by rank,
+    i.e. the documents are given in order of preference, and results of the same match quality are returned in
+    document order.
+
+    Both the whole texts and their words are kept sorted, with the (ascending) documents of each word,
+    so that the texts or words starting with a prefix are a bisect range rather than a scan of every document.
+    """
+
+    def __init__(self, texts: Iterable[str]):
+        self.texts: List[str] = [normalize_search_text(text) for text in texts]
+        # (normalized text, document) sorted by text then document
+        text_docs = sorted((text, doc) for doc, text in enumerate(self.texts) if text)
+        self.sorted_texts: List[str] = [text for text, _ in text_docs]
+        self.sorted_text_docs = array("I", [doc for _, doc in text_docs])
+        postings: Dict[str, array] = {}
+        for doc, text in enumerate(self.texts):
+            for word in set(text.split()):
+                docs = postings.get(word)
+                if docs is None:
+                    docs = postings[word] = array("I")
+                docs.append(doc)
+        self.words: List[str] = sorted(postings)
+        self.word_docs: List[array] = [postings[word] for word in self.words]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def _prefix_range(cls, keys: Sequence[str], prefix: str) -> Tuple[int, int]:
+        return bisect_left(keys, prefix), bisect_left(keys, prefix + _MAX_CHAR)
+
+    def _word_prefix_docs(self, prefix: str) -> Tuple[int, Iterator[int]]:
+        """Returns the number of (word, document) postings of the words starting with prefix and their documents"""
+        start, end = self._prefix_range(self.words, prefix)
+        word_docs = self.word_docs[start:end]
+        size = sum(len(docs) for docs in word_docs)
+        if len(word_docs) == 1:
+            return size, iter(word_docs[0])
+        # a document with several words starting with prefix appears once per word
+        return size, heapq.merge(*word_docs)
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, int]]:
+        """
+        Returns up to limit (document, score) matches of query, best first (by score then document), i.e.
+        the documents whose text is query, then those whose text starts with query,
+        then those with a word starting with each word of query (e.g. "zep ii" matches "Led Zeppelin II")
+        """
+        query_words = normalize_search_text(query).split()
+        if not query_words or limit <= 0:
+            return []
+        text = " ".join(query_words)
+        matches: Dict[int, int] = {}
+
+        start, end = self._prefix_range(self.sorted_texts, text)
+        exact_end = bisect_left(self.sorted_texts, text + " ", start, end)
+        # documents are ascending within the exact matches (sorted by text then document)
+        for doc in self.sorted_text_docs[start : min(exact_end, start + limit)]:
+            matches[doc] = SCORE_EXACT
+        if len(matches) < limit and exact_end < end:
+            for doc in heapq.nsmallest(limit - len(matches), self.sorted_text_docs[exact_end:end]):
+                matches[doc] = SCORE_PREFIX
+
+        if len(matches) < limit:
+            # walk the documents of the rarest query word in order, checking the other words on the texts,
+            # until enough documents are found (the best ranked ones, so most queries stop early)
+            candidates = [self._word_prefix_docs(word) for word in query_words]
+            _, docs = min(candidates, key=lambda candidate: candidate[0])
+            other_words = [" " + word for word in query_words]
+            previous = -1
+            for doc in docs:
+                if doc == previous or doc in matches:
+                    continue
+                previous = doc
+                doc_text = " " + self.texts[doc]
+                if all(word in doc_text for word in other_words):
+                    matches[doc] = SCORE_WORDS
+                    if len(matches) >= limit:
+                        break
+
+        return sorted(matches.items(), key=lambda match: (-match[1], match[0]))
@@ -0,0 +1,52 @@
+from multiprocessing.managers import BaseManager, BaseProxy
+from typing import Any, Dict
+
+from app.types.bandwidth_limiter import BandwidthLimiter
+from app.types.metrics import Metrics
+from app.types.player_sessions import PlayerSessions
+
+
+class BandwidthLimiterProxy(BaseProxy):
+    """Proxy of a BandwidthLimiter served by a SharedStateManager, its limits are read once (they don't change)"""
+
+    _exposed_ = ("__getattribute__", "reserve", "acquire_stream", "release_stream")
+
+    def _call(self, method: str, *args: Any) -> Any:
+        return self._callmethod(method, args)  # type: ignore[func-returns-value]
+
+    def _get_limit_flag(self, name: str) -> bool:
+        flags: Dict[str, bool] = self.__dict__.setdefault("_limit_flags", {})
+        if name not in flags:
+            flags[name] = self._call("__getattribute__", name)
+        return flags[name]
+
+    @property
+    def is_rate_limited(self) -> bool:
+        return self._get_limit_flag("is_rate_limited")
+
+    @property
+    def is_stream_limited(self) -> bool:
+        return self._get_limit_flag("is_stream_limited")
+
+    def reserve(self, client: str, n: int) -> float:
+        return self._call("reserve", client, n)
+
+    def acquire_stream(self, client: str, owner: int) -> bool:
+        return self._call("acquire_stream", client, owner)
+
+    def release_stream(self, client: str, owner: int):
+        self._call("release_stream", client, owner)
+
+
+class SharedStateManager(BaseManager):
+    """
+    Server process holding the state shared by the gunicorn worker processes (see run_gunicorn):
+    the bandwidth limits and stream slots, the player sessions, and the metrics (which the workers add theirs to).
+    Its objects are made (e.g. manager.PlayerSessions(...)) in the master process, before the workers are forked,
+    which call them through the returned proxies.
+    """
+
+
+SharedStateManager.register("BandwidthLimiter", BandwidthLimiter, BandwidthLimiterProxy)
+SharedStateManager.register("PlayerSessions", PlayerSessions)
+SharedStateManager.register("Metrics", Metrics)
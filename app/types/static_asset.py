@@ -0,0 +1,13 @@
+from typing import Dict, NamedTuple
+
+
+class StaticAsset(NamedTuple):
+    """A file of the static folder, with its content hash (for versioned URLs) and its compressed versions"""
+
+    path: str
+    mtime_ns: int
+    mimetype: str
+    # first 12 hex digits of the content's sha256, the v arg of the file's static URL
+    hash: str
+    # the content by Content-Encoding: "identity", and "br"/"gzip" if they are smaller
+    bodies: Dict[str, bytes]
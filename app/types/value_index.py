@@ -0,0 +1,131 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Set
+
+from app.types.arg_types import ArgValueScalarEnumMatch, ArgValues
+from app.types.search_index import normalize_search_text
+
+# greater than any character, so that [prefix, prefix + _MAX_CHAR) is the range of the strings starting with prefix
+_MAX_CHAR = "\U0010ffff"
+
+
+def get_max_edit_distance(s: str) -> int:
+    """Returns the edit distance within which a value matches s (normalized) with match=fuzzy, by the length of s"""
+    if len(s) < 3:
+        return 0
+    if len(s) < 6:
+        return 1
+    return 2
+
+
+def get_trigrams(s: str) -> Set[str]:
+    """Returns the trigrams of s padded with spaces (two before, one after), e.g. "abc": "  a", " ab", "abc", "bc " """
+    padded = f"  {s} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def is_within_edit_distance(a: str, b: str, max_distance: int) -> bool:
+    """Returns True if the Levenshtein distance of a and b is at most max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        # the distance can't decrease in later rows
+        if min(current) > max_distance:
+            return False
+        previous = current
+    return previous[-1] <= max_distance
+
+
+class ValueIndex:
+    """
+    Index of the distinct values of an ArgTypeListStr (the keys of the catalog's lowercase inverted index)
+    by normalized value (see normalize_search_text), which expands an arg value to the keys it matches
+    with each match mode (see ArgValueScalarEnumMatch) without comparing it to every value:
+      exact     the key itself (the arg value lowercased)
+      prefix    a bisect range of the sorted normalized values
+      contains  the intersection of the values with each trigram of the arg value, checked with a substring test
+      fuzzy     the values sharing enough trigrams with the arg value (each edit changes at most 3 of them),
+                of a close enough length, checked with a bounded edit distance
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys: List[str] = list(keys)
+        self.normalized: List[str] = [normalize_search_text(key) for key in self.keys]
+        order = sorted(range(len(self.keys)), key=self.normalized.__getitem__)
+        self.sorted_normalized: List[str] = [self.normalized[key_id] for key_id in order]
+        self.sorted_key_ids = array("I", order)
+        trigram_key_ids: Dict[str, array] = {}
+        for key_id, normalized in enumerate(self.normalized):
+            for trigram in get_trigrams(normalized):
+                key_ids = trigram_key_ids.get(trigram)
+                if key_ids is None:
+                    key_ids = trigram_key_ids[trigram] = array("I")
+                key_ids.append(key_id)
+        self.trigram_key_ids = trigram_key_ids
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _range(self, start_value: str, end_value: str) -> List[str]:
+        """Returns the keys whose normalized values are in [start_value, end_value)"""
+        start = bisect_left(self.sorted_normalized, start_value)
+        end = bisect_left(self.sorted_normalized, end_value, start)
+        return [self.keys[key_id] for key_id in self.sorted_key_ids[start:end]]
+
+    def _prefix(self, value: str) -> List[str]:
+        return self._range(value, value + _MAX_CHAR)
+
+    def _contains(self, value: str) -> List[str]:
+        # the trigrams within value (without the padding), which every value containing it has
+        trigrams = [value[i : i + 3] for i in range(len(value) - 2)]
+        if not trigrams:
+            # too short for trigrams, value is a prefix of a trigram of the values containing it
+            return [key for key, normalized in zip(self.keys, self.normalized) if value in normalized]
+        key_id_arrays = sorted((self.trigram_key_ids.get(trigram, array("I")) for trigram in trigrams), key=len)
+        candidates: Set[int] = set(key_id_arrays[0])
+        for key_ids in key_id_arrays[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(key_ids)
+        return [self.keys[key_id] for key_id in sorted(candidates) if value in self.normalized[key_id]]
+
+    def _fuzzy(self, value: str) -> List[str]:
+        max_distance = get_max_edit_distance(value)
+        if not max_distance:
+            # the normalized value itself ("\0" sorts before any other continuation of it)
+            return self._range(value, value + "\0")
+        trigrams = get_trigrams(value)
+        min_common = len(trigrams) - 3 * max_distance
+        normalized = self.normalized
+        candidates: Iterable[int]
+        if min_common <= 0:
+            candidates = range(len(self.keys))
+        else:
+            common: Dict[int, int] = {}
+            for trigram in trigrams:
+                for key_id in self.trigram_key_ids.get(trigram, ()):
+                    common[key_id] = common.get(key_id, 0) + 1
+            candidates = sorted(key_id for key_id, count in common.items() if count >= min_common)
+        return [
+            self.keys[key_id]
+            for key_id in candidates
+            if is_within_edit_distance(normalized[key_id], value, max_distance)
+        ]
+
+    def expand(self, arg_value: str, match: ArgValueScalarEnumMatch) -> List[str]:
+        """Returns the keys matching arg_value with the match mode"""
+        value = normalize_search_text(arg_value)
+        if match == ArgValues.Scalar.Enum.Match.Exact or not value:
+            # exact, or nothing to match beyond case (e.g. empty values)
+            return [arg_value.lower()]
+        if match == ArgValues.Scalar.Enum.Match.Prefix:
+            return self._prefix(value)
+        if match == ArgValues.Scalar.Enum.Match.Contains:
+            return self._contains(value)
+        return self._fuzzy(value)
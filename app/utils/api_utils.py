@@ -0,0 +1,101 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, TypeVar
+
+from flask import Flask, Request, Response
+from werkzeug.exceptions import BadRequest
+
+from app.types.album_info import AlbumInfo
+from app.types.catalog.track import Track
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.page import Page
+from app.utils.media_files_utils import get_cover_path
+from app.utils.metrics_utils import span
+
+T = TypeVar("T")
+
+# Returns a field of an item of an API response
+FieldGetter = Callable[[T], Any]
+
+# Fields of the albums of /api/albums, in AlbumInfo.to_tuple order
+ALBUM_FIELD_GETTERS: Dict[str, FieldGetter[AlbumInfo]] = {
+    "artist": lambda album: album.artist,
+    "album": lambda album: album.album,
+    "year": lambda album: album.year,
+    "cover_path": lambda album: str(album.cover_path),
+}
+
+
+def get_count_field_getters(
+    field: str, code_name_map: Optional[Dict[str, str]] = None
+) -> Dict[str, FieldGetter[Tuple[str, int]]]:
+    """
+    Returns the fields of the (value, count) items of the count endpoints e.g. /api/artists, field being the
+    name of the value, with the name of each code (or the code itself if it has none) if code_name_map is given
+    """
+    getters: Dict[str, FieldGetter[Tuple[str, int]]] = {field: lambda item: item[0]}
+    if code_name_map is not None:
+        getters["name"] = lambda item: code_name_map.get(item[0], item[0])
+    getters["count"] = lambda item: item[1]
+    return getters
+
+
+def get_track_field_getters(config: MediaServerConfig) -> Dict[str, FieldGetter[Track]]:
+    """Returns the fields of the tracks of /api/tracks, in get_track_info order (the cover path depends on config)"""
+    return {
+        "path": lambda track: track.path,
+        "cover_path": lambda track: str(get_cover_path(config, track)),
+        "artist": lambda track: track.artist,
+        "album": lambda track: track.album,
+        "title": lambda track: track.title,
+        "genre": lambda track: track.genre,
+        "year": lambda track: track.year,
+        "albumartist": lambda track: track.albumartist,
+    }
+
+
+def get_api_fields(request: Request, field_getters: Mapping[str, Any]) -> List[str]:
+    """Returns the fields requested by the fields arg (comma separated, in the order given), by default all of them"""
+    value = request.args.get("fields")
+    if not value:
+        return list(field_getters)
+    fields = [field for field in value.split(",") if field]
+    unknown = [field for field in fields if field not in field_getters]
+    if not fields:
+        raise BadRequest(f"No fields, the fields are: {','.join(field_getters)}")
+    if unknown:
+        raise BadRequest(f"Unknown field(s) '{','.join(unknown)}', the fields are: {','.join(field_getters)}")
+    return fields
+
+
+def api_page_response(
+    app: Flask,
+    request: Request,
+    page: Page[T],
+    field_getters: Mapping[str, FieldGetter[T]],
+    extra: Optional[Dict[str, Any]] = None,
+) -> Response:
+    """
+    Returns the JSON response of a page of items, each item as a compact array of the requested fields, e.g.
+        {"fields": ["artist", "album"], "items": [["Rush", "Moving Pictures"], ...], "offset": 0, "total": 1234,
+         "prev": null, "next": "<cursor of the next page>"}
+    with an ETag of the body, so that clients revalidate it (304 Not Modified if it hasn't changed)
+    """
+    fields = get_api_fields(request, field_getters)
+    getters = [field_getters[field] for field in fields]
+    with span(app, "render"):
+        body = {
+            "fields": fields,
+            "items": [[getter(item) for getter in getters] for item in page.items],
+            "offset": page.offset,
+            "total": page.total,
+            "prev": page.prev_cursor,
+            "next": page.next_cursor,
+            **(extra or {}),
+        }
+        data = json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+    response = app.response_class(data, mimetype="application/json")
+    response.set_etag(hashlib.sha256(data.encode()).hexdigest()[:16])
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return response
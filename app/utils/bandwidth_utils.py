@@ -0,0 +1,119 @@
+import os
+import time
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional
+
+from flask import Flask, Request, Response
+
+from app.types.bandwidth_limiter import BandwidthLimiter
+from app.types.config.mediaserver_config import MediaServerConfig
+
+
+def create_bandwidth_limiter(
+    config: MediaServerConfig, factory: Callable[..., BandwidthLimiter] = BandwidthLimiter
+) -> Optional[BandwidthLimiter]:
+    """
+    Returns the BandwidthLimiter for the configured limits, or None if limit_bandwidth is off or nothing is limited,
+    made by factory (e.g. a SharedStateManager's, for a limiter shared by worker processes)
+    """
+    if not config.limit_bandwidth:
+        return None
+    # with X-Accel-Limit-Rate the output is paced by nginx (see set_x_accel_limit_rate), only the streams are counted
+    is_paced = not config.bandwidth.use_x_accel_limit_rate
+    client_bytes_per_second = config.bandwidth.client_bytes_per_second if is_paced else 0
+    global_bytes_per_second = config.bandwidth.global_bytes_per_second if is_paced else 0
+    limits = (
+        client_bytes_per_second,
+        global_bytes_per_second,
+        config.bandwidth.max_client_streams,
+        config.bandwidth.max_streams,
+    )
+    if not any(limit > 0 for limit in limits):
+        return None
+    return factory(
+        client_bytes_per_second=client_bytes_per_second,
+        global_bytes_per_second=global_bytes_per_second,
+        burst_bytes=config.bandwidth.burst_bytes,
+        max_client_streams=config.bandwidth.max_client_streams,
+        max_streams=config.bandwidth.max_streams,
+    )
+
+
+def check_paced_streams(app: Flask, config: MediaServerConfig):
+    """Warns if the paced streams can take up every thread of a worker (see BandwidthConfig.max_streams)"""
+    limiter = get_bandwidth_limiter(app)
+    if limiter is None or not limiter.is_rate_limited:
+        return
+    max_streams = config.bandwidth.max_streams
+    if max_streams <= 0 or max_streams >= config.flask_config.threads:
+        app.logger.warning(
+            "bandwidth.maxStreams (%d, 0 for no limit) lets paced streams take up all %d threads of a worker, "
+            "set it to at most half of flaskConfig.threads (or use useXAccelLimitRate)",
+            max_streams,
+            config.flask_config.threads,
+        )
+
+
+def get_bandwidth_limiter(app: Flask) -> Optional[BandwidthLimiter]:
+    return app.config.get("BANDWIDTH_LIMITER")
+
+
+def set_x_accel_limit_rate(config: MediaServerConfig, response: Response):
+    """Sets the X-Accel-Limit-Rate header of response to the client rate limit, if use_x_accel_limit_rate is on"""
+    bandwidth = config.bandwidth
+    if config.limit_bandwidth and bandwidth.use_x_accel_limit_rate and bandwidth.client_bytes_per_second > 0:
+        response.headers["X-Accel-Limit-Rate"] = str(bandwidth.client_bytes_per_second)
+
+
+def get_client_ip(config: MediaServerConfig, request: Request) -> str:
+    if config.bandwidth.trust_x_forwarded_for:
+        # the last address is the one added by the reverse proxy, the others are sent by the client
+        forwarded_for = request.headers.getlist("X-Forwarded-For")
+        if forwarded_for:
+            return forwarded_for[-1].split(",")[-1].strip()
+    return request.remote_addr or ""
+
+
+class StreamSlotFile:
+    """
+    File object which releases the client's stream slot when it's closed, i.e. when the response sending it
+    (with the WSGI server's file wrapper, or paced by ThrottledResponse) is closed
+    """
+
+    def __init__(self, file: BinaryIO, limiter: BandwidthLimiter, client: str):
+        self.file = file
+        self.limiter = limiter
+        self.client = client
+        self.has_stream_slot = True
+
+    def __getattr__(self, name: str) -> Any:
+        # read, seek, fileno etc. of the file
+        return getattr(self.file, name)
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            if self.has_stream_slot:
+                self.has_stream_slot = False
+                self.limiter.release_stream(self.client, os.getpid())
+
+
+class ThrottledResponse:
+    """WSGI response iterable which paces the chunks of response to the client's (and the global) rate limit"""
+
+    def __init__(self, response: Iterable[bytes], limiter: BandwidthLimiter, client: str):
+        self.response = response
+        self.limiter = limiter
+        self.client = client
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.response:
+            delay = self.limiter.reserve(self.client, len(chunk))
+            if delay > 0:
+                time.sleep(delay)
+            yield chunk
+
+    def close(self):
+        close = getattr(self.response, "close", None)
+        if close is not None:
+            close()
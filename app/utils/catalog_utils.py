@@ -0,0 +1,334 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from multiprocessing.synchronize import Event
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+
+from flask import Flask
+
+from mediascan import load_files_yaml, load_artists_yaml, Artist, Artists, MediaFiles
+
+from app.types.catalog.base_catalog import BaseCatalog, get_file_artist_path
+from app.types.catalog.catalog import Catalog, CATALOG_SNAPSHOT_VERSION
+from app.types.catalog.sqlite_catalog import SqliteCatalog
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.result_cache import ResultCache
+from app.utils.media_files_utils import get_album_info
+
+
+def build_artist_path_map(app: Flask, files: MediaFiles, artists: Artists) -> Dict[str, Artist]:
+    """
+    Returns a map of artist directory path (without trailing slash) to Artist,
+    so that the artist of a file can be looked up with get_file_artist_path in O(1).
+    Meant to be built once at startup, files whose artist can't be found are reported here
+    (once per artist directory) rather than on every request.
+    """
+    ret: Dict[str, Artist] = {}
+    for a in artists.artists:
+        # first artist wins, in case of duplicate artist paths
+        ret.setdefault(a.path.rstrip("/"), a)
+    missing: Dict[str, int] = {}
+    for f in files.files:
+        file_artist_path = get_file_artist_path(f.path)
+        if file_artist_path not in ret:
+            missing[file_artist_path] = missing.get(file_artist_path, 0) + 1
+    for file_artist_path, count in missing.items():
+        app.logger.error("Failed to find artist for %d file(s) in '%s'", count, file_artist_path)
+    if len(missing):
+        app.logger.warning("Failed to find artist for %d artist directories", len(missing))
+    return ret
+
+
+# Catalog backends (MediaServerConfig.catalog_backend)
+CATALOG_BACKEND_YAML = "yaml"
+CATALOG_BACKEND_SQLITE = "sqlite"
+
+
+def get_catalog_yaml_paths(config: MediaServerConfig) -> Tuple[Path, Path]:
+    """Returns the paths of the mediascan files.yaml and artists.yaml files"""
+    return (
+        Path(config.mediascan_yaml_path).joinpath("files.yaml"),
+        Path(config.mediascan_yaml_path).joinpath("artists.yaml"),
+    )
+
+
+def get_catalog_source_paths(config: MediaServerConfig) -> List[Path]:
+    """Returns the paths of the files the catalog is loaded from, for the configured catalog backend"""
+    if config.catalog_backend == CATALOG_BACKEND_SQLITE:
+        return [Path(config.mediascan_db_path)]
+    return list(get_catalog_yaml_paths(config))
+
+
+def get_catalog_source_mtimes(config: MediaServerConfig) -> List[Optional[float]]:
+    """Returns the modification times of the catalog source files (None if a file doesn't exist)"""
+    ret: List[Optional[float]] = []
+    for path in get_catalog_source_paths(config):
+        try:
+            ret.append(path.stat().st_mtime)
+        except OSError:
+            ret.append(None)
+    return ret
+
+
+def get_catalog_snapshot_path(config: MediaServerConfig) -> Path:
+    """Returns the path of the binary catalog snapshot, which is stored next to the mediascan YAML files"""
+    return Path(config.mediascan_yaml_path).joinpath("catalog.snapshot")
+
+
+def get_file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_catalog_sources_info(config: MediaServerConfig, with_hashes: bool = True) -> List[Dict[str, Any]]:
+    """Returns the name, mtime, size and (optionally) sha256 of each catalog source file"""
+    ret: List[Dict[str, Any]] = []
+    for path in get_catalog_yaml_paths(config):
+        stat = path.stat()
+        ret.append(
+            {
+                "name": path.name,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": get_file_sha256(path) if with_hashes else None,
+            }
+        )
+    return ret
+
+
+def is_catalog_snapshot_current(config: MediaServerConfig, header: Dict[str, Any]) -> bool:
+    """
+    Returns True if the snapshot header matches the current catalog source files.
+    The mtime and size are checked first, the (slower) sha256 only if those differ
+    e.g. when an unchanged file was uploaded again.
+    """
+    if header.get("version") != CATALOG_SNAPSHOT_VERSION:
+        return False
+    sources = get_catalog_sources_info(config, with_hashes=False)
+    snapshot_sources = header.get("sources", [])
+    if len(sources) != len(snapshot_sources):
+        return False
+    for path, source, snapshot_source in zip(get_catalog_yaml_paths(config), sources, snapshot_sources):
+        if source["name"] != snapshot_source["name"] or source["size"] != snapshot_source["size"]:
+            return False
+        if source["mtime"] != snapshot_source["mtime"] and get_file_sha256(path) != snapshot_source["sha256"]:
+            return False
+    return True
+
+
+def load_catalog_snapshot(app: Flask, config: MediaServerConfig) -> Optional[Catalog]:
+    """
+    Returns the catalog from the snapshot, or None if there's no snapshot or it's stale.
+    Note the snapshot is a pickle, so it must be as trusted as the YAML files next to it.
+    """
+    snapshot_path = get_catalog_snapshot_path(config)
+    if not snapshot_path.exists():
+        return None
+    try:
+        with open(snapshot_path, "rb") as f:
+            # the header is pickled separately, so that a stale snapshot is detected without loading the catalog
+            header = pickle.load(f)
+            if not is_catalog_snapshot_current(config, header):
+                app.logger.info("Catalog snapshot %s is stale", snapshot_path)
+                return None
+            catalog = pickle.load(f)
+    except Exception:
+        app.logger.exception("Failed to load catalog snapshot %s", snapshot_path)
+        return None
+    if not isinstance(catalog, Catalog):
+        app.logger.error("Catalog snapshot %s doesn't contain a catalog", snapshot_path)
+        return None
+    return catalog
+
+
+def save_catalog_snapshot(
+    app: Flask, config: MediaServerConfig, catalog: Catalog, sources: List[Dict[str, Any]]
+) -> bool:
+    """
+    Writes the catalog snapshot (atomically, so concurrent loads never see a partial snapshot), stamped with
+    sources, the get_catalog_sources_info of the source files taken before the catalog was parsed from them
+    (so that files replaced during the parse make the snapshot stale, rather than it being stamped with them)
+    """
+    snapshot_path = get_catalog_snapshot_path(config)
+    tmp_path = snapshot_path.with_name(f"{snapshot_path.name}.{os.getpid()}.tmp")
+    header = {"version": CATALOG_SNAPSHOT_VERSION, "sources": sources}
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError:
+        app.logger.exception("Failed to write catalog snapshot %s", snapshot_path)
+        tmp_path.unlink(missing_ok=True)
+        return False
+    app.logger.info("Wrote catalog snapshot %s", snapshot_path)
+    return True
+
+
+def load_catalog_yaml(app: Flask, config: MediaServerConfig) -> Catalog:
+    """Loads the mediascan files.yaml and artists.yaml files and builds the catalog"""
+    files_yaml_path, artists_yaml_path = get_catalog_yaml_paths(config)
+    files = load_files_yaml(str(files_yaml_path))
+    artists = load_artists_yaml(str(artists_yaml_path))
+    artist_path_map = build_artist_path_map(app, files, artists)
+    file_artists = [artist_path_map.get(get_file_artist_path(f.path)) for f in files.files]
+    return Catalog(files, artists, file_artists)
+
+
+def load_catalog_sqlite(app: Flask, config: MediaServerConfig) -> SqliteCatalog:
+    """Opens the mediascan SQLite database, creating the indexes used by the catalog queries if possible"""
+    catalog = SqliteCatalog(config.mediascan_db_path)
+    try:
+        catalog.create_indexes()
+    except sqlite3.Error as e:
+        app.logger.warning("Failed to create indexes in %s (queries will be slower): %s", config.mediascan_db_path, e)
+    return catalog
+
+
+def load_catalog(app: Flask, config: MediaServerConfig) -> BaseCatalog:
+    """
+    Loads the catalog for the configured catalog backend. For the (default) YAML backend, the catalog is
+    loaded from the catalog snapshot if it's current, otherwise from the mediascan YAML files
+    (and then the snapshot is written for next time)
+    """
+    start = time.monotonic()
+    catalog: BaseCatalog
+    if config.catalog_backend == CATALOG_BACKEND_SQLITE:
+        catalog = load_catalog_sqlite(app, config)
+    elif config.catalog_backend == CATALOG_BACKEND_YAML:
+        yaml_catalog = None
+        if config.catalog_snapshot_enabled:
+            yaml_catalog = load_catalog_snapshot(app, config)
+        if yaml_catalog is None:
+            sources = get_catalog_sources_info(config) if config.catalog_snapshot_enabled else []
+            yaml_catalog = load_catalog_yaml(app, config)
+            if config.catalog_snapshot_enabled:
+                save_catalog_snapshot(app, config, yaml_catalog, sources)
+        yaml_catalog.album_infos = [get_album_info(config, track) for track in yaml_catalog.get_album_tracks()]
+        catalog = yaml_catalog
+    else:
+        raise ValueError(f"Unknown catalog backend '{config.catalog_backend}'")
+    catalog.result_cache = ResultCache(config.result_cache_max_entries, config.result_cache_ttl_seconds)
+    catalog.shuffle_cache = ResultCache(config.shuffle_cache_max_entries, config.result_cache_ttl_seconds)
+    app.logger.info(
+        "Loaded %s catalog of %d files in %.2f seconds", config.catalog_backend, len(catalog), time.monotonic() - start
+    )
+    return catalog
+
+
+def build_catalog_snapshot(app: Flask, config: MediaServerConfig) -> bool:
+    """(Re)builds the catalog snapshot from the mediascan YAML files e.g. on the host the files are uploaded from"""
+    sources = get_catalog_sources_info(config)
+    return save_catalog_snapshot(app, config, load_catalog_yaml(app, config), sources)
+
+
+def reload_catalog(app: Flask, config: MediaServerConfig) -> bool:
+    """
+    Loads a new catalog and swaps it in for the current one.
+    The new catalog is built entirely on the side, and the swap is a single assignment, so requests
+    never wait on a reload, and requests which already got the old catalog finish against it.
+    Returns False (keeping the current catalog) if loading the new catalog failed.
+    """
+    start = time.monotonic()
+    try:
+        catalog = load_catalog(app, config)
+    except Exception:
+        app.logger.exception("Failed to reload catalog, keeping the current catalog")
+        return False
+    app.config["MEDIASCAN_CATALOG"] = catalog
+    app.config["CATALOG_VERSION"] += 1
+    # frees the pages rendered from the previous catalog, which are keyed on its version
+    app.config["RENDER_CACHE"].clear()
+    app.logger.info("Reloaded catalog in %.2f seconds", time.monotonic() - start)
+    return True
+
+
+_reload_lock = threading.Lock()
+
+
+def start_catalog_reload(app: Flask, config: MediaServerConfig) -> bool:
+    """
+    Reloads the catalog in a background thread.
+    Returns False if a reload is already in progress (in which case no new reload is started).
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return False
+
+    def reload():
+        try:
+            reload_catalog(app, config)
+        finally:
+            _reload_lock.release()
+
+    threading.Thread(target=reload, name="catalog-reload", daemon=True).start()
+    return True
+
+
+def request_catalog_reload(app: Flask, config: MediaServerConfig) -> bool:
+    """
+    Reloads the catalog in the background: served by worker processes (see run_gunicorn), by requesting it
+    from the master process (see CATALOG_RELOAD_REQUESTED), else with start_catalog_reload.
+    Returns False if a reload is already requested or in progress.
+    """
+    reload_requested: Optional[Event] = app.config.get("CATALOG_RELOAD_REQUESTED")
+    if reload_requested is None:
+        return start_catalog_reload(app, config)
+    if reload_requested.is_set():
+        return False
+    reload_requested.set()
+    return True
+
+
+def start_catalog_watcher(
+    app: Flask,
+    config: MediaServerConfig,
+    mtimes: Optional[List[Optional[float]]] = None,
+    reload_requested: Optional[Event] = None,
+    on_reload: Optional[Callable[[], None]] = None,
+) -> threading.Thread:
+    """
+    Starts a background thread which polls the catalog source files every
+    config.catalog_reload_interval_seconds (if it's set) and reloads the catalog when they change,
+    compared to mtimes (the source mtimes when the current catalog was loaded, defaults to the current mtimes),
+    or when reload_requested is set (see request_catalog_reload).
+    on_reload is called after each successful reload.
+    """
+    interval = config.catalog_reload_interval_seconds
+    if mtimes is None:
+        mtimes = get_catalog_source_mtimes(config)
+
+    def reload():
+        with _reload_lock:
+            reloaded = reload_catalog(app, config)
+        if reloaded and on_reload is not None:
+            on_reload()
+
+    def watch():
+        nonlocal mtimes
+        while True:
+            if reload_requested is None:
+                time.sleep(interval)
+            elif reload_requested.wait(interval if interval > 0 else None):
+                reload_requested.clear()
+                app.logger.info("Catalog reload requested, reloading catalog")
+                mtimes = get_catalog_source_mtimes(config)
+                reload()
+                continue
+            new_mtimes = get_catalog_source_mtimes(config)
+            if new_mtimes == mtimes or None in new_mtimes:
+                continue
+            app.logger.info("Catalog source files changed, reloading catalog")
+            # if the reload fails (e.g. a partially uploaded file) it's retried on the next change
+            mtimes = new_mtimes
+            reload()
+
+    thread = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+    thread.start()
+    return thread
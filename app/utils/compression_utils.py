@@ -0,0 +1,91 @@
+import zlib
+from typing import Iterable, Iterator, List, Optional
+
+from flask import Flask, Request, request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses are gzipped without it
+    brotli = None  # type: ignore
+
+from app.types.config.mediaserver_config import MediaServerConfig
+
+# highest compression levels, for static files which are compressed once
+GZIP_MAX_LEVEL = 9
+BROTLI_MAX_QUALITY = 11
+
+
+def get_encodings() -> List[str]:
+    """Returns the supported Content-Encodings, in order of preference"""
+    if brotli is None:
+        return ["gzip"]
+    return ["br", "gzip"]
+
+
+def choose_encoding(request: Request, encodings: Iterable[str]) -> Optional[str]:
+    """Returns the client's preferred encoding (by Accept-Encoding) of encodings, or None for identity"""
+    return request.accept_encodings.best_match(list(encodings))
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return zlib.compress(data, level, wbits=31)
+
+
+def iter_compressed(iterable: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    """Compresses a streamed response's chunks, flushing after each one so that they are sent as they're rendered"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        for chunk in iterable:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressobj = zlib.compressobj(level, zlib.DEFLATED, 31)
+        for chunk in iterable:
+            yield compressobj.compress(chunk) + compressobj.flush(zlib.Z_SYNC_FLUSH)
+        yield compressobj.flush()
+
+
+def compress_response(request: Request, response: Response, config: MediaServerConfig) -> Response:
+    """
+    Compresses the response (e.g. the HTML pages and JSON) with the client's preferred encoding, if its
+    content type is compressible. Responses which are already encoded or are files (e.g. /getfile's
+    passthrough responses, and the static files, which are compressed in advance) are left as they are.
+    """
+    compression = config.compression
+    if (
+        not compression.enabled
+        or response.status_code != 200
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in compression.mimetypes
+        or request.endpoint == "static"
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request, get_encodings())
+    if encoding is None:
+        return response
+    level = compression.brotli_quality if encoding == "br" else compression.gzip_level
+    if response.is_streamed:
+        response.response = iter_compressed(response.iter_encoded(), encoding, level)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < compression.min_size:
+            return response
+        response.set_data(compress(data, encoding, level))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # the compressed content isn't byte for byte the same, but it's equivalent, which is what a weak ETag means
+        # (and If-None-Match uses the weak comparison, so it still validates against the uncompressed ETag)
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app: Flask, config: MediaServerConfig):
+    @app.after_request
+    def compress_after_request(response: Response) -> Response:
+        return compress_response(request, response, config)
@@ -0,0 +1,126 @@
+import gc
+import multiprocessing
+import os
+import signal
+from typing import Any, Dict
+
+from flask import Flask
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # gunicorn is only needed by python run.py serve
+    BaseApplication = None  # type: ignore
+
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.shared_state_manager import SharedStateManager
+from app.utils.bandwidth_utils import create_bandwidth_limiter
+from app.utils.catalog_utils import start_catalog_watcher
+from app.utils.metrics_utils import flush_metrics, start_metrics_flusher
+
+
+def get_worker_count(config: MediaServerConfig) -> int:
+    """Returns the configured number of worker processes, defaulting to one per CPU available to the server"""
+    if config.flask_config.workers > 0:
+        return config.flask_config.workers
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on all platforms
+        return os.cpu_count() or 1
+
+
+def _freeze_objects():
+    # moves the catalog's objects out of the garbage collector's reach, so that collections in the workers
+    # don't write to (and so copy) the pages they share with the master process
+    gc.collect()
+    gc.freeze()
+
+
+def _ignore_signals():
+    # the workers still use the manager while they shut down, it's stopped when the master exits
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+def start_shared_state(app: Flask, config: MediaServerConfig) -> SharedStateManager:
+    """
+    Starts the SharedStateManager holding the bandwidth limiter, player sessions and metrics of the worker
+    processes, in place of the ones of create_app (which are per process)
+    """
+    manager = SharedStateManager()
+    manager.start(_ignore_signals)
+    app.config["BANDWIDTH_LIMITER"] = create_bandwidth_limiter(config, manager.BandwidthLimiter)  # type: ignore
+    app.config["PLAYER_SESSIONS"] = manager.PlayerSessions(  # type: ignore
+        config.player_no_repeat_tracks, config.player_sessions_max_entries
+    )
+    app.config["SHARED_METRICS"] = manager.Metrics()  # type: ignore
+    return manager
+
+
+def get_gunicorn_options(app: Flask, config: MediaServerConfig) -> Dict[str, Any]:
+    def reload_workers():
+        # replaces the workers with ones forked from the reloaded catalog (gracefully, see gunicorn's HUP)
+        gc.unfreeze()
+        _freeze_objects()
+        os.kill(os.getpid(), signal.SIGHUP)
+
+    def when_ready(server):
+        # the catalog is reloaded once, in the master, rather than by each worker (losing the shared memory)
+        start_catalog_watcher(
+            app,
+            config,
+            app.config["CATALOG_SOURCE_MTIMES"],
+            reload_requested=app.config["CATALOG_RELOAD_REQUESTED"],
+            on_reload=reload_workers,
+        )
+
+    def post_fork(server, worker):
+        # as in the processes started by multiprocessing: the master's children (the manager process) aren't
+        # the worker's, which would otherwise try to join them at exit
+        multiprocessing.process._children.clear()  # type: ignore[attr-defined]
+        if config.metrics_enabled:
+            start_metrics_flusher(app)
+
+    def worker_exit(server, worker):
+        if config.metrics_enabled:
+            flush_metrics(app)
+
+    return {
+        "bind": f"{config.flask_config.host}:{config.flask_config.port}",
+        "workers": get_worker_count(config),
+        # threaded workers, so that slow clients (e.g. streaming audio) don't block a whole worker process
+        "worker_class": "gthread",
+        "threads": config.flask_config.threads,
+        # the app (and catalog) is loaded once, before forking the workers
+        "preload_app": True,
+        "when_ready": when_ready,
+        "post_fork": post_fork,
+        "worker_exit": worker_exit,
+    }
+
+
+def run_gunicorn(app: Flask, config: MediaServerConfig):
+    """
+    Serves the app with gunicorn worker processes forked from this one, so that they share the memory
+    of the (read-only) catalog loaded by create_app, copy-on-write, rather than each loading a copy.
+    The catalog is reloaded by this (master) process, which then replaces the workers,
+    and the state of the workers is shared through a SharedStateManager.
+    """
+    if BaseApplication is None:
+        raise SystemExit("gunicorn is required to serve with worker processes, install it with: pip install gunicorn")
+    options = get_gunicorn_options(app, config)
+
+    class MediaServerApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    # set by POST /admin/reload in a worker, see request_catalog_reload
+    app.config["CATALOG_RELOAD_REQUESTED"] = multiprocessing.Event()
+    # frozen before the manager process is forked, which then doesn't copy the catalog's pages either
+    _freeze_objects()
+    start_shared_state(app, config)
+    app.logger.info("Serving on %s with %d workers", options["bind"], options["workers"])
+    MediaServerApplication().run()
@@ -1,7 +1,8 @@
 import json
+from array import array
 import os
 import random
-from typing import cast, Dict, List, Set
+from typing import Any, Callable, cast, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
 from urllib.parse import quote_plus  # type: ignore
 from pathlib import Path
 import sys
@@ -9,220 +10,263 @@ from flask.json import jsonify
 
 from flask import Flask
 
-from mediascan import Artists, MediaFiles, MediaFile
-
 from app.types.config.mediaserver_config import MediaServerConfig
 from app.types.arg_types import (
-    args_dict_to_str,
+    args_dict_to_key,
     ArgsDict,
+    ArgsDictStr,
     ArgType,
     ArgTypes,
     ArgValues,
-    ArgValueListStr,
-    ArgValueScalarInt,
+    ArgValueScalarEnumSort,
 )
 from app.types.album_info import AlbumInfo
-from app.utils.string_utils import str_in_list_ignore_case
+from app.types.catalog.base_catalog import ArtistGeoCodes, BaseCatalog
+from app.types.catalog.track import Track
+from app.types.page import Page, PageArgs
+from app.types.permuted_sequence import PermutedSequence
+from app.types.player_sessions import PlayerSessions
+from app.types.search_index import normalize_search_text, SearchResult
 from app.utils.app_utils import get_config
+from app.utils.metrics_utils import count_filtered, span
+
+T = TypeVar("T")
+
+# The sort and seed args don't affect which files match, so they're excluded from the cache key of base (unsorted)
+# results
+EXCLUDE_ORDER: List[ArgType] = [ArgTypes.Scalar.Enum.Sort, ArgTypes.Scalar.Int.Seed]
 
 
-def file_and_artist_paths_match(file_path: str, artist_path: str):
+def get_cached_result(
+    catalog: BaseCatalog, name: str, args: ArgsDict, compute: Callable[[], T], exclude: Iterable[ArgType] = ()
+) -> T:
     """
-    compare the artist and track (media file) paths
-    this is is the most foolproof method,
-    since we can assume a given file was scanned from a given artist directory
-    if the leading part of the file path (i.e. the artist dir path) is identical.
-    TODO: Add validation to ensure artist_name[0] matches ID3 tag albumartist value(s).
-
-    # Prevent incomplete match e.g. these do not match:
-    # "/data/Music/M"
-    # "/data/Music/Municipal Waste/Hazardous Mutation [2005]/01 - Intro - Deathripper.mp3"
+    Returns the result of compute() from the catalog's result cache, keyed on name and the canonical
+    form of args. The result is shared with other requests, so it must not be modified (copy it first).
     """
-    # below was SLOW:
-    #   return str(Path(file_path).parent.parent) == artist_path
-    # so now have this:
-    tokens = file_path.split(os.sep)
-    # leading slash results in first token being '', this ensures leading slash will be restored by the join
-    file_artist_path = "/".join(tokens[:-2])
-    # as processed above, file_artist_path will not have a trailing slash, so use startswith
-    # just in case file_path has a trailing slash
-    return artist_path.startswith(file_artist_path)
-
-
-# These arguments require artist data from artists.yaml file (generated from artist.yaml files)
-ARGS_REQUIRING_ARTIST = [ArgTypes.List.Str.CountryCode, ArgTypes.List.Str.RegionCode, ArgTypes.List.Str.City]
-
-
-def filter_files(app: Flask, files: MediaFiles, artists: Artists, args: ArgsDict) -> List[MediaFile]:
-    app.logger.info("filter_files args=%s", args_dict_to_str(args))
-
-    ret: List[MediaFile] = []
-    for f in files.files:
-        artist = None
-        get_artist = False
-
-        # if any of the arguments requiring artists.yaml data are in the supplied arguments
-        if any(item in args.keys() for item in ARGS_REQUIRING_ARTIST):
-            get_artist = True
-
-        if get_artist:
-            # get artist associated with this file
-            # TODO: Optimize
-            artist = None
-            for a in artists.artists:
-                if file_and_artist_paths_match(f.path, a.path):
-                    artist = a
-                    break
-            if artist is None:
-                app.logger.error(f"Failed to find artist for file '{f.path}'")
-
-        # ArgTypeScalarInt:
-        arg_type = ArgTypes.Scalar.Int.MinYear
-        if arg_type in args:
-            arg_value = cast(ArgValueScalarInt, args[arg_type])
-            if arg_value and f.year < arg_value:
-                app.logger.info(
-                    "skipping file (value=%s) based on filter arg %s=%s",
-                    arg_value,
-                    arg_type,
-                    arg_value,
-                )
-                app.logger.info("filter_files args=%s", args_dict_to_str(args))
-                continue
-        arg_type = ArgTypes.Scalar.Int.MaxYear
-        if arg_type in args:
-            arg_value = cast(ArgValueScalarInt, args[arg_type])
-            if arg_value and f.year > arg_value:
-                app.logger.info(
-                    "skipping file (value=%s) based on filter arg %s=%s",
-                    arg_value,
-                    arg_type,
-                    arg_value,
-                )
-                app.logger.info("filter_files args=%s", args_dict_to_str(args))
-                continue
-        # ArgTypeListStr:
-        skip_file = False
-        country_code = ""
-        region_code = ""
-        city = ""
-        if artist is not None:
-            country_code = artist.artist_data.country_code
-            region_code = artist.artist_data.region_code
-            city = artist.artist_data.city
-        arg_type_list_file_value_map: Dict[ArgType, str] = {
-            ArgTypes.List.Str.Artist: f.artist,
-            ArgTypes.List.Str.AlbumArtist: f.albumartist,
-            ArgTypes.List.Str.Album: f.album,
-            ArgTypes.List.Str.Genre: f.genre,
-            ArgTypes.List.Str.Title: f.title,
-            ArgTypes.List.Str.Year: str(f.year),
-            ArgTypes.List.Str.CountryCode: country_code,
-            ArgTypes.List.Str.RegionCode: region_code,
-            ArgTypes.List.Str.City: city,
-        }
-        for arg_type, file_value in arg_type_list_file_value_map.items():
-            if arg_type in args:
-                arg_value_list = cast(ArgValueListStr, args[arg_type])
-                app.logger.info("filtering based on %s[] arg = [%s]", arg_type, arg_value_list)
-                if len(arg_value_list) and not str_in_list_ignore_case(file_value, arg_value_list):
-                    app.logger.info(
-                        "skipping file (value=%s) based on %s[] arg = [%s]",
-                        file_value,
-                        arg_type,
-                        arg_value_list,
-                    )
-                    app.logger.info("filter_files args=%s", args_dict_to_str(args))
-                    skip_file = True
-                    break
-        if not skip_file:
-            # app.logger.info("appending file %s", f)
-            # app.logger.info("filter_files args=%s", args_dict_to_str(args))
-            ret.append(f)
-    return ret
+    return catalog.result_cache.get_or_compute((name, args_dict_to_key(args, exclude)), compute)
 
 
-def get_genres(files: MediaFiles) -> List[str]:
-    ret: Set[str] = set()  # type: ignore
-    for f in files.files:
-        ret.add(f.genre)
-    return sorted(ret)
+def filter_files(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> List[Track]:
+    app.logger.debug("filter_files args=%s", ArgsDictStr(args))
+    with span(app, "filter"):
+        result = catalog.filter(args)
+    count_filtered(app, result.candidates, len(result.tracks))
+    return result.tracks
 
 
-def get_genre_counts(files: MediaFiles, sort: str) -> Dict[str, int]:
-    ret: Dict[str, int] = {}
-    for f in files.files:
-        if f.genre in ret:
-            ret[f.genre] += 1
-        else:
-            ret[f.genre] = 1
+def filter_files_sorted_by_year(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> List[Track]:
+    """Same as filter_files, but sorted by year (descending) using the catalog's year index"""
+    app.logger.debug("filter_files_sorted_by_year args=%s", ArgsDictStr(args))
+    with span(app, "filter"):
+        result = catalog.filter_by_year(args)
+    count_filtered(app, result.candidates, len(result.tracks))
+    return result.tracks
+
+
+def get_genres(catalog: BaseCatalog) -> List[str]:
+    return sorted(catalog.count_values(ArgTypes.List.Str.Genre, {}))
+
+
+def _get_genre_counts(catalog: BaseCatalog, sort: str, args: Optional[ArgsDict] = None) -> Dict[str, int]:
+    ret = catalog.count_values(ArgTypes.List.Str.Genre, args or {})
     if sort == "name":
         return dict(sorted(ret.items(), key=lambda item: item[0], reverse=False))
     else:  # default sort: by count
         return dict(sorted(ret.items(), key=lambda item: item[1], reverse=True))
 
 
-def get_tracks(app: Flask, files: MediaFiles, artists: Artists, args: ArgsDict) -> List[MediaFile]:
-    ret = filter_files(app, files, artists, args)
+def get_genre_counts(catalog: BaseCatalog, sort: str) -> Dict[str, int]:
+    return catalog.result_cache.get_or_compute(("genre_counts", sort), lambda: _get_genre_counts(catalog, sort))
+
+
+def get_filtered_genre_counts(catalog: BaseCatalog, args: ArgsDict) -> Dict[str, int]:
+    """Returns the genre counts of the files matching args, sorted by the sort arg (name, or by default count)"""
+    sort = str(args.get(ArgTypes.Scalar.Enum.Sort, ArgValues.Scalar.Enum.Sort.Count))
+    return get_cached_result(catalog, "filtered_genre_counts", args, lambda: _get_genre_counts(catalog, sort, args))
+
+
+def search(app: Flask, catalog: BaseCatalog, query: str, limit: int) -> List[SearchResult]:
+    """Returns up to limit search results of query, cached by normalized query (so "Café" and "cafe " share results)"""
+
+    def compute() -> List[SearchResult]:
+        with span(app, "search"):
+            return catalog.search(query, limit)
+
+    return catalog.result_cache.get_or_compute(("search", normalize_search_text(query), limit), compute)
+
+
+def new_seed() -> int:
+    """Returns a new seed for a random order (sort=random)"""
+    return random.getrandbits(32)
+
+
+def get_seed(args: ArgsDict) -> Optional[int]:
+    if ArgTypes.Scalar.Int.Seed in args:
+        return cast(int, args[ArgTypes.Scalar.Int.Seed])
+    return None
+
+
+def _get_permutation(n: int, seed: int) -> array:
+    permutation = list(range(n))
+    random.Random(seed).shuffle(permutation)
+    return array("I", permutation)
+
 
+def get_shuffled(
+    app: Flask, catalog: BaseCatalog, name: str, args: ArgsDict, items: List[T], seed: Optional[int]
+) -> Sequence[T]:
+    """
+    Returns items (the cached result name for args) in a random order. For a given seed the order is always
+    the same, and the permutation is computed once per filter and seed (and cached, as an array of indexes).
+    Without a seed, returns a shuffled copy (the cached results are shared).
+    """
+    if seed is None:
+        with span(app, "sort"):
+            ret = list(items)
+            random.shuffle(ret)
+        return ret
+
+    def compute_permutation() -> array:
+        with span(app, "sort"):
+            return _get_permutation(len(items), seed)
+
+    permutation = catalog.shuffle_cache.get_or_compute(
+        (name, args_dict_to_key(args, EXCLUDE_ORDER), seed), compute_permutation
+    )
+    return PermutedSequence(items, permutation)
+
+
+def get_tracks(app: Flask, catalog: BaseCatalog, args: ArgsDict, seed: Optional[int] = None) -> Sequence[Track]:
+    """Returns the files matching args as sorted, seed (or the seed arg) is the seed of the random order"""
     sort = ArgValues.Scalar.Enum.Sort.Random
     if ArgTypes.Scalar.Enum.Sort in args:
-        sort = args[ArgTypes.Scalar.Enum.Sort]
+        sort = cast(ArgValueScalarEnumSort, args[ArgTypes.Scalar.Enum.Sort])
 
     # Don't reorder tracks if displaying tracks for single album or a specific artist
-    if (
+    reorder = (
         ArgTypes.List.Str.Album not in args
         and ArgTypes.List.Str.Artist not in args
         and ArgTypes.List.Str.AlbumArtist not in args
-    ):
-        if sort == ArgValues.Scalar.Enum.Sort.Year:
-            ret = list(
-                sorted(
-                    ret,
-                    key=lambda x: x.year,
-                    reverse=True,
-                )
-            )
-        elif sort == ArgValues.Scalar.Enum.Sort.Random:
-            random.shuffle(ret)
-
+    )
+
+    if reorder and sort == ArgValues.Scalar.Enum.Sort.Year:
+        # already sorted by year (descending) by the catalog's year index
+        return get_cached_result(
+            catalog,
+            "files_sorted_by_year",
+            args,
+            lambda: filter_files_sorted_by_year(app, catalog, args),
+            EXCLUDE_ORDER,
+        )
+
+    ret = get_cached_result(catalog, "files", args, lambda: filter_files(app, catalog, args), EXCLUDE_ORDER)
+    if reorder and sort == ArgValues.Scalar.Enum.Sort.Random:
+        return get_shuffled(app, catalog, "files", args, ret, seed if seed is not None else get_seed(args))
     return ret
 
 
-def get_artist_counts(app: Flask, files: MediaFiles, artists: Artists, args: ArgsDict) -> Dict[str, int]:
-    ret: Dict[str, int] = {}
+def get_player_sessions(app: Flask) -> PlayerSessions:
+    return app.config["PLAYER_SESSIONS"]
 
-    files_filtered = filter_files(app, files, artists, args)
-    for f in files_filtered:
-        if f.artist in ret:
-            ret[f.artist] += 1
-        else:
-            ret[f.artist] = 1
+
+def get_random_tracks(
+    app: Flask, catalog: BaseCatalog, args: ArgsDict, count: int = 1, session_id: Optional[str] = None
+) -> List[Track]:
+    """
+    Returns count random files matching args, picked by index from the cached files matching args (in O(1)).
+    With the seed arg, returns the first files of its random order instead. With a (player) session_id,
+    the files recently picked for the session are avoided.
+    """
+    tracks = get_cached_result(catalog, "files", args, lambda: filter_files(app, catalog, args), EXCLUDE_ORDER)
+    if not len(tracks):
+        return []
+    seed = get_seed(args)
+    if seed is not None:
+        return list(get_shuffled(app, catalog, "files", args, tracks, seed)[:count])
+    if session_id is None:
+        return [random.choice(tracks) for _ in range(count)]
+    indexes = get_player_sessions(app).sample(session_id, args_dict_to_key(args, EXCLUDE_ORDER), len(tracks), count)
+    return [tracks[index] for index in indexes]
+
+
+def _get_page_args_with_seed(args: ArgsDict, page_args: PageArgs) -> PageArgs:
+    """
+    Returns page_args with the seed arg, or the seed of the page cursor, or a new seed for a first page
+    (only for a random order, so that the pages of other orders are the same on every request)
+    """
+    if args.get(ArgTypes.Scalar.Enum.Sort, ArgValues.Scalar.Enum.Sort.Random) != ArgValues.Scalar.Enum.Sort.Random:
+        return page_args
+    seed = get_seed(args)
+    if seed is None:
+        seed = page_args.seed if page_args.seed is not None else new_seed()
+    return page_args._replace(seed=seed)
+
+
+def get_tracks_page(app: Flask, catalog: BaseCatalog, args: ArgsDict, page_args: PageArgs) -> Page[Track]:
+    """Returns the requested page of get_tracks"""
+    page_args = _get_page_args_with_seed(args, page_args)
+    return Page.from_sequence(get_tracks(app, catalog, args, page_args.seed), page_args)
+
+
+def _get_artist_counts(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> Dict[str, int]:
+    """Returns the artist counts sorted by count"""
+    app.logger.debug("get_artist_counts args=%s", ArgsDictStr(args))
+    ret = catalog.count_values(ArgTypes.List.Str.Artist, args)
+
+    items = sorted(ret.items(), key=lambda item: item[1], reverse=True)
+    return dict(items)
+
+
+def get_artist_counts(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> Dict[str, int]:
+    ret = get_cached_result(
+        catalog, "artist_counts", args, lambda: _get_artist_counts(app, catalog, args), EXCLUDE_ORDER
+    )
 
     sort = ArgValues.Scalar.Enum.Sort.Year
     if ArgTypes.Scalar.Enum.Sort in args:
-        sort = args[ArgTypes.Scalar.Enum.Sort]
+        sort = cast(ArgValueScalarEnumSort, args[ArgTypes.Scalar.Enum.Sort])
 
     if sort == ArgValues.Scalar.Enum.Sort.Name:
-        return dict(sorted(ret.items(), key=lambda item: item[0], reverse=False))
+        return get_cached_result(
+            catalog,
+            "artist_counts_by_name",
+            args,
+            lambda: dict(sorted(ret.items(), key=lambda item: item[0], reverse=False)),
+            EXCLUDE_ORDER,
+        )
     elif sort == ArgValues.Scalar.Enum.Sort.Random:
-        items = list(ret.items())
-        random.shuffle(items)
-        return dict(items)
-    else:  # default sort: by count
-        items = sorted(ret.items(), key=lambda item: item[1], reverse=True)
-        ret = dict(items)
+        seed = get_seed(args)
+        if seed is None:
+            items = list(ret.items())
+            random.shuffle(items)
+            return dict(items)
+        return get_cached_result(
+            catalog,
+            "artist_counts_shuffled",
+            args,
+            lambda: dict(get_shuffled(app, catalog, "artist_counts", args, list(ret.items()), seed)),
+            [ArgTypes.Scalar.Enum.Sort],
+        )
 
+    # default sort: by count
     return ret
 
 
+# Static JSON data files (by path), loaded once
+_static_json_data: Dict[str, Any] = {}
+
+
 def get_static_json_data(app: Flask, filename: str):
     if app.static_folder is None:
         sys.exit(1)
     full_path = os.path.join(app.static_folder, "json_data", filename)
+    if full_path in _static_json_data:
+        return _static_json_data[full_path]
     try:
         with open(full_path, "r") as json_file:
-            return json.load(json_file)
+            _static_json_data[full_path] = json.load(json_file)
+            return _static_json_data[full_path]
     except FileNotFoundError:
         app.logger.error("Data file not found")
     except json.JSONDecodeError:
@@ -238,13 +282,23 @@ def get_region_code_name_map(app: Flask) -> Dict[str, str]:
     return get_static_json_data(app, "region_code_name_map.json")
 
 
-def get_artist_country_code_counts(app: Flask, artists: Artists, args: ArgsDict) -> Dict[str, int]:
+def get_artist_geo_code_counts(catalog: BaseCatalog, args: ArgsDict) -> Dict[ArtistGeoCodes, int]:
+    """Returns the artist counts per (country code, region code, city), see BaseCatalog.count_artist_geo_codes"""
+    return get_cached_result(
+        catalog, "artist_geo_code_counts", args, lambda: catalog.count_artist_geo_codes(args), EXCLUDE_ORDER
+    )
+
+
+def _sum_artist_geo_code_counts(
+    geo_code_counts: Dict[ArtistGeoCodes, int], key: Callable[[ArtistGeoCodes], str]
+) -> Dict[str, int]:
     ret: Dict[str, int] = {}
-    for artist in artists.artists:
-        if artist.artist_data.country_code in ret:
-            ret[artist.artist_data.country_code] += 1
+    for geo_codes, count in geo_code_counts.items():
+        k = key(geo_codes)
+        if k in ret:
+            ret[k] += count
         else:
-            ret[artist.artist_data.country_code] = 1
+            ret[k] = count
 
     # default sort: by count
     items = sorted(ret.items(), key=lambda item: item[1], reverse=True)
@@ -253,76 +307,92 @@ def get_artist_country_code_counts(app: Flask, artists: Artists, args: ArgsDict)
     return ret
 
 
-def get_artist_region_code_counts(app: Flask, artists: Artists, args: ArgsDict) -> Dict[str, int]:
-    ret: Dict[str, int] = {}
-    for artist in artists.artists:
-        if artist.artist_data.region_code in ret:
-            ret[artist.artist_data.region_code] += 1
-        else:
-            ret[artist.artist_data.region_code] = 1
+def get_artist_country_code_counts(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> Dict[str, int]:
+    return get_cached_result(
+        catalog,
+        "artist_country_code_counts",
+        args,
+        lambda: _sum_artist_geo_code_counts(get_artist_geo_code_counts(catalog, args), lambda geo_codes: geo_codes[0]),
+        EXCLUDE_ORDER,
+    )
 
-    # default sort: by count
-    items = sorted(ret.items(), key=lambda item: item[1], reverse=True)
-    ret = dict(items)
 
-    return ret
+def get_artist_region_code_counts(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> Dict[str, int]:
+    return get_cached_result(
+        catalog,
+        "artist_region_code_counts",
+        args,
+        lambda: _sum_artist_geo_code_counts(get_artist_geo_code_counts(catalog, args), lambda geo_codes: geo_codes[1]),
+        EXCLUDE_ORDER,
+    )
 
 
-def get_artist_city_counts(app: Flask, artists: Artists, args: ArgsDict) -> Dict[str, int]:
+def _get_artist_city_counts(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> Dict[str, int]:
     country_code_name_map = get_country_code_name_map(app)
     region_code_name_map = get_region_code_name_map(app)
-    ret: Dict[str, int] = {}
-    for artist in artists.artists:
+
+    def get_city_uniq(geo_codes: ArtistGeoCodes) -> str:
+        country_code, region_code, city = geo_codes
         city_qualifiers = []
-        if artist.artist_data.region_code in region_code_name_map:
-            region_name = region_code_name_map[artist.artist_data.region_code]
+        if region_code in region_code_name_map:
+            region_name = region_code_name_map[region_code]
             city_qualifiers.append(region_name)
-        if artist.artist_data.country_code in country_code_name_map:
-            country_name = country_code_name_map[artist.artist_data.country_code]
+        if country_code in country_code_name_map:
+            country_name = country_code_name_map[country_code]
             city_qualifiers.append(country_name)
-        city_uniq = artist.artist_data.city
+        city_uniq = city
         if len(city_qualifiers):
             city_uniq = f"{city_uniq} ({', '.join(city_qualifiers)})"
-        if city_uniq in ret:
-            ret[city_uniq] += 1
-        else:
-            ret[city_uniq] = 1
+        return city_uniq
 
-    # default sort: by count
-    items = sorted(ret.items(), key=lambda item: item[1], reverse=True)
-    ret = dict(items)
+    return _sum_artist_geo_code_counts(get_artist_geo_code_counts(catalog, args), get_city_uniq)
 
-    return ret
+
+def get_artist_city_counts(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> Dict[str, int]:
+    return get_cached_result(
+        catalog, "artist_city_counts", args, lambda: _get_artist_city_counts(app, catalog, args), EXCLUDE_ORDER
+    )
 
 
-def get_word_cloud_data_genres(files: MediaFiles) -> List[Dict[str, str]]:
+def _get_word_cloud_data_genres(catalog: BaseCatalog) -> List[Dict[str, str]]:
     ret: List[Dict[str, str]] = []
-    genres = get_genres(files)
+    genres = get_genres(catalog)
     for g in genres:
         ret.append({"text": g})
     return ret
 
 
-def get_artists(app: Flask, files: MediaFiles, artists: Artists, args: ArgsDict) -> List[str]:
-    ret: Set[str] = set()  # type: ignore
-    files_filtered = filter_files(app, files, artists, args)
-    for f in files_filtered:
-        ret.add(f.artist)
-    return sorted(ret)
+def get_word_cloud_data_genres(catalog: BaseCatalog) -> List[Dict[str, str]]:
+    return catalog.result_cache.get_or_compute(
+        ("word_cloud_data_genres",), lambda: _get_word_cloud_data_genres(catalog)
+    )
 
 
-def get_word_cloud_data_artists(
-    app: Flask, files: MediaFiles, artists: Artists, args: ArgsDict
-) -> List[Dict[str, str]]:
+def get_artists(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> List[str]:
+    app.logger.debug("get_artists args=%s", ArgsDictStr(args))
+    return sorted(catalog.count_values(ArgTypes.List.Str.Artist, args))
+
+
+def _get_word_cloud_data_artists(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> List[Dict[str, str]]:
     ret: List[Dict[str, str]] = []
-    artists_filtered = get_artists(app, files, artists, args)
+    artists_filtered = get_artists(app, catalog, args)
     for a in artists_filtered:
         ret.append({"text": a})
     return ret
 
 
-def get_cover_path(config: MediaServerConfig, file: MediaFile) -> Path:
-    dir_path = Path(file.path.replace(os.path.basename(file.path), ""))
+def get_word_cloud_data_artists(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> List[Dict[str, str]]:
+    return get_cached_result(
+        catalog,
+        "word_cloud_data_artists",
+        args,
+        lambda: _get_word_cloud_data_artists(app, catalog, args),
+        EXCLUDE_ORDER,
+    )
+
+
+def get_cover_path(config: MediaServerConfig, file: Track) -> Path:
+    dir_path = Path(file.directory)
     if config.album_covers_path != config.playback_methods.local.media_path:
         # e.g. "/data/Music/Logic/Orville%20[2022]/cover.jpg"
         # config.playback_methods.local.media_path = "/data/Music/"
@@ -331,43 +401,76 @@ def get_cover_path(config: MediaServerConfig, file: MediaFile) -> Path:
     return dir_path / "cover.jpg"
 
 
-def get_albums(
-    app: Flask,
-    files: MediaFiles,
-    artists: Artists,
-    args: ArgsDict,
-) -> List[AlbumInfo]:
-    """Returns a list of one AlbumInfo per unique album"""
-    album_set: Set[AlbumInfo] = set()  # type: ignore
+def get_album_info(config: MediaServerConfig, file: Track) -> AlbumInfo:
+    """Returns the AlbumInfo of the album of the given file"""
+    # try to go with albumartist first, in order to better group files
+    # in the same album together, but fallback to artist as key if
+    # albumartist is not set
+    artist = file.albumartist
+    if not len(artist):
+        artist = file.artist
+    return AlbumInfo(artist, file.album, file.year, get_cover_path(config, file))
+
+
+def _get_albums(app: Flask, files_filtered: Iterable[Track]) -> List[AlbumInfo]:
+    """Returns a list of one AlbumInfo per unique album, in order of first appearance in files_filtered"""
     config = get_config(app)
-    files_filtered = filter_files(app, files, artists, args)
+    # first file of each album, keyed on the AlbumInfo fields (the directory determines the cover path),
+    # so that the AlbumInfo (and cover path) is only built once per album
+    album_files: Dict[Tuple[str, str, int, str], Track] = {}
     for f in files_filtered:
-        # try to go with albumartist first, in order to better group files
-        # in the same album together, but fallback to artist as key if
-        # albumartist is not set
-        artist = f.albumartist
-        if not len(artist):
-            artist = f.artist
-        album_set.add(AlbumInfo(artist, f.album, f.year, get_cover_path(config, f)))
-
-    ret: List[AlbumInfo] = list(album_set)
+        album_files.setdefault((f.albumartist or f.artist, f.album, f.year, f.directory), f)
+    return [get_album_info(config, f) for f in album_files.values()]
+
+
+def filter_albums(app: Flask, catalog: BaseCatalog, args: ArgsDict) -> List[AlbumInfo]:
+    """
+    Returns a list of one AlbumInfo per unique album with files matching args, in order of first appearance,
+    using the catalog's album table if it has one
+    """
+    with span(app, "filter"):
+        album_ids = catalog.filter_album_ids(args)
+    if album_ids is None:
+        return _get_albums(app, filter_files(app, catalog, args))
+    app.logger.debug("filter_albums args=%s", ArgsDictStr(args))
+    album_infos = catalog.album_infos
+    return [album_infos[album_id] for album_id in album_ids]
+
+
+def _sort_albums(albums: List[AlbumInfo], sort: str) -> List[AlbumInfo]:
+    """Returns albums sorted as specified (sort=random is applied by get_albums)"""
+    key: Optional[Callable[[AlbumInfo], Any]] = None
+    if sort == ArgValues.Scalar.Enum.Sort.Year:
+        # stable, so albums of the same year stay in order of first appearance
+        key = lambda album: -album.year
+    elif sort == ArgValues.Scalar.Enum.Sort.Artist:
+        key = lambda album: album.artist
+    elif sort == ArgValues.Scalar.Enum.Sort.Album:
+        key = lambda album: album.album
+
+    if key is not None:
+        return sorted(albums, key=key)
+    return albums
+
+
+def get_albums(app: Flask, catalog: BaseCatalog, args: ArgsDict, seed: Optional[int] = None) -> Sequence[AlbumInfo]:
+    """Returns a list of one AlbumInfo per unique album, seed (or the seed arg) is the seed of the random order"""
     sort = ArgValues.Scalar.Enum.Sort.Random
     if ArgTypes.Scalar.Enum.Sort in args:
-        sort = args[ArgTypes.Scalar.Enum.Sort]
+        sort = cast(ArgValueScalarEnumSort, args[ArgTypes.Scalar.Enum.Sort])
 
-    if sort == ArgValues.Scalar.Enum.Sort.Artist:
-        ret = sorted(ret, key=lambda album: album.artist)
-    elif sort == ArgValues.Scalar.Enum.Sort.Album:
-        ret = sorted(ret, key=lambda album: album.album)
-    elif sort == ArgValues.Scalar.Enum.Sort.Year:
-        # sort by year (descending)
-        ret = sorted(ret, key=lambda album: album.year, reverse=True)
-    elif sort == ArgValues.Scalar.Enum.Sort.Random:
-        random.shuffle(ret)
+    albums = get_cached_result(catalog, "albums", args, lambda: filter_albums(app, catalog, args), EXCLUDE_ORDER)
+    if sort == ArgValues.Scalar.Enum.Sort.Random:
+        return get_shuffled(app, catalog, "albums", args, albums, seed if seed is not None else get_seed(args))
 
-    # now that we have it sorted as specified, slice if necessary to keep the
-    # result count below the configured max results limit for album covers
-    if config.max_results_album_covers > 0 and len(ret) > config.max_results_album_covers:
-        ret = ret[: config.max_results_album_covers]
+    def sort_albums() -> List[AlbumInfo]:
+        with span(app, "sort"):
+            return _sort_albums(albums, sort)
 
-    return ret
+    return get_cached_result(catalog, f"albums_sorted_by_{sort}", args, sort_albums, EXCLUDE_ORDER)
+
+
+def get_albums_page(app: Flask, catalog: BaseCatalog, args: ArgsDict, page_args: PageArgs) -> Page[AlbumInfo]:
+    """Returns the requested page of get_albums"""
+    page_args = _get_page_args_with_seed(args, page_args)
+    return Page.from_sequence(get_albums(app, catalog, args, page_args.seed), page_args)
@@ -0,0 +1,136 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from flask import Flask, g, has_request_context, request, Response
+
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.metrics import Metrics
+
+# seconds between the additions of a worker process's metrics to the shared metrics (see flush_metrics)
+METRICS_FLUSH_INTERVAL_SECONDS = 1
+
+
+def get_metrics(app: Flask) -> Metrics:
+    return app.config["METRICS"]
+
+
+def _get_trace() -> Optional[List[str]]:
+    """Returns the trace of the current request if it's sampled for tracing (see trace_sample_rate), else None"""
+    if not has_request_context():
+        return None
+    return g.get("trace")
+
+
+@contextmanager
+def span(app: Flask, name: str) -> Iterator[None]:
+    """Times a part of a request e.g. with span(app, "filter"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        get_metrics(app).span_seconds.observe(duration, name)
+        trace = _get_trace()
+        if trace is not None:
+            trace.append(f"{name}={duration * 1000:.2f}ms")
+
+
+def count_filtered(app: Flask, candidates: int, kept: int):
+    """Counts the candidate files a filter went through (see FilterResult) and the ones matching it (kept)"""
+    metrics = get_metrics(app)
+    metrics.filter_candidates.inc(value=candidates)
+    metrics.filter_kept.inc(value=kept)
+    trace = _get_trace()
+    if trace is not None:
+        trace.append(f"candidates={candidates} kept={kept}")
+
+
+def get_shared_metrics(app: Flask) -> Optional[Metrics]:
+    """Returns the Metrics shared by the worker processes (see SharedStateManager), or None with a single process"""
+    return app.config.get("SHARED_METRICS")
+
+
+def collect_cache_stats(app: Flask):
+    catalog = app.config["MEDIASCAN_CATALOG"]
+    metrics = get_metrics(app)
+    metrics.collect_cache("result", catalog.result_cache)
+    metrics.collect_cache("shuffle", catalog.shuffle_cache)
+    metrics.collect_cache("render", app.config["RENDER_CACHE"])
+    metrics.collect_cache("file_stat", app.config["FILE_STAT_CACHE"])
+
+
+def flush_metrics(app: Flask):
+    """Adds the metrics of this worker process since the last flush to the shared metrics, if any"""
+    shared_metrics = get_shared_metrics(app)
+    if shared_metrics is None:
+        return
+    collect_cache_stats(app)
+    shared_metrics.merge(get_metrics(app).drain(), os.getpid())
+
+
+def start_metrics_flusher(app: Flask) -> threading.Thread:
+    """Starts a daemon thread which flushes the metrics of this worker process every METRICS_FLUSH_INTERVAL_SECONDS"""
+
+    def flush():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL_SECONDS)
+            try:
+                flush_metrics(app)
+            except Exception:
+                app.logger.exception("Flushing the metrics failed")
+
+    thread = threading.Thread(target=flush, name="metrics-flusher", daemon=True)
+    thread.start()
+    return thread
+
+
+def render_metrics(app: Flask) -> str:
+    """Returns the metrics (of all the worker processes) in the Prometheus text format"""
+    catalog = app.config["MEDIASCAN_CATALOG"]
+    lines = [
+        "# HELP mediaserver_catalog_files Files in the catalog",
+        "# TYPE mediaserver_catalog_files gauge",
+        f"mediaserver_catalog_files {len(catalog)}",
+        "# HELP mediaserver_catalog_version Catalog version (incremented on each reload)",
+        "# TYPE mediaserver_catalog_version gauge",
+        f"mediaserver_catalog_version {app.config['CATALOG_VERSION']}",
+    ]
+    shared_metrics = get_shared_metrics(app)
+    if shared_metrics is not None:
+        flush_metrics(app)
+        return shared_metrics.render() + "\n".join(lines) + "\n"
+    collect_cache_stats(app)
+    return get_metrics(app).render() + "\n".join(lines) + "\n"
+
+
+def init_metrics(app: Flask, config: MediaServerConfig):
+    app.config["METRICS"] = Metrics()
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_start = time.perf_counter()
+        if config.trace_sample_rate > 0 and random.random() < config.trace_sample_rate:
+            g.trace = []
+
+    @app.after_request
+    def record_request_metrics(response: Response) -> Response:
+        duration = time.perf_counter() - g.get("request_start", time.perf_counter())
+        endpoint = request.endpoint or "none"
+        metrics = get_metrics(app)
+        metrics.requests.inc(endpoint, str(response.status_code))
+        metrics.request_seconds.observe(duration, endpoint)
+        trace = _get_trace()
+        if trace is not None:
+            app.logger.info(
+                "trace %s %s %d %.2fms %s",
+                request.method,
+                request.full_path if request.query_string else request.path,
+                response.status_code,
+                duration * 1000,
+                " ".join(trace),
+            )
+        return response
@@ -0,0 +1,89 @@
+import hashlib
+from typing import Any, Callable, Hashable, List, Tuple
+
+from flask import current_app, Flask, has_request_context, render_template, request, Response, stream_template, url_for
+from flask.typing import ResponseReturnValue
+from jinja2 import nodes
+from jinja2.ext import Extension
+from jinja2.parser import Parser
+
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.result_cache import ResultCache
+from app.utils.metrics_utils import span
+
+
+def render(app: Flask, config: MediaServerConfig, template_name: str, **context: Any) -> ResponseReturnValue:
+    """
+    Renders the template, or streams it (the response is sent as it's rendered) if stream_templates is enabled,
+    so that the time to first byte and the memory used don't grow with the number of results
+    """
+    if config.stream_templates:
+        # rendered as it's sent, after the request's spans are recorded
+        return app.response_class(stream_template(template_name, **context))
+    with span(app, "render"):
+        return render_template(template_name, **context)
+
+
+def url_for_page(cursor: str) -> str:
+    """Returns the URL of the current page with the given page cursor (and the same other args)"""
+    args = request.args.copy()
+    args.pop("offset", None)
+    args["cursor"] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args.to_dict(flat=False))  # type: ignore
+
+
+def get_render_cache(app: Flask) -> ResultCache:
+    return app.config["RENDER_CACHE"]
+
+
+def get_render_cache_key(app: Flask, *key_parts: Hashable) -> Tuple[Hashable, ...]:
+    """
+    Returns the render cache key of key_parts. Rendered templates depend on the catalog (its version changes on
+    reload) and on the URL prefix of their links, which includes the script root set by a reverse proxy.
+    """
+    script_root = request.script_root if has_request_context() else ""
+    return (app.config["CATALOG_VERSION"], script_root, *key_parts)
+
+
+def render_cached(app: Flask, template_name: str, **context: Any) -> Response:
+    """
+    Renders a template which only depends on the catalog and the request URL (e.g. the index pages) once, and
+    then serves it from the render cache, with an ETag so that browsers revalidate it rather than download it
+    """
+
+    def render_page() -> Tuple[str, str]:
+        with span(app, "render"):
+            body = render_template(template_name, **context)
+        return body, hashlib.sha256(body.encode()).hexdigest()[:16]
+
+    key = get_render_cache_key(app, "page", template_name, request.full_path)
+    body, etag = get_render_cache(app).get_or_compute(key, render_page)
+    response = app.response_class(body, mimetype="text/html")
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return response
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Caches the output of a template fragment in the render cache, by the given key (and the catalog version and
+    URL prefix, see get_render_cache_key), for the fragments which are the same on every request e.g.:
+        {% cache "x_by_genre", index_type %}...{% endcache %}
+    """
+
+    tags = {"cache"}
+
+    def parse(self, parser: Parser) -> nodes.Node:
+        lineno = next(parser.stream).lineno
+        key_parts: List[nodes.Expr] = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render_fragment", [nodes.List(key_parts)]), [], [], body).set_lineno(
+            lineno
+        )
+
+    def _render_fragment(self, key_parts: List[Hashable], caller: Callable[[], str]) -> str:
+        key = get_render_cache_key(current_app, "fragment", *key_parts)
+        return get_render_cache(current_app).get_or_compute(key, caller)
@@ -1,15 +1,18 @@
-from flask import Request
+from flask import current_app, Request
+from werkzeug.exceptions import BadRequest
 
-from typing import List
+from typing import Callable, Dict, List
 
 from app.types.arg_types import (
     ArgsDict,
     ArgType,
     ArgTypes,
     ArgTypeUtil,
+    ArgValue,
     ArgValues,
 )
-
+from app.types.page import PageArgs
+from app.utils.metrics_utils import span
 
 REQUEST_ARG_TYPES: List[ArgType] = [
     ArgTypes.List.Str.Genre,
@@ -23,30 +26,57 @@ REQUEST_ARG_TYPES: List[ArgType] = [
     ArgTypes.List.Str.City,
     ArgTypes.Scalar.Int.MinYear,
     ArgTypes.Scalar.Int.MaxYear,
+    ArgTypes.Scalar.Int.Seed,
     ArgTypes.Scalar.Enum.Sort,
+    ArgTypes.Scalar.Enum.Match,
 ]
 
+# The values of each ArgTypeScalarEnum
+SCALAR_ENUM_VALUES: Dict[ArgType, Callable[[str], ArgValue]] = {
+    ArgTypes.Scalar.Enum.Sort: ArgValues.Scalar.Enum.Sort,
+    ArgTypes.Scalar.Enum.Match: ArgValues.Scalar.Enum.Match,
+}
+
 
 def get_request_args(
     request: Request,
     arg_types: List[ArgType] = REQUEST_ARG_TYPES,
 ) -> ArgsDict:
     ret: ArgsDict = {}
-    for arg_type in arg_types:
-        if ArgTypeUtil.is_scalar(arg_type):
-            value = request.args.get(str(arg_type))
-            if value:
-                if ArgTypeUtil.is_integer(arg_type):
-                    ret[arg_type] = int(value)
-                else:
-                    # must be enum type, and there's only one currently
-                    ret[arg_type] = ArgValues.Scalar.Enum.Sort(value)
-        else:
-            value = request.args.getlist(str(arg_type))
-            if value:
-                ret[arg_type] = value
-            else:
-                value = request.args.getlist(f"{arg_type}[]")
+    with span(current_app, "parse_args"):
+        for arg_type in arg_types:
+            if ArgTypeUtil.is_scalar(arg_type):
+                value = request.args.get(str(arg_type))
                 if value:
-                    ret[arg_type] = value
+                    if ArgTypeUtil.is_integer(arg_type):
+                        ret[arg_type] = int(value)
+                    else:
+                        # must be enum type
+                        ret[arg_type] = SCALAR_ENUM_VALUES[arg_type](value)
+            else:
+                values = request.args.getlist(str(arg_type))
+                if values:
+                    ret[arg_type] = values
+                else:
+                    values = request.args.getlist(f"{arg_type}[]")
+                    if values:
+                        ret[arg_type] = values
     return ret
+
+
+def get_page_args(request: Request, default_limit: int) -> PageArgs:
+    """
+    Returns the requested page: the page of the cursor arg (returned by a previous page) if there is one,
+    otherwise the page at the offset arg. The limit arg can lower the page size below default_limit.
+    """
+    try:
+        limit = default_limit
+        value = request.args.get("limit")
+        if value and int(value) > 0 and (default_limit <= 0 or int(value) < default_limit):
+            limit = int(value)
+        cursor = request.args.get("cursor")
+        if cursor:
+            return PageArgs.from_cursor(cursor, limit)
+        return PageArgs(max(0, int(request.args.get("offset") or 0)), limit)
+    except ValueError as e:
+        raise BadRequest(str(e))
@@ -0,0 +1,177 @@
+import os
+import stat
+from typing import BinaryIO, cast, Iterable, Optional
+
+from flask import Flask, request, Response
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.wsgi import FileWrapper, wrap_file
+
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.file_stat import FileStat
+from app.types.result_cache import ResultCache
+from app.utils.app_utils import get_config
+from app.utils.bandwidth_utils import (
+    get_bandwidth_limiter,
+    get_client_ip,
+    set_x_accel_limit_rate,
+    StreamSlotFile,
+    ThrottledResponse,
+)
+
+
+def get_served_path(app: Flask, config: MediaServerConfig, path: str) -> Optional[str]:
+    """
+    Returns the file system path of a /getfile/ path, or None if it isn't under the media path
+    (or the album covers path, for covers), which are the only paths served
+    """
+    # path_prefix = /var/www/html/Covers/
+    # path = /var/www/html/Covers/MusicOther/Johnny Cash/With His Hot and Blue Guitar [1957]/cover.jpg
+    # path_without_prefix = MusicOther/Johnny Cash/With His Hot and Blue Guitar [1957]/cover.jpg
+
+    if not path.startswith("/"):
+        path = "/" + path
+    path_prefix = config.playback_methods.local.media_path
+    # if (
+    #    path.startswith(config.album_covers_path)
+    #    or config.album_covers_path != config.playback_methods.local.media_path
+    # ):
+    if path.startswith(config.album_covers_path):
+        path_prefix = config.album_covers_path
+
+    if not path_prefix.endswith("/"):
+        path_prefix = path_prefix + "/"
+    if not path.startswith(path_prefix):
+        app.logger.warning(
+            "path (%s) doesn't match expected media path prefix (%s), refusing to serve it",
+            path,
+            path_prefix,
+        )
+        return None
+    # same as send_from_directory(path_prefix, path_without_prefix), refuses paths outside of path_prefix
+    return safe_join(path_prefix, path[len(path_prefix) :])
+
+
+def get_file_stat_cache(app: Flask) -> ResultCache:
+    return app.config["FILE_STAT_CACHE"]
+
+
+def stat_file(path: str) -> Optional[FileStat]:
+    """Returns the FileStat of path, or None if it isn't a regular file"""
+    try:
+        stat_result = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if not stat.S_ISREG(stat_result.st_mode):
+        return None
+    return FileStat.from_stat_result(path, stat_result)
+
+
+def find_file(app: Flask, path: str) -> Optional[FileStat]:
+    """Returns the FileStat of path, or of its .webp version for a missing .jpg, or None if neither exists"""
+    file_stat = stat_file(path)
+    if file_stat is not None:
+        return file_stat
+    # if it's a jpg, try looking for webp instead of jpg
+    # in case someone (me) converted the original jpgs to webp
+    root, ext = os.path.splitext(path)
+    if ext != ".jpg":
+        app.logger.error('File not found (and not a jpg): "%s"', path)
+        return None
+    file_stat = stat_file(root + ".webp")
+    if file_stat is None:
+        app.logger.error('File not found: "%s" (nor .webp)', path)
+    return file_stat
+
+
+def resolve_file(app: Flask, path: str) -> Optional[FileStat]:
+    """
+    Returns the FileStat of the file to serve for path (or of its .webp version, for a missing .jpg),
+    or None if there is no such file. Results (including missing files) are cached,
+    so that repeated requests (e.g. cover grids and audio seeks) don't stat the file system.
+    """
+    return get_file_stat_cache(app).get_or_compute(path, lambda: find_file(app, path))
+
+
+def _make_response(app: Flask, file_stat: FileStat, max_age: int) -> Response:
+    rv = app.response_class(None, mimetype=file_stat.mimetype, direct_passthrough=True)
+    rv.last_modified = file_stat.last_modified
+    rv.set_etag(file_stat.etag)
+    if max_age > 0:
+        rv.cache_control.public = True
+        rv.cache_control.max_age = max_age
+    else:
+        rv.cache_control.no_cache = True
+    return rv
+
+
+def send_media_file(app: Flask, path: str, file_stat: FileStat, max_age: int = 0) -> Response:
+    """
+    Sends the file as send_file would, but using the cached file_stat of path (for the ETag, Last-Modified
+    and Content-Length) instead of stat'ing it again. Conditional requests (If-None-Match, If-Modified-Since)
+    are answered with 304 without opening the file, and Range requests with 206, reading only the range.
+    Full and range responses are sent with the WSGI server's file wrapper (e.g. sendfile with gunicorn),
+    or with X-Sendfile if USE_X_SENDFILE is configured.
+    With bandwidth limits, the output is paced to the client's (and the global) rate limit instead (or by nginx
+    with use_x_accel_limit_rate), and audio files take a stream slot (503 right away if there's none free).
+    """
+    if not is_resource_modified(request.environ, etag=file_stat.etag, last_modified=file_stat.last_modified):
+        rv = _make_response(app, file_stat, max_age)
+        rv.status_code = 304
+        return rv
+
+    config = get_config(app)
+    if app.config.get("USE_X_SENDFILE"):
+        rv = _make_response(app, file_stat, max_age)
+        rv.headers["X-Sendfile"] = file_stat.path
+        set_x_accel_limit_rate(config, rv)
+        rv.content_length = file_stat.size
+        rv.make_conditional(request.environ, accept_ranges=True, complete_length=file_stat.size)
+        return rv
+
+    limiter = get_bandwidth_limiter(app)
+    client = ""
+    has_stream_slot = False
+    if limiter is not None:
+        client = get_client_ip(config, request)
+        if limiter.is_stream_limited and not file_stat.mimetype.startswith("image/"):
+            # rather than holding a worker thread until another stream finishes
+            if not limiter.acquire_stream(client, os.getpid()):
+                raise ServiceUnavailable(retry_after=config.bandwidth.stream_retry_after_seconds)
+            has_stream_slot = True
+    try:
+        file: BinaryIO = open(file_stat.path, "rb")
+    except OSError:
+        if has_stream_slot:
+            limiter.release_stream(client, os.getpid())  # type: ignore
+        raise
+    if has_stream_slot:
+        # the slot is released when the response closes the file
+        file = cast(BinaryIO, StreamSlotFile(file, limiter, client))  # type: ignore
+    stat_result = os.fstat(file.fileno())
+    if not file_stat.matches(stat_result):
+        # the file changed since it was stat'ed, send it with up to date headers and stat it again next time
+        get_file_stat_cache(app).invalidate(path)
+        file_stat = FileStat.from_stat_result(file_stat.path, stat_result)
+    rv = _make_response(app, file_stat, max_age)
+    set_x_accel_limit_rate(config, rv)
+    # seekable, so that a range is read from its start rather than read (and dropped) up to it
+    rv.response = FileWrapper(file, config.bandwidth.chunk_size)
+    rv.content_length = file_stat.size
+    try:
+        rv.make_conditional(request.environ, accept_ranges=True, complete_length=file_stat.size)
+    except Exception:
+        # e.g. 416 for an unsatisfiable range, the body is never sent
+        rv.close()
+        raise
+    if limiter is not None and limiter.is_rate_limited:
+        # paced in chunks of chunk_size (so that only the bytes actually sent count against the limits),
+        # the server's file wrapper (sendfile) would bypass the pacing
+        rv.response = ThrottledResponse(cast(Iterable[bytes], rv.response), limiter, client)
+    elif "wsgi.file_wrapper" in request.environ:
+        # the server's file wrapper (e.g. sendfile with gunicorn) sends content_length bytes from the file's offset
+        if rv.status_code == 206 and rv.content_range.start:
+            file.seek(rv.content_range.start)
+        rv.response = wrap_file(request.environ, file)
+    return rv
@@ -0,0 +1,125 @@
+import hashlib
+import mimetypes
+import os
+import stat
+from typing import Any, Dict, Optional
+
+from flask import abort, current_app, Flask, request, Response
+from flask.typing import ResponseReturnValue
+from werkzeug.security import safe_join
+
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.static_asset import StaticAsset
+from app.utils.app_utils import get_config
+from app.utils.compression_utils import (
+    BROTLI_MAX_QUALITY,
+    choose_encoding,
+    compress,
+    get_encodings,
+    GZIP_MAX_LEVEL,
+)
+
+
+def get_static_assets(app: Flask) -> Dict[str, StaticAsset]:
+    return app.config["STATIC_ASSETS"]
+
+
+def load_static_asset(config: MediaServerConfig, path: str) -> Optional[StaticAsset]:
+    """Reads the static file at path, and compresses it if its content type is compressible"""
+    try:
+        stat_result = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    mimetype, _ = mimetypes.guess_type(path)
+    mimetype = mimetype or "application/octet-stream"
+    bodies = {"identity": data}
+    if config.compression.enabled and mimetype in config.compression.mimetypes:
+        for encoding in get_encodings():
+            compressed = compress(data, encoding, BROTLI_MAX_QUALITY if encoding == "br" else GZIP_MAX_LEVEL)
+            if len(compressed) < len(data):
+                bodies[encoding] = compressed
+    return StaticAsset(path, stat_result.st_mtime_ns, mimetype, hashlib.sha256(data).hexdigest()[:12], bodies)
+
+
+def load_static_assets(app: Flask, config: MediaServerConfig) -> Dict[str, StaticAsset]:
+    """
+    Loads (and compresses) the files of the static folder, once on startup rather than on every request.
+    They are small (mostly the d3 scripts and the CSS) so they're kept in memory.
+    """
+    assets: Dict[str, StaticAsset] = {}
+    if app.static_folder is None:
+        return assets
+    for dirpath, _, filenames in os.walk(app.static_folder):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            asset = load_static_asset(config, path)
+            if asset is not None:
+                assets[os.path.relpath(path, app.static_folder).replace(os.sep, "/")] = asset
+    app.logger.info("Loaded %d static files", len(assets))
+    return assets
+
+
+def get_static_asset(app: Flask, filename: str) -> Optional[StaticAsset]:
+    """Returns the static file, reloading it if it was modified (or added) since it was loaded"""
+    if app.static_folder is None:
+        return None
+    path = safe_join(app.static_folder, filename)
+    if path is None:
+        return None
+    assets = get_static_assets(app)
+    asset = assets.get(filename)
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(stat_result.st_mode):
+        return None
+    if asset is None or asset.mtime_ns != stat_result.st_mtime_ns:
+        asset = load_static_asset(get_config(app), path)
+        if asset is not None:
+            assets[filename] = asset
+    return asset
+
+
+def send_static_asset(filename: str) -> ResponseReturnValue:
+    """
+    Replaces Flask's static view, serving the precompressed version the client accepts. Requests by the
+    versioned URL (with the hash of the content, see add_static_url_hash) can be cached for good, since
+    any change to the file changes its URL.
+    """
+    config = get_config(current_app)
+    asset = get_static_asset(current_app, filename)
+    if asset is None:
+        abort(404)
+    encoding = choose_encoding(request, [encoding for encoding in asset.bodies if encoding != "identity"])
+    response = Response(asset.bodies[encoding or "identity"], mimetype=asset.mimetype)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if len(asset.bodies) > 1:
+        response.vary.add("Accept-Encoding")
+    response.set_etag(asset.hash if encoding is None else f"{asset.hash}-{encoding}")
+    if request.args.get("v") == asset.hash:
+        response.cache_control.public = True
+        response.cache_control.max_age = config.compression.static_max_age_seconds
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    response.make_conditional(request)
+    return response
+
+
+def add_static_url_hash(endpoint: str, values: Dict[str, Any]):
+    """Adds the hash of the file's content to static URLs e.g. url_for('static', filename='d3.v3.min.js')"""
+    if endpoint != "static" or "v" in values or "filename" not in values:
+        return
+    asset = get_static_asset(current_app, values["filename"])
+    if asset is not None:
+        values["v"] = asset.hash
+
+
+def init_static_assets(app: Flask, config: MediaServerConfig):
+    app.config["STATIC_ASSETS"] = load_static_assets(app, config)
+    app.view_functions["static"] = send_static_asset
+    app.url_defaults(add_static_url_hash)
@@ -0,0 +1,163 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import Flask
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, covers are served full size without it
+    Image = None  # type: ignore
+
+from app.types.config.mediaserver_config import MediaServerConfig
+from app.types.file_stat import FileStat
+from app.types.result_cache import ResultCache
+from app.utils.catalog_utils import get_file_sha256
+from app.utils.send_file_utils import find_file, stat_file
+
+# Pillow format name and file extension of each ThumbnailsConfig.format
+THUMBNAIL_FORMATS: Dict[str, Tuple[str, str]] = {
+    "webp": ("WEBP", ".webp"),
+    "jpeg": ("JPEG", ".jpg"),
+}
+
+# Thumbnails being generated (by thumbnail path), so that concurrent requests for the same thumbnail wait for
+# the same generation rather than generating it again
+_in_progress: Dict[Path, "Future[None]"] = {}
+_in_progress_lock = threading.Lock()
+
+
+def is_thumbnails_enabled(config: MediaServerConfig) -> bool:
+    return config.thumbnails.enabled and Image is not None
+
+
+def create_thumbnail_executor(config: MediaServerConfig) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max(1, config.thumbnails.workers), thread_name_prefix="thumbnail")
+
+
+def create_thumbnail_source_hash_cache() -> ResultCache:
+    # keyed on the source's path and ETag, so entries never go stale
+    return ResultCache(max_entries=16384, ttl_seconds=0)
+
+
+def get_thumbnail_cache_path(config: MediaServerConfig) -> Path:
+    if config.thumbnails.cache_path:
+        return Path(config.thumbnails.cache_path)
+    return Path(config.album_covers_path).joinpath(".thumbnails")
+
+
+def get_thumbnail_path(config: MediaServerConfig, source_sha256: str, size: int) -> Path:
+    """
+    Returns the path of the thumbnail of the given size of the source image with the given sha256.
+    Thumbnails are content-addressed, so identical covers share thumbnails, and a replaced cover
+    (with new content) never gets the thumbnail of the previous one.
+    """
+    _, ext = THUMBNAIL_FORMATS[config.thumbnails.format]
+    return get_thumbnail_cache_path(config).joinpath(
+        source_sha256[:2], f"{source_sha256}-{size}-q{config.thumbnails.quality}{ext}"
+    )
+
+
+def generate_thumbnail(config: MediaServerConfig, source_path: str, thumbnail_path: Path, size: int) -> None:
+    """Writes the thumbnail of source_path (scaled down to fit size x size) to thumbnail_path"""
+    pil_format, _ = THUMBNAIL_FORMATS[config.thumbnails.format]
+    with Image.open(source_path) as image:
+        # lets the JPEG decoder downscale while decoding, which is much faster than decoding full size
+        image.draft("RGB", (size, size))
+        thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+    thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+    # written to a temporary file and renamed, so that a partially written thumbnail is never served
+    tmp_path = thumbnail_path.with_name(f"{thumbnail_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        thumbnail.save(tmp_path, format=pil_format, quality=config.thumbnails.quality)
+        os.replace(tmp_path, thumbnail_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _submit_thumbnail(
+    executor: ThreadPoolExecutor, config: MediaServerConfig, source_path: str, thumbnail_path: Path, size: int
+) -> "Future[None]":
+    with _in_progress_lock:
+        future = _in_progress.get(thumbnail_path)
+        if future is None:
+            future = executor.submit(generate_thumbnail, config, source_path, thumbnail_path, size)
+            _in_progress[thumbnail_path] = future
+            future.add_done_callback(lambda _: _in_progress.pop(thumbnail_path, None))
+    return future
+
+
+def _get_source_sha256(app: Flask, file_stat: FileStat) -> str:
+    return app.config["THUMBNAIL_SOURCE_HASH_CACHE"].get_or_compute(
+        (file_stat.path, file_stat.etag), lambda: get_file_sha256(Path(file_stat.path))
+    )
+
+
+def get_thumbnail(app: Flask, config: MediaServerConfig, file_stat: FileStat, size: int) -> Optional[FileStat]:
+    """
+    Returns the FileStat of the thumbnail of the given size of the image file_stat,
+    generating it (in the thumbnail worker pool) if it isn't in the thumbnail cache yet.
+    Returns None if the thumbnail couldn't be generated.
+    """
+    thumbnail_path = get_thumbnail_path(config, _get_source_sha256(app, file_stat), size)
+    thumbnail_stat = stat_file(str(thumbnail_path))
+    if thumbnail_stat is not None:
+        return thumbnail_stat
+    try:
+        _submit_thumbnail(app.config["THUMBNAIL_EXECUTOR"], config, file_stat.path, thumbnail_path, size).result()
+    except Exception:
+        app.logger.exception('Failed to generate %dpx thumbnail of "%s"', size, file_stat.path)
+        return None
+    return stat_file(str(thumbnail_path))
+
+
+def prefetch_thumbnails(app: Flask, config: MediaServerConfig, file_stat: FileStat):
+    """Generates the missing thumbnails of the image file_stat in the background e.g. for covers about to be shown"""
+    executor: ThreadPoolExecutor = app.config["THUMBNAIL_EXECUTOR"]
+
+    def prefetch():
+        try:
+            source_sha256 = _get_source_sha256(app, file_stat)
+            for size in config.thumbnails.sizes:
+                thumbnail_path = get_thumbnail_path(config, source_sha256, size)
+                if not thumbnail_path.exists():
+                    _submit_thumbnail(executor, config, file_stat.path, thumbnail_path, size)
+        except Exception:
+            app.logger.exception('Failed to prefetch thumbnails of "%s"', file_stat.path)
+
+    executor.submit(prefetch)
+
+
+def build_thumbnails(app: Flask, config: MediaServerConfig, cover_paths: Iterable[str]) -> Tuple[int, int, int]:
+    """
+    Generates the missing thumbnails (of every configured size) of the given cover images ahead of time,
+    returns the number of thumbnails generated, already cached, and failed (or missing covers)
+    """
+    generated = 0
+    cached = 0
+    failed = 0
+    futures: Dict["Future[None]", str] = {}
+    with create_thumbnail_executor(config) as executor:
+        for cover_path in cover_paths:
+            file_stat = find_file(app, cover_path)
+            if file_stat is None:
+                failed += 1
+                continue
+            source_sha256 = get_file_sha256(Path(file_stat.path))
+            for size in config.thumbnails.sizes:
+                thumbnail_path = get_thumbnail_path(config, source_sha256, size)
+                if thumbnail_path.exists():
+                    cached += 1
+                    continue
+                futures[_submit_thumbnail(executor, config, file_stat.path, thumbnail_path, size)] = file_stat.path
+        for future, source_path in futures.items():
+            try:
+                future.result()
+                generated += 1
+            except Exception:
+                app.logger.exception('Failed to generate thumbnail of "%s"', source_path)
+                failed += 1
+    return generated, cached, failed
@@ -0,0 +1,266 @@
+"""
+Benchmarks the catalog queries of the UI and API against synthetic catalogs (see generate_catalog.py) of
+increasing sizes, with the Flask test client, so that runs can be compared for regressions. For each size,
+in a fresh Python process (for its RSS), it loads the catalog, then makes --requests requests to each endpoint,
+picked from a mix of --distinct representative filters (so some of them hit the result cache), and reports the
+p50/p99 latency and throughput of each endpoint, the catalog load time and the RSS.
+
+Usage (from the repo root):
+  python dev/benchmarks/catalog_benchmark.py [--sizes 10000,100000,1000000] [--requests 200] [--distinct 50]
+      [--seed 0] [--data-dir dev/benchmarks/data] [--json]
+The generated catalogs are kept in --data-dir (by size and seed) and reused by later runs.
+"""
+
+import json
+import logging
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+from dev.benchmarks.generate_catalog import COUNTRIES, generate_catalog  # noqa: E402
+
+DEFAULT_DATA_DIR = REPO_ROOT / "dev" / "benchmarks" / "data"
+
+# an ArgsDict mix maker returns the filter of a request (a random one of the representative filters)
+Mix = Callable[[random.Random, Dict[str, List[Any]]], Dict[str, Any]]
+
+
+def get_rss_kb() -> int:
+    """Returns the current RSS in kB (or the peak RSS, where /proc isn't available)"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def get_mixes() -> Dict[str, Tuple[str, List[Mix]]]:
+    """Returns the endpoints' paths and filter mixes, the filters being ArgsDicts of the values in the catalog"""
+    from app.types.arg_types import ArgTypes, ArgValues
+
+    genre, artist, album, country_code = (
+        ArgTypes.List.Str.Genre,
+        ArgTypes.List.Str.Artist,
+        ArgTypes.List.Str.Album,
+        ArgTypes.List.Str.CountryCode,
+    )
+    min_year, max_year, sort = ArgTypes.Scalar.Int.MinYear, ArgTypes.Scalar.Int.MaxYear, ArgTypes.Scalar.Enum.Sort
+
+    def decade(r: random.Random) -> Dict[Any, Any]:
+        start = r.randrange(1960, 2030, 10)
+        return {min_year: start, max_year: start + 9}
+
+    tracks_mixes: List[Mix] = [
+        lambda r, values: {genre: [r.choice(values["genres"])]},
+        lambda r, values: {genre: [r.choice(values["genres"])], sort: ArgValues.Scalar.Enum.Sort.Year},
+        lambda r, values: {genre: r.sample(values["genres"], 2), **decade(r)},
+        lambda r, values: {artist: [r.choice(values["artists"])]},
+        lambda r, values: {artist: [r.choice(values["artists"])], album: [r.choice(values["albums"])]},
+        lambda r, values: decade(r),
+    ]
+    return {
+        "tracks": ("/tracks", tracks_mixes),
+        "albums": (
+            "/albums",
+            [
+                lambda r, values: {genre: [r.choice(values["genres"])]},
+                lambda r, values: {genre: [r.choice(values["genres"])], sort: ArgValues.Scalar.Enum.Sort.Year},
+                lambda r, values: {artist: [r.choice(values["artists"])]},
+                lambda r, values: decade(r),
+                lambda r, values: {country_code: [r.choice(values["country_codes"])], **decade(r)},
+            ],
+        ),
+        "artists": (
+            "/artists",
+            [
+                lambda r, values: {genre: [r.choice(values["genres"])]},
+                lambda r, values: {country_code: [r.choice(values["country_codes"])]},
+                lambda r, values: decade(r),
+            ],
+        ),
+        "genres": ("/genres", [lambda r, values: {}, lambda r, values: decade(r)]),
+        "artist-cities": (
+            "/artist-cities",
+            [
+                lambda r, values: {},
+                lambda r, values: {country_code: [r.choice(values["country_codes"])]},
+                lambda r, values: {genre: [r.choice(values["genres"])]},
+            ],
+        ),
+        "api/track": (
+            "/api/track",
+            [
+                lambda r, values: {},
+                lambda r, values: {genre: [r.choice(values["genres"])]},
+                lambda r, values: {genre: r.sample(values["genres"], 3), **decade(r)},
+            ],
+        ),
+    }
+
+
+def to_query_string(args: Dict[Any, Any]) -> List[Tuple[str, str]]:
+    """Returns the query string args of an ArgsDict"""
+    ret: List[Tuple[str, str]] = []
+    for arg_type, value in args.items():
+        for item in value if isinstance(value, list) else [value]:
+            ret.append((str(arg_type), str(item)))
+    return ret
+
+
+def get_data_dir(data_dir: Path, size: int, seed: int) -> Path:
+    """Returns the directory of the generated catalog of size tracks, generating it if it doesn't exist yet"""
+    path = data_dir / f"{size}-{seed}"
+    if not (path / "files.yaml").exists():
+        print(f"Generating a catalog of {size} tracks in {path}", file=sys.stderr)
+        generate_catalog(path, size, seed)
+    return path
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(catalog_path: str, requests: int, distinct: int, seed: int) -> dict:
+    from app import create_app
+    from app.types.config.mediaserver_config import MediaServerConfig
+
+    config = MediaServerConfig(
+        mediascan_yaml_path=catalog_path,
+        # parse the YAML files every time, rather than a snapshot only written by the first run
+        catalog_snapshot_enabled=False,
+        limit_bandwidth=False,
+        metrics_enabled=False,
+    )
+    config.flask_config.debug = False
+    logging.getLogger("app").setLevel(logging.WARNING)
+    rss_before = get_rss_kb()
+    start = time.perf_counter()
+    app = create_app(config, start_watcher=False)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = get_rss_kb()
+
+    tracks = app.config["MEDIASCAN_CATALOG"].filter({}).tracks
+    values = {
+        "genres": sorted({track.genre for track in tracks}),
+        "artists": sorted({track.artist for track in tracks}),
+        "albums": sorted({track.album for track in tracks}),
+        "country_codes": [country[0] for country in COUNTRIES if country[0]],
+    }
+    client = app.test_client()
+    endpoints: Dict[str, dict] = {}
+    for name, (path, mixes) in get_mixes().items():
+        r = random.Random(f"{seed}-{name}")
+        query_strings = [to_query_string(r.choice(mixes)(r, values)) for _ in range(distinct)]
+        latencies: List[float] = []
+        errors = 0
+        endpoint_start = time.perf_counter()
+        for _ in range(requests):
+            query_string = r.choice(query_strings)
+            request_start = time.perf_counter()
+            response = client.get(path, query_string=query_string)
+            response.get_data()
+            latencies.append(time.perf_counter() - request_start)
+            # 404 is the answer of /api/track to a filter without tracks
+            if response.status_code not in (200, 404):
+                errors += 1
+            response.close()
+        elapsed = time.perf_counter() - endpoint_start
+        latencies.sort()
+        endpoints[name] = {
+            "requests": requests,
+            "errors": errors,
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+            "requests_per_second": round(requests / elapsed, 1),
+        }
+    return {
+        "tracks": len(tracks),
+        "load_seconds": round(load_seconds, 3),
+        "catalog_rss_kb": rss_loaded - rss_before,
+        "rss_kb": get_rss_kb(),
+        "endpoints": endpoints,
+    }
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def main():
+    argv = sys.argv[1:]
+    as_json = "--json" in argv
+    argv = [arg for arg in argv if arg != "--json"]
+    options: Dict[str, str] = {}
+    for option in ("--sizes", "--requests", "--distinct", "--seed", "--data-dir", "--measure"):
+        if option in argv:
+            index = argv.index(option)
+            options[option] = argv[index + 1]
+            del argv[index : index + 2]
+    requests = int(options.get("--requests", 200))
+    distinct = int(options.get("--distinct", 50))
+    seed = int(options.get("--seed", 0))
+    if "--measure" in options:
+        print(json.dumps(measure(options["--measure"], requests, distinct, seed)))
+        return
+
+    sizes = [int(size) for size in options.get("--sizes", "10000,100000").split(",")]
+    data_dir = Path(options.get("--data-dir", DEFAULT_DATA_DIR))
+    results = []
+    for size in sizes:
+        catalog_path = get_data_dir(data_dir, size, seed)
+        output = subprocess.run(
+            [sys.executable, __file__, "--measure", str(catalog_path), "--requests", str(requests)]
+            + ["--distinct", str(distinct), "--seed", str(seed)],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if output.returncode != 0:
+            print(f"{size}: failed\n{output.stderr or output.stdout}", file=sys.stderr)
+            continue
+        results.append({"size": size, **json.loads(output.stdout.strip().splitlines()[-1])})
+
+    if as_json:
+        report = {
+            "commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "requests": requests,
+            "distinct": distinct,
+            "results": results,
+        }
+        print(json.dumps(report, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['tracks']} tracks: loaded in {result['load_seconds']:.2f}s,"
+            f" catalog {result['catalog_rss_kb'] / 1024:.1f} MB, RSS {result['rss_kb'] / 1024:.1f} MB"
+        )
+        print(f"  {'endpoint':<14} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>9} {'errors':>7}")
+        for name, endpoint in result["endpoints"].items():
+            print(
+                f"  {name:<14} {endpoint['p50_ms']:>9.2f} {endpoint['p99_ms']:>9.2f}"
+                f" {endpoint['requests_per_second']:>9.1f} {endpoint['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Generates a synthetic mediascan catalog (files.yaml and artists.yaml) of a given number of tracks, for benchmarks.
+The same seed always generates the same catalog. The distributions are skewed like a real library's:
+  genres   drawn from mediascan's Genre enum, with a few genres (in enum order) covering most tracks
+  artists  a few prolific artists and a long tail of artists with one album, each with a main genre
+  years    each artist's albums span a career of up to 30 years, the careers centered on the 1990s
+  geo      artists' country codes (mostly US/GB), with region codes and cities, ~10% of artists are unknown
+Usage (from the repo root):
+  python dev/benchmarks/generate_catalog.py <output_dir> [--tracks 100000] [--seed 0]
+"""
+
+import json
+import random
+import sys
+from bisect import bisect_left
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, List, Sequence, TextIO, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+MEDIA_PATH = "/data/Music"
+# latest album year (fixed rather than the current year, so that catalogs generated in different years are the same)
+LATEST_YEAR = 2025
+
+WORDS_1 = [
+    "The", "Black", "Silver", "Velvet", "Electric", "Broken", "Golden", "Midnight", "Crimson", "Hollow",
+    "Wild", "Quiet", "Neon", "Iron", "Paper", "Glass", "Lonely", "Sonic", "Northern", "Little",
+    "Café", "Señor", "Über", "Rêve", "Mañana",
+]  # fmt: skip
+WORDS_2 = [
+    "Ravens", "Sun", "Machines", "Hearts", "Wolves", "Kids", "Ocean", "Riders", "Ghosts", "Lights",
+    "Garden", "Empire", "Static", "Harbor", "Parade", "Satellites", "Tigers", "Shadows", "Rivers", "Dreams",
+    "Bohème", "Frères", "Ñandú", "Lumière", "Mädchen",
+]  # fmt: skip
+
+# (country code, weight, [(region code, city)])
+COUNTRIES: List[Tuple[str, int, List[Tuple[str, str]]]] = [
+    ("US", 40, [("CA", "Los Angeles"), ("NY", "New York"), ("WA", "Seattle"), ("IL", "Chicago"), ("GA", "Atlanta")]),
+    ("GB", 15, [("ENG", "London"), ("ENG", "Manchester"), ("SCT", "Glasgow")]),
+    ("CA", 6, [("ON", "Toronto"), ("QC", "Montréal"), ("BC", "Vancouver")]),
+    ("FR", 6, [("IDF", "Paris"), ("ARA", "Lyon")]),
+    ("DE", 5, [("BE", "Berlin"), ("HH", "Hamburg")]),
+    ("SE", 3, [("AB", "Stockholm"), ("O", "Göteborg")]),
+    ("JP", 3, [("13", "Tokyo"), ("27", "Osaka")]),
+    ("BR", 3, [("SP", "São Paulo"), ("RJ", "Rio de Janeiro")]),
+    ("AU", 3, [("NSW", "Sydney"), ("VIC", "Melbourne")]),
+    ("FI", 2, [("18", "Helsinki")]),
+    ("", 4, [("", "")]),
+]
+
+
+def zipf_cum_weights(n: int, s: float = 1.1) -> List[float]:
+    """Returns cumulative weights (for random.choices) of n items with a Zipf distribution, the first most likely"""
+    return list(accumulate(1 / (rank**s) for rank in range(1, n + 1)))
+
+
+def pick(r: random.Random, items: Sequence, cum_weights: List[float]):
+    return items[bisect_left(cum_weights, r.random() * cum_weights[-1])]
+
+
+def q(s: str) -> str:
+    """Returns s as a YAML double quoted scalar (which JSON strings are)"""
+    return json.dumps(s, ensure_ascii=False)
+
+
+def make_name(r: random.Random, used: Dict[str, int]) -> str:
+    name = f"{r.choice(WORDS_1)} {r.choice(WORDS_2)}"
+    used[name] = used.get(name, 0) + 1
+    return name if used[name] == 1 else f"{name} {used[name]}"
+
+
+def write_artist(artists_yaml: TextIO, r: random.Random, artist: str):
+    country_code, _, places = pick(r, COUNTRIES, list(accumulate(country[1] for country in COUNTRIES)))
+    region_code, city = r.choice(places)
+    artists_yaml.write(
+        f"- path: {q(f'{MEDIA_PATH}/{artist}')}\n"
+        f"  artist_data:\n"
+        f"    name: [{q(artist)}]\n"
+        f"    country_code: {q(country_code)}\n"
+        f"    region_code: {q(region_code)}\n"
+        f"    city: {q(city)}\n"
+    )
+
+
+def generate_catalog(output_dir: Path, tracks: int, seed: int = 0):
+    """Writes files.yaml and artists.yaml of about tracks tracks (whole albums) to output_dir"""
+    from mediascan import Genre
+
+    r = random.Random(seed)
+    genres = [genre.value for genre in Genre]
+    genre_cum_weights = zipf_cum_weights(len(genres))
+    artist_count = max(10, tracks // 40)
+    artist_cum_weights = zipf_cum_weights(artist_count, 0.8)
+    used_names: Dict[str, int] = {}
+    artists = [make_name(r, used_names) for _ in range(artist_count)]
+    artist_genres = [pick(r, genres, genre_cum_weights) for _ in range(artist_count)]
+    artist_first_years = [min(LATEST_YEAR, max(1950, int(r.gauss(1992, 14)))) for _ in range(artist_count)]
+    album_names: Dict[str, int] = {}
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "artists.yaml", "w", encoding="utf-8") as artists_yaml:
+        artists_yaml.write("artists:\n")
+        for artist in artists:
+            if r.random() < 0.9:
+                write_artist(artists_yaml, r, artist)
+
+    count = 0
+    with open(output_dir / "files.yaml", "w", encoding="utf-8") as files_yaml:
+        files_yaml.write("files:\n")
+        while count < tracks:
+            artist_id = pick(r, range(artist_count), artist_cum_weights)
+            artist = artists[artist_id]
+            album = make_name(r, album_names)
+            year = min(LATEST_YEAR, artist_first_years[artist_id] + int(r.expovariate(1 / 6)) % 30)
+            album_genre = artist_genres[artist_id] if r.random() < 0.8 else pick(r, genres, genre_cum_weights)
+            compilation = r.random() < 0.05
+            for track_number in range(1, r.randint(6, 16) + 1):
+                title = make_name(r, {})
+                track_artist = artist
+                if compilation:
+                    track_artist = r.choice(artists)
+                elif r.random() < 0.05:
+                    track_artist = f"{artist} feat. {r.choice(artists)}"
+                files_yaml.write(
+                    f"- path: {q(f'{MEDIA_PATH}/{artist}/{album} [{year}]/{track_number:02d} - {title}.mp3')}\n"
+                    f"  size: {r.randint(3_000_000, 12_000_000)}\n"
+                    f"  format: mp3\n"
+                    f"  title: {q(title)}\n"
+                    f"  artist: {q(track_artist)}\n"
+                    f"  album: {q(album)}\n"
+                    f"  albumartist: {q(artist if compilation else '')}\n"
+                    f"  genre: {q(album_genre if r.random() < 0.9 else pick(r, genres, genre_cum_weights))}\n"
+                    f"  year: {year}\n"
+                    f"  duration: {r.uniform(90, 420):.1f}\n"
+                )
+                count += 1
+
+
+def main():
+    argv = sys.argv[1:]
+    options: Dict[str, str] = {}
+    for option in ("--tracks", "--seed"):
+        if option in argv:
+            index = argv.index(option)
+            options[option] = argv[index + 1]
+            del argv[index : index + 2]
+    if len(argv) != 1:
+        raise SystemExit("Usage: python dev/benchmarks/generate_catalog.py <output_dir> [--tracks N] [--seed N]")
+    generate_catalog(Path(argv[0]), int(options.get("--tracks", 100000)), int(options.get("--seed", 0)))
+
+
+if __name__ == "__main__":
+    main()
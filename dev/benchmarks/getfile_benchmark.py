@@ -0,0 +1,134 @@
+"""
+Benchmarks /getfile (in process, with the Flask test client) against a plain send_from_directory
+route, for the requests the UI makes: cover images (full and conditional i.e. 304) and audio files
+(full and the Range requests made by seeking). Generates its own media files in a temporary directory.
+
+Usage (from the repo root):
+  python dev/benchmarks/getfile_benchmark.py [requests_per_case]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+AUDIO_FILE_SIZE = 8 * 1024 * 1024
+COVER_FILE_SIZE = 200 * 1024
+RANGE_SIZE = 64 * 1024
+ALBUM_COUNT = 20
+
+
+def create_media(media_path: Path):
+    """Writes ALBUM_COUNT albums of one audio file and a cover each, and the files.yaml/artists.yaml listing them"""
+    files_yaml = ["files:"]
+    for i in range(ALBUM_COUNT):
+        album_path = media_path / f"Artist {i}" / f"Album {i} [2000]"
+        album_path.mkdir(parents=True)
+        (album_path / "01 - Title.mp3").write_bytes(os.urandom(AUDIO_FILE_SIZE))
+        (album_path / "cover.jpg").write_bytes(os.urandom(COVER_FILE_SIZE))
+        files_yaml += [
+            f"- path: {album_path / '01 - Title.mp3'}",
+            f"  size: {AUDIO_FILE_SIZE}",
+            "  format: mp3",
+            "  title: Title",
+            f"  artist: Artist {i}",
+            f"  album: Album {i}",
+            f"  albumartist: Artist {i}",
+            "  genre: Rock",
+            "  year: 2000",
+            "  duration: 300.0",
+        ]
+    (media_path / "files.yaml").write_text("\n".join(files_yaml) + "\n")
+    (media_path / "artists.yaml").write_text("artists: []\n")
+
+
+def run_case(name: str, n: int, request: Callable[[int], Dict[str, int]]) -> Dict[str, float]:
+    start = time.perf_counter()
+    total_bytes = 0
+    statuses: Dict[int, int] = {}
+    for i in range(n):
+        result = request(i)
+        total_bytes += result["bytes"]
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    seconds = time.perf_counter() - start
+    return {
+        "name": name,
+        "requests_per_second": n / seconds,
+        "megabytes_per_second": total_bytes / seconds / 1024 / 1024,
+        "statuses": ", ".join(f"{status}x{count}" for status, count in sorted(statuses.items())),
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    from flask import send_from_directory
+
+    from app import create_app
+    from app.types.config.flask_config import FlaskConfig
+    from app.types.config.mediaserver_config import MediaServerConfig
+    from app.types.config.playback_methods_config import PlaybackMethodsConfig
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        media_path = Path(tmp_dir)
+        create_media(media_path)
+        config = MediaServerConfig(
+            mediascan_yaml_path=str(media_path),
+            album_covers_path=f"{media_path}/",
+            catalog_snapshot_enabled=False,
+            flask_config=FlaskConfig(root_path=str(REPO_ROOT / "app"), debug=False),
+            playback_methods=PlaybackMethodsConfig(),
+        )
+        config.playback_methods.local.media_path = f"{media_path}/"
+        app = create_app(config)
+        app.logger.setLevel("ERROR")
+
+        @app.route("/baseline/<path:path>")
+        def baseline(path: str):
+            return send_from_directory(media_path, path)
+
+        client = app.test_client()
+        covers = [f"Artist {i}/Album {i} [2000]/cover.jpg" for i in range(ALBUM_COUNT)]
+        audio_files = [f"Artist {i}/Album {i} [2000]/01 - Title.mp3" for i in range(ALBUM_COUNT)]
+        rng = random.Random(0)
+
+        def get(url: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+            response = client.get(url, headers=headers or {})
+            length = sum(len(chunk) for chunk in response.response)  # type: ignore
+            response.close()
+            return {"status": response.status_code, "bytes": length}
+
+        def range_header() -> Dict[str, str]:
+            start = rng.randrange(0, AUDIO_FILE_SIZE - RANGE_SIZE)
+            return {"Range": f"bytes={start}-{start + RANGE_SIZE - 1}"}
+
+        results = []
+        for prefix, url in [("baseline", "/baseline/"), ("getfile", f"/getfile{media_path}/")]:
+            etags = {cover: client.get(url + cover).headers["ETag"] for cover in covers}
+            results += [
+                run_case(f"{prefix} cover", n, lambda i: get(url + covers[i % ALBUM_COUNT])),
+                run_case(
+                    f"{prefix} cover 304",
+                    n,
+                    lambda i: get(url + covers[i % ALBUM_COUNT], {"If-None-Match": etags[covers[i % ALBUM_COUNT]]}),
+                ),
+                run_case(f"{prefix} audio", max(1, n // 10), lambda i: get(url + audio_files[i % ALBUM_COUNT])),
+                run_case(f"{prefix} audio seek", n, lambda i: get(url + audio_files[i % ALBUM_COUNT], range_header())),
+            ]
+
+    print(f"{'case':<22} {'req/s':>9} {'MB/s':>9}  statuses")
+    for result in results:
+        print(
+            f"{result['name']:<22} {result['requests_per_second']:>9.0f}"
+            f" {result['megabytes_per_second']:>9.1f}  {result['statuses']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Measures the resident memory (RSS) of the loaded catalog, e.g. to estimate how many
+gunicorn workers fit on a host. Each mode is measured in a fresh Python process:
+  mediascan  the mediascan MediaFiles/Artists objects (the previous catalog layout), unpickled from a temporary
+             file written from the YAML files, so that the YAML parser's garbage isn't counted
+  yaml       the Catalog built from the YAML files (RSS includes the memory retained after parsing)
+  snapshot   the Catalog loaded from the catalog snapshot (the usual startup path)
+
+Usage (from the repo root):
+  python dev/benchmarks/memory_benchmark.py [config_file] [--json]
+"""
+
+import gc
+import json
+import pickle
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+MODES = ["mediascan", "yaml", "snapshot"]
+
+
+def get_rss_kb() -> int:
+    """Returns the current RSS in kB (or the peak RSS, where /proc isn't available)"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(mode: str, config_filepath: Optional[str], mediascan_pickle_path: str) -> dict:
+    from flask import Flask
+    from mediascan import load_files_yaml, load_artists_yaml
+
+    from app.utils.catalog_utils import get_catalog_yaml_paths, load_catalog_snapshot, load_catalog_yaml
+    from app.utils.config.mediaserver_config_util import MediaServerConfigUtil
+
+    config = MediaServerConfigUtil().load_config(Path(config_filepath) if config_filepath else None)
+    app = Flask(__name__)
+    if mode == "mediascan-pickle":
+        files_yaml_path, artists_yaml_path = get_catalog_yaml_paths(config)
+        with open(mediascan_pickle_path, "wb") as f:
+            pickle.dump((load_files_yaml(files_yaml_path), load_artists_yaml(artists_yaml_path)), f)
+        return {}
+    gc.collect()
+    rss_before = get_rss_kb()
+    start = time.monotonic()
+    if mode == "mediascan":
+        with open(mediascan_pickle_path, "rb") as f:
+            loaded = pickle.load(f)
+        count = len(loaded[0].files)
+    elif mode == "yaml":
+        loaded = load_catalog_yaml(app, config)
+        count = len(loaded)
+    else:
+        loaded = load_catalog_snapshot(app, config)
+        if loaded is None:
+            raise SystemExit("No current catalog snapshot, build it with: python run.py build-snapshot [config_file]")
+        count = len(loaded)
+    seconds = time.monotonic() - start
+    gc.collect()
+    rss_after = get_rss_kb()
+    return {
+        "mode": mode,
+        "files": count,
+        "load_seconds": round(seconds, 3),
+        "rss_kb": rss_after,
+        "catalog_rss_kb": rss_after - rss_before,
+    }
+
+
+def main():
+    argv = sys.argv[1:]
+    as_json = "--json" in argv
+    argv = [arg for arg in argv if arg != "--json"]
+    if len(argv) > 2 and argv[0] == "--mode":
+        print(json.dumps(measure(argv[1], argv[3] if len(argv) > 3 else None, argv[2])))
+        return
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mediascan_pickle_path = str(Path(tmp_dir) / "mediascan.pickle")
+        for mode in ["mediascan-pickle", *MODES]:
+            output = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, mediascan_pickle_path, *argv[:1]],
+                cwd=REPO_ROOT,
+                capture_output=True,
+                text=True,
+            )
+            if output.returncode != 0:
+                print(f"{mode}: failed\n{output.stderr or output.stdout}", file=sys.stderr)
+                continue
+            if mode in MODES:
+                results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<10} {'files':>8} {'load (s)':>9} {'RSS (MB)':>9} {'catalog (MB)':>13}")
+    for result in results:
+        print(
+            f"{result['mode']:<10} {result['files']:>8} {result['load_seconds']:>9.2f}"
+            f" {result['rss_kb'] / 1024:>9.1f} {result['catalog_rss_kb'] / 1024:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Measures the requests/second of the production server (python run.py serve) for an increasing number of
+gunicorn worker processes, to show how throughput scales with cores. Each run starts the server with a
+temporary copy of the config (with flaskConfig.workers overridden, on a free local port), and hammers it from
+client processes (so that the clients aren't limited by one GIL either) with the catalog queries the UI makes.
+
+Usage (from the repo root, requires gunicorn):
+  python dev/benchmarks/throughput_benchmark.py [config_file] [--workers 1,2,4] [--seconds 10] [--clients N] [--json]
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(REPO_ROOT))
+
+# requests made by the UI which query the catalog (file serving is I/O bound, see getfile_benchmark.py)
+PATHS = [
+    "/api/track",
+    "/api/track?genre=Rock",
+    "/api/track?minYear=1990&maxYear=1999",
+    "/albums?genre=Jazz",
+    "/tracks?genre=Punk&sort=year",
+    "/artists?genre=Rock",
+    "/genres",
+]
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(port: int, timeout: float = 120) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_client(port: int, url_prefix: str, seconds: float, client_index: int) -> Dict[str, int]:
+    """Makes requests (over one keep-alive connection) until seconds have elapsed, returns the counts"""
+    counts = {"requests": 0, "errors": 0}
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    deadline = time.monotonic() + seconds
+    i = client_index
+    while time.monotonic() < deadline:
+        try:
+            connection.request("GET", url_prefix + PATHS[i % len(PATHS)])
+            response = connection.getresponse()
+            response.read()
+            counts["requests"] += 1
+            if response.status >= 500:
+                counts["errors"] += 1
+        except (OSError, http.client.HTTPException):
+            counts["errors"] += 1
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        i += 1
+    connection.close()
+    return counts
+
+
+def measure(config_filepath: Optional[str], workers: int, seconds: float, clients: int) -> dict:
+    from app.utils.config.mediaserver_config_util import MediaServerConfigUtil
+
+    config = MediaServerConfigUtil().load_config(Path(config_filepath) if config_filepath else None)
+    port = get_free_port()
+    config.flask_config.host = "127.0.0.1"
+    config.flask_config.port = port
+    config.flask_config.workers = workers
+    config.catalog_reload_interval_seconds = 0
+    url_prefix = config.flask_config.url_prefix or ""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_config_path = os.path.join(tmp_dir, "mediaserver_config.yaml")
+        config.to_yaml_file(tmp_config_path)
+        server = subprocess.Popen(
+            [sys.executable, "run.py", "serve", tmp_config_path],
+            cwd=REPO_ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not wait_for_server(port):
+                raise SystemExit("The server didn't start, check that it runs with: python run.py serve [config_file]")
+            # warm up the result caches of every worker
+            run_client(port, url_prefix, 2, 0)
+            with multiprocessing.Pool(clients) as pool:
+                results = pool.starmap(run_client, [(port, url_prefix, seconds, i) for i in range(clients)])
+        finally:
+            server.terminate()
+            server.wait()
+    requests = sum(result["requests"] for result in results)
+    return {
+        "workers": workers,
+        "clients": clients,
+        "seconds": seconds,
+        "requests": requests,
+        "errors": sum(result["errors"] for result in results),
+        "requests_per_second": round(requests / seconds, 1),
+    }
+
+
+def main():
+    argv = sys.argv[1:]
+    as_json = "--json" in argv
+    argv = [arg for arg in argv if arg != "--json"]
+    options: Dict[str, str] = {}
+    for option in ("--workers", "--seconds", "--clients"):
+        if option in argv:
+            index = argv.index(option)
+            options[option] = argv[index + 1]
+            del argv[index : index + 2]
+    cpu_count = os.cpu_count() or 1
+    worker_counts: List[int] = [1]
+    while worker_counts[-1] * 2 <= cpu_count:
+        worker_counts.append(worker_counts[-1] * 2)
+    if "--workers" in options:
+        worker_counts = [int(workers) for workers in options["--workers"].split(",")]
+    seconds = float(options.get("--seconds", 10))
+    clients = int(options.get("--clients", 2 * max(worker_counts)))
+
+    results = [measure(argv[0] if argv else None, workers, seconds, clients) for workers in worker_counts]
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{cpu_count} CPUs, {clients} clients")
+    print(f"{'workers':>7} {'requests':>9} {'errors':>7} {'req/s':>9} {'speedup':>8}")
+    for result in results:
+        print(
+            f"{result['workers']:>7} {result['requests']:>9} {result['errors']:>7}"
+            f" {result['requests_per_second']:>9.1f} {result['requests_per_second'] / results[0]['requests_per_second']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+#!/bin/bash
+
+# Prebuilds mediascan/out/catalog.snapshot from files.yaml and artists.yaml,
+# so the server can load the snapshot on startup instead of parsing the YAML files
+cd mediaserver
+python run.py build-snapshot mediaserver_config.yaml
+cd ..
@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# Reloads files.yaml and artists.yaml without restarting the service (see POST /admin/reload)
+# Requires adminToken to be set in the remote mediaserver_config.yaml
+HOST=$MEDIASERVER_DROPLET_IP
+DEST_USER=root
+PORT=${MEDIASERVER_PORT:-5000}
+URL_PREFIX=${MEDIASERVER_URL_PREFIX:-/mediaserver}
+ssh $DEST_USER@$HOST "curl -sS -X POST -H 'Authorization: Bearer $MEDIASERVER_ADMIN_TOKEN' http://localhost:$PORT$URL_PREFIX/admin/reload"
+echo
+echo 'Done'
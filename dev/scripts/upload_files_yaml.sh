@@ -2,3 +2,4 @@
 
 rsync -ahvP mediascan/out/files.yaml root@$BT_DROPLET_IP:/var/www/mediax/mediascan/out/files.yaml
 
+rsync -ahvP mediascan/out/catalog.snapshot root@$BT_DROPLET_IP:/var/www/mediax/mediascan/out/catalog.snapshot
@@ -1,16 +1,57 @@
 import sys
 from pathlib import Path
 
+from flask import Flask
+
 from app import create_app
+from app.utils.catalog_utils import build_catalog_snapshot, load_catalog
+from app.utils.media_files_utils import filter_albums
+from app.utils.thumbnail_utils import build_thumbnails, is_thumbnails_enabled
 from app.utils.config.mediaserver_config_util import MediaServerConfigUtil
+from app.utils.gunicorn_utils import run_gunicorn
+
+# Usage:
+#   python run.py [config_file]                  run the server (Flask development server)
+#   python run.py serve [config_file]            run the production server (gunicorn worker processes)
+#   python run.py build-snapshot [config_file]   (re)build the catalog snapshot from the mediascan YAML files
+#   python run.py build-thumbnails [config_file] generate the missing album cover thumbnails
+COMMANDS = ["serve", "build-snapshot", "build-thumbnails"]
+
+argv = sys.argv[1:]
+command = None
+if len(argv) and argv[0] in COMMANDS:
+    command = argv.pop(0)
 
 config_filepath = None
-if len(sys.argv) > 1:
-    config_filepath = Path(sys.argv[1])
+if len(argv) > 0:
+    config_filepath = Path(argv[0])
     print(f"Loading configuration from file {config_filepath}")
 else:
     print("Warning: No config file specified, loading default configuration")
 config = MediaServerConfigUtil().load_config(config_filepath)
+
+if command == "build-snapshot":
+    if not build_catalog_snapshot(Flask(__name__), config):
+        sys.exit(1)
+    print(f"Built catalog snapshot in {config.mediascan_yaml_path}")
+    sys.exit(0)
+
+if command == "build-thumbnails":
+    if not is_thumbnails_enabled(config):
+        print("Thumbnails are disabled, or Pillow isn't installed")
+        sys.exit(1)
+    thumbnails_app = Flask(__name__)
+    thumbnails_app.config["MEDIASERVER_CONFIG"] = config
+    with thumbnails_app.app_context():
+        albums = filter_albums(thumbnails_app, load_catalog(thumbnails_app, config), {})
+    generated, cached, failed = build_thumbnails(thumbnails_app, config, [str(album.cover_path) for album in albums])
+    print(f"Generated {generated} thumbnails ({cached} already cached, {failed} failed)")
+    sys.exit(1 if failed else 0)
+
+if command == "serve":
+    run_gunicorn(create_app(config, start_watcher=False), config)
+    sys.exit(0)
+
 app = create_app(config)
 if config_filepath == None:
     app.logger.warning("No config file specified, loaded default configuration")